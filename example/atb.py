@@ -1,8 +1,48 @@
 import cloudscraper
 from bs4 import BeautifulSoup
+import argparse
 import json
+import threading
 import time
 import re
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from pathlib import Path
+from urllib.parse import urljoin
+
+from brand_stripper import PhraseStripper, load_phrases
+from crawl_utils import RETRYABLE_STATUSES, CircuitBreaker, RateLimiter, RetryPolicy, retry_after_seconds
+from metrics import Registry
+from name_clusters import ClusterStats, NameClusterer
+from page_archive import PageArchive
+from price_history import PriceHistoryWriter
+from quantities import quantity_totals, strip_quantities
+from refresh_scheduler import DEFAULT_EXPLORE, DEFAULT_MAX_AGE, RefreshScheduler, page_fingerprint
+
+ATB_SITE = "https://www.atbmarket.com"
+
+# Анти-бан: не частіше одного запиту на ANTI_BAN_DELAY секунд (сумарно для всіх потоків)
+ANTI_BAN_DELAY = 1.2
+
+# Метрики парсингу по категоріях (OpenMetrics, див. metrics.py): --metrics-file / --metrics-port
+METRICS = Registry()
+PAGES = METRICS.counter('atb_pages', 'Сторінки категорій, отримані з HTTP 200', ['category'])
+FETCH_ATTEMPTS = METRICS.counter('atb_fetch_attempts', 'HTTP-запити за результатом (ok, http_<код>, error)',
+                                 ['category', 'outcome'])
+BYTES = METRICS.counter('atb_bytes', 'Завантажено байтів HTML', ['category'])
+RATE_WAIT = METRICS.histogram('atb_rate_limit_wait_seconds', 'Очікування ліміту запитів та запобіжника',
+                              ['category'], buckets=(0.01, 0.1, 0.5, 1, 2, 5, 10, 30))
+FETCH_SECONDS = METRICS.histogram('atb_fetch_seconds', 'Тривалість HTTP-запиту', ['category'],
+                                  buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15))
+PARSE_SECONDS = METRICS.histogram('atb_parse_seconds', 'Розбір сторінки BeautifulSoup', ['category'],
+                                  buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1))
+NORMALIZE_SECONDS = METRICS.histogram('atb_normalize_seconds', 'Один виклик normalize_product_name', ['category'],
+                                      buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01))
+CARDS = METRICS.counter('atb_cards', 'Картки товарів на сторінках', ['category'])
+CARDS_DROPPED = METRICS.counter('atb_cards_dropped', 'Відкинуті картки (error - виняток, short_name - порожня назва)',
+                                ['category', 'reason'])
+CRAWL_SECONDS = METRICS.gauge('atb_crawl_seconds', 'Тривалість завантаження сторінок')
+CRAWL_PAGES_PER_SECOND = METRICS.gauge('atb_crawl_pages_per_second', 'Сторінок за секунду за весь запуск')
+BREAKER_TRIPS = METRICS.gauge('atb_breaker_trips', 'Спрацювань запобіжника за запуск')
 
 CATEGORIES = [
     ("https://www.atbmarket.com/uk/catalog/287-ovochi-ta-frukti", "Овочі та фрукти"),
@@ -25,19 +65,19 @@ BRANDS = [
     'простоквашино', 'домик в селі', 'селянське', 'новіков', 'пам\'ятаєш',
     'гречка', 'мультипряник', 'натуральний продукт', 'зелена лінія',
     'золотий смак', 'атовська', 'московська', 'домашня', 'крафтова',
-    'президент', 'борщ', 'злагода', 'краснодворська', 'дубки', 'свалява',
+    'борщ', 'злагода', 'краснодворська', 'дубки', 'свалява',
     'таврія', 'крафт', 'слобожанка', 'любисток', 'олком', 'галичина',
-    'моя ласунка', 'містер', 'мультипряник', 'кулінар', 'містер',
+    'моя ласунка', 'містер', 'кулінар',
     'пильзен', 'сніданок', 'калиновська', 'вишиваний', 'регіональний',
-    'гуцульська', 'галичина', 'карпати', 'волинська', 'подільська',
+    'гуцульська', 'карпати', 'волинська', 'подільська',
     'середнянська', 'київська', 'полтавська', 'суми', 'чернігівська',
     'херсонська', 'одеса', 'запоріжжя', 'дніпро', 'харків', 'львів',
     # Додаткові бренди
     'біло', 'торчин', 'reed', 'розумний вибір', 'своя лінія', 'original',
     'оріджинал', 'орігінал', 'елітне', 'елітний', 'преміум', 'premium',
     'селект', 'select', 'люкс', 'lux', 'екстра', 'extra', 'клас', 'class',
-    'атовський', 'атовська', 'атб', 'чудо', 'чудова', 'наша', 'наше',
-    'домашній', 'домашня', 'народний', 'народна'
+    'атовський', 'атб', 'чудо', 'чудова', 'наша', 'наше',
+    'домашній', 'народний', 'народна'
 ]
 
 # Маркетингові та описові слова для видалення
@@ -54,6 +94,13 @@ MARKETING_WORDS = [
     'фірмовий', 'фірмова', 'фірмове', 'фірмові'
 ]
 
+# Додаткові бренди (по одному на рядок), наприклад відібрані з пропозицій mine_brands.py
+BRANDS_FILE = Path(__file__).resolve().with_name('brands_extra.txt')
+
+# Словники компілюються в автомати Ахо-Корасік: один прохід по назві незалежно від розміру словника
+BRAND_STRIPPER = PhraseStripper(BRANDS + load_phrases(BRANDS_FILE))
+MARKETING_STRIPPER = PhraseStripper(MARKETING_WORDS)
+
     # Патерни для форм фасування та упаковки
 PACKAGING_PATTERNS = [
     r'п/ванночк[ауі]', r'п\.\s*ванночк[ауі]', r'пл/ванночк[ауі]',
@@ -67,26 +114,54 @@ PACKAGING_PATTERNS = [
     r'\([Мм]\)', r'\([Ss]\)', r'\([Ll]\)', r'\([XxL]\)'
 ]
 
+# Латинські бренди, які прибираються ще до заміни латинських літер
+LATIN_BRANDS = ['original', 'reed', 'premium', 'select', 'lux', 'extra', 'class']
+
+# Мапінг латинських літер на кириличні (тільки для тих, що виглядають однаково)
+LATIN_TO_CYRILLIC = str.maketrans({
+    'a': 'а', 'e': 'е', 'o': 'о', 'p': 'р', 'c': 'с', 'x': 'х', 'y': 'у',
+    'A': 'А', 'E': 'Е', 'O': 'О', 'P': 'Р', 'C': 'С', 'X': 'Х', 'Y': 'У',
+    'K': 'К', 'M': 'М', 'T': 'Т', 'H': 'Н', 'B': 'В'
+})
+
+# Регулярні вирази normalize_product_name компілюються один раз при імпорті.
+# Потоки (зокрема у free-threaded Python) ділять лише незмінні скомпільовані
+# патерни, а не внутрішній кеш модуля re.
+LATIN_BRAND_RES = [re.compile(r'\b' + re.escape(brand) + r'\b', re.IGNORECASE) for brand in LATIN_BRANDS]
+PACKAGING_RES = [re.compile(pattern, re.IGNORECASE) for pattern in PACKAGING_PATTERNS]
+PARENS_RE = re.compile(r'\([^)]*\)')
+BRACKETS_RE = re.compile(r'\[[^\]]*\]')
+ORIGINAL_RES = [re.compile(r'\bоріджинал\b', re.IGNORECASE), re.compile(r'\bорігінал\b', re.IGNORECASE)]
+GRADE_RE = re.compile(r'(?<!\w)\d+\s*гат\b\.?', re.IGNORECASE)
+PERCENT_RE = re.compile(r'\d+[,\.]?\d*\s*%')
+PHRASE_RES = [
+    re.compile(r'\bцілий\s+без\s+кісточк[іи]\b', re.IGNORECASE),
+    re.compile(r'\bбез\s+кісточк[іи]\b', re.IGNORECASE),
+    re.compile(r'\bдо\s+[а-яієїщ]+у\b', re.IGNORECASE),  # "до шашлику", "до борщу" тощо
+    re.compile(r'\bдля\s+[а-яієїщ]+[аи]\b', re.IGNORECASE),  # "для салату", "для маринування" тощо
+]
+# "ат" тільки як окреме слово: перед пробілом або в кінці, потім між пробілами
+AT_RES = [re.compile(r'\s+ат(?=\s|$)', re.IGNORECASE), re.compile(r'(?<=\s)ат(?=\s|$)', re.IGNORECASE)]
+PCS_RE = re.compile(r'\s*\bшт\.?\b\s*', re.IGNORECASE)
+KG_RE = re.compile(r'\s*\bкг\b\s*', re.IGNORECASE)
+GRAMS_RE = re.compile(r'\d+\s*г\b', re.IGNORECASE)
+LONE_G_RE = re.compile(r'\s+\bг\b(?=\s|$)', re.IGNORECASE)
+LONE_ML_RE = re.compile(r'\s+\bмл\b(?=\s|$)', re.IGNORECASE)
+NUMBER_RE = re.compile(r'\b\d+\b')
+SPACES_RE = re.compile(r'\s+')
+SPECIAL_CHARS_RE = re.compile(r'[^\w\sа-яієїщА-ЯІЄЇЩ-]')
+DASHES_RE = re.compile(r'-+')
+
 def normalize_latin_to_cyrillic(text):
     """
     Замінює латинські літери, які схожі на кириличні, на кириличні.
     Наприклад: Kpeм -> Крем, Шaшлик -> Шашлик
     """
-    # Мапінг латинських літер на кириличні (тільки для тих, що виглядають однаково)
-    latin_to_cyrillic = {
-        'a': 'а', 'e': 'е', 'o': 'о', 'p': 'р', 'c': 'с', 'x': 'х', 'y': 'у',
-        'A': 'А', 'E': 'Е', 'O': 'О', 'P': 'Р', 'C': 'С', 'X': 'Х', 'Y': 'У',
-        'K': 'К', 'M': 'М', 'T': 'Т', 'H': 'Н', 'B': 'В'
-    }
-    
-    result = []
-    for char in text:
-        if char in latin_to_cyrillic:
-            result.append(latin_to_cyrillic[char])
-        else:
-            result.append(char)
-    return ''.join(result)
+    return text.translate(LATIN_TO_CYRILLIC)
 
+# Правила нижче - глобальні об'єкти модуля: normalize_trace.py підміняє їх на час
+# трасування (виклики, спрацювання, час по кожному правилу). Нове правило треба
+# додати і в normalize_trace.RULES
 def normalize_product_name(title):
     """
     Нормалізує назву продукту, видаляючи бренди та зайву інформацію.
@@ -101,73 +176,66 @@ def normalize_product_name(title):
     
     # Спочатку прибираємо латинські бренди ПЕРЕД нормалізацією
     # Це важливо, бо після нормалізації латинські букви стають кириличними змішано
-    latin_brands = ['original', 'reed', 'premium', 'select', 'lux', 'extra', 'class']
-    for brand in latin_brands:
-        title = re.sub(r'\b' + re.escape(brand) + r'\b', '', title, flags=re.IGNORECASE)
+    for brand_re in LATIN_BRAND_RES:
+        title = brand_re.sub('', title)
     
     # Тепер нормалізуємо латинські літери до кириличних
     title = normalize_latin_to_cyrillic(title)
     
     # Прибираємо скобки та їх вміст (включаючи технічні позначки)
-    title = re.sub(r'\([^)]*\)', '', title)
-    title = re.sub(r'\[[^\]]*\]', '', title)
+    title = PARENS_RE.sub('', title)
+    title = BRACKETS_RE.sub('', title)
     
     # Прибираємо кириличні варіанти брендів (після нормалізації)
-    title = re.sub(r'\bоріджинал\b', '', title, flags=re.IGNORECASE)
-    title = re.sub(r'\bорігінал\b', '', title, flags=re.IGNORECASE)
+    for original_re in ORIGINAL_RES:
+        title = original_re.sub('', title)
     
     # Прибираємо форми фасування та упаковки
-    for pattern in PACKAGING_PATTERNS:
-        title = re.sub(pattern, '', title, flags=re.IGNORECASE)
+    for packaging_re in PACKAGING_RES:
+        title = packaging_re.sub('', title)
     
-    # Прибираємо розміри та ваги (100г, 500г, 1л, 900мл, 200мл, 0.5 кг, 300/500г тощо)
-    title = re.sub(r'\d+[,\.]?\d*\s*/\s*\d+[,\.]?\d*\s*[гкг]', '', title, flags=re.IGNORECASE)
-    title = re.sub(r'\d+[,\.]?\d*\s*[гкг]', '', title, flags=re.IGNORECASE)
-    title = re.sub(r'\d+[,\.]?\d*\s*[млл]', '', title, flags=re.IGNORECASE)
-    title = re.sub(r'\d+[,\.]?\d*\s*кг\b', '', title, flags=re.IGNORECASE)
+    # Прибираємо ґатунок ("1 гат", "2 гат.")
+    title = GRADE_RE.sub('', title)
+
+    # Прибираємо розміри та ваги (100г, 500г, 1л, 900мл, 0.5 кг, 300/500г, 2х500г тощо)
+    # Спільний з update_prices.py парсер кількостей, один прохід по назві
+    title = strip_quantities(title)
     
     # Прибираємо відсотки (2.5%, 3.2%, 9% тощо)
-    title = re.sub(r'\d+[,\.]?\d*\s*%', '', title)
+    title = PERCENT_RE.sub('', title)
     
-    # Прибираємо бренди (спочатку довгі, потім короткі)
-    for brand in sorted(BRANDS, key=len, reverse=True):
-        # Шукаємо бренд як окреме слово (з урахуванням можливих пробілів)
-        pattern = r'\b' + re.escape(brand) + r'\b'
-        title = re.sub(pattern, '', title, flags=re.IGNORECASE)
+    # Прибираємо бренди як окремі слова (при перетині - найдовший збіг)
+    title = BRAND_STRIPPER.strip(title)
     
     # Прибираємо маркетингові слова та фрази
-    for word in MARKETING_WORDS:
-        pattern = r'\b' + re.escape(word) + r'\b'
-        title = re.sub(pattern, '', title, flags=re.IGNORECASE)
+    title = MARKETING_STRIPPER.strip(title)
     
     # Прибираємо складні маркетингові фрази
-    title = re.sub(r'\bцілий\s+без\s+кісточк[іи]\b', '', title, flags=re.IGNORECASE)
-    title = re.sub(r'\bбез\s+кісточк[іи]\b', '', title, flags=re.IGNORECASE)
-    title = re.sub(r'\bдо\s+[а-яієїщ]+у\b', '', title, flags=re.IGNORECASE)  # "до шашлику", "до борщу" тощо
-    title = re.sub(r'\bдля\s+[а-яієїщ]+[аи]\b', '', title, flags=re.IGNORECASE)  # "для салату", "для маринування" тощо
+    for phrase_re in PHRASE_RES:
+        title = phrase_re.sub('', title)
     
     # Прибираємо технічні характеристики та скорочення (як окремі слова)
     # Важливо: робимо це перед видаленням чисел, щоб не залишити самотні числа
     # "ат" видаляємо тільки якщо це окреме слово, не частина слова (наприклад, "салат")
-    title = re.sub(r'\s+ат(?=\s|$)', '', title, flags=re.IGNORECASE)  # тільки якщо перед пробілом або в кінці
-    title = re.sub(r'(?<=\s)ат(?=\s|$)', '', title, flags=re.IGNORECASE)  # тільки якщо перед та після пробіл або кінець
-    title = re.sub(r'\s*\bшт\.?\b\s*', ' ', title, flags=re.IGNORECASE)
-    title = re.sub(r'\s*\bкг\b\s*', ' ', title, flags=re.IGNORECASE)
+    for at_re in AT_RES:
+        title = at_re.sub('', title)
+    title = PCS_RE.sub(' ', title)
+    title = KG_RE.sub(' ', title)
     # "г" видаляємо тільки якщо перед ним є число або це окреме слово після числа
-    title = re.sub(r'\d+\s*г\b', '', title, flags=re.IGNORECASE)
-    title = re.sub(r'\s+\bг\b(?=\s|$)', ' ', title, flags=re.IGNORECASE)  # тільки якщо перед пробілом або в кінці
-    title = re.sub(r'\s+\bмл\b(?=\s|$)', ' ', title, flags=re.IGNORECASE)  # "мл" тільки як окреме слово
+    title = GRAMS_RE.sub('', title)
+    title = LONE_G_RE.sub(' ', title)  # тільки якщо перед пробілом або в кінці
+    title = LONE_ML_RE.sub(' ', title)  # "мл" тільки як окреме слово
     
     # Прибираємо послідовності чисел, що залишилися
-    title = re.sub(r'\b\d+\b', '', title)
+    title = NUMBER_RE.sub('', title)
     
     # Прибираємо зайві пробіли та спецсимволи (але залишаємо дефіси)
-    title = re.sub(r'\s+', ' ', title)
+    title = SPACES_RE.sub(' ', title)
     # Залишаємо тільки літери, цифри, пробіли та дефіси (кирилиця та латиниця)
     # Дефіс ставимо в кінці, щоб не створювати діапазон
-    title = re.sub(r'[^\w\sа-яієїщА-ЯІЄЇЩ-]', '', title)
+    title = SPECIAL_CHARS_RE.sub('', title)
     # Нормалізуємо множинні дефіси до одного
-    title = re.sub(r'-+', '-', title)
+    title = DASHES_RE.sub('-', title)
     # Прибираємо дефіси на початку та в кінці
     title = title.strip()
     
@@ -243,9 +311,27 @@ def determine_unit(category, title):
     # За замовчуванням - грами
     return 'G'
 
-def get_products_from_page(soup, category_name):
+def get_image_url(item, page_url=None):
+    """
+    URL зображення з картки товару (src або ліниве data-src / srcset), абсолютний, якщо відома
+    адреса сторінки. None, якщо зображення немає або це вбудований data:-URI.
+    """
+    img = item.select_one('img')
+    if img is None:
+        return None
+    src = img.get('data-src') or img.get('src') or ''
+    if not src:
+        srcset = img.get('data-srcset') or img.get('srcset') or ''
+        src = srcset.split(',')[0].strip().split(' ')[0] if srcset else ''
+    src = src.strip()
+    if not src or src.startswith('data:'):
+        return None
+    return urljoin(page_url, src) if page_url else src
+
+def get_products_from_page(soup, category_name, page_url=None):
     items = soup.find_all('article', class_='catalog-item')
     page_data = []
+    CARDS.inc(len(items), category=category_name)
     for item in items:
         try:
             title = item.select_one('.catalog-item__title').text.strip()
@@ -253,104 +339,481 @@ def get_products_from_page(soup, category_name):
             price = float(price_element.get('value', 0)) if price_element else 0
             
             # Нормалізуємо назву продукту
-            normalized_name = normalize_product_name(title)
+            with NORMALIZE_SECONDS.time(category=category_name):
+                normalized_name = normalize_product_name(title)
             
             if not normalized_name or len(normalized_name) < 2:
+                CARDS_DROPPED.inc(category=category_name, reason='short_name')
                 continue
             
             # Визначаємо одиницю вимірювання
             unit = determine_unit(category_name, normalized_name)
             
-            page_data.append({
+            product = {
                 'originalTitle': title,
                 'name': normalized_name,
                 'category': category_name,
                 'baseUnit': unit,
                 'price': price
-            })
+            }
+            # Зображення завантажує image_pipeline.py
+            image = get_image_url(item, page_url)
+            if image:
+                product['image'] = image
+            page_data.append(product)
         except Exception as e:
+            CARDS_DROPPED.inc(category=category_name, reason='error')
             continue
     return page_data
 
-def parse_all_atb():
-    scraper = cloudscraper.create_scraper(
-        browser={'browser': 'chrome', 'platform': 'darwin', 'desktop': True}
-    )
+def pack_key(title):
+    """
+    Ключ фасування: однакові назви з різною вагою/об'ємом - різні продукти.
+    """
+    return tuple(sorted((family, round(amount, 4)) for family, amount in quantity_totals(title).items()))
 
-    # Використовуємо dict для унікальних продуктів (за нормалізованою назвою)
-    unique_products = {}
-    
-    for base_url, category_name in CATEGORIES:
-        print(f"\n--- ОБРОБКА КАТЕГОРІЇ: {category_name} ---")
+def fat_variant(title):
+    """
+    Відсотки жирності з назви ("5%", "2,5%"): назви з різною жирністю не об'єднуються в кластер.
+    """
+    percents = sorted({p.replace(',', '.').replace(' ', '') for p in PERCENT_RE.findall(title)})
+    return ' '.join(percents) or None
 
-        last_page_titles = set()
-        page = 1
+class ProductCollector:
+    """
+    Збирає продукти зі сторінок у порядку обходу: один представник на
+    (нормалізована назва, фасування), кластери схожих назв та статистика цін
+    за (кластер, фасування). Спільний для живого парсингу та --replay.
+    """
 
-        while True:
-            url = f"{base_url}?page={page}"
-            print(f"Парсимо сторінку {page}...")
+    def __init__(self):
+        # Схожі назви ("Яблука червоні" / "Яблуко червоне") об'єднуються в кластери (MinHash + LSH).
+        # clusterId - лише позначка: різні товари з одного кластера не зливаються
+        self.clusterer = NameClusterer()
+        self.cluster_stats = ClusterStats()
+        self.seen_titles = set()
+        self.unique_products = {}
+
+    def add_page(self, page_data):
+        for product in page_data:
+            title = product['originalTitle']
+            if title in self.seen_titles:
+                continue
+            self.seen_titles.add(title)
+            cluster_id = self.clusterer.add(product['name'], fat_variant(title))
+            product['clusterId'] = cluster_id
+            if product['price'] > 0:
+                # Різні фасування одного кластера мають різні ціни - рахуємо їх окремо
+                self.cluster_stats.add((cluster_id, pack_key(title)), product['price'])
+            # update_prices шукає за name: оголошення з однаковою назвою та фасуванням
+            # отримали б однаковий бал і матч відкидався б як неоднозначний.
+            # Лишаємо перше, решта враховуються в listingCount та priceStats
+            key = (product['name'].lower(), pack_key(title))
+            representative = self.unique_products.get(key)
+            if representative is None:
+                product['listingCount'] = 1
+                self.unique_products[key] = product
+            else:
+                representative['listingCount'] += 1
+
+    def result(self):
+        # Конвертуємо в список продуктів і додаємо статистику цін (кластер, фасування)
+        products_list = list(self.unique_products.values())
+        packs = {}
+        for product in products_list:
+            stats_key = (product['clusterId'], pack_key(product['originalTitle']))
+            if self.cluster_stats.has(stats_key):
+                product['priceStats'] = self.cluster_stats.get(stats_key)
+            packs.setdefault(product['clusterId'], {}).setdefault(stats_key[1], product.get('priceStats'))
+        clusters = []
+        for cluster_id in sorted(packs):
+            clusters.append({
+                'id': cluster_id,
+                'name': self.clusterer.names[cluster_id],
+                'packs': [{'pack': dict(pack), 'priceStats': stats} for pack, stats in sorted(packs[cluster_id].items())],
+            })
+
+        # Групуємо за категоріями для зручності
+        products_by_category = {}
+        for product in products_list:
+            category = product['category']
+            if category not in products_by_category:
+                products_by_category[category] = []
+            products_by_category[category].append(product)
+
+        return {
+            'products': products_list,
+            'byCategory': products_by_category,
+            'clusters': clusters
+        }
+
+def get_page_count(soup):
+    """
+    Кількість сторінок категорії з блоку пагінації першої сторінки (посилання ?page=N).
+    None, якщо блоку пагінації на сторінці немає.
+    """
+    container = soup.select_one('[class*="pagination"]')
+    if container is None:
+        return None
+    pages = [1]
+    for link in container.select('a[href]'):
+        m = re.search(r'[?&]page=(\d+)', link.get('href', ''))
+        if m:
+            pages.append(int(m.group(1)))
+        text = link.get_text(strip=True)
+        if text.isdigit():
+            pages.append(int(text))
+    return max(pages)
+
+_thread_state = threading.local()
+
+def _scraper():
+    # cloudscraper.Session не потокобезпечний: по одному на потік, з'єднання перевикористовуються
+    scraper = getattr(_thread_state, 'scraper', None)
+    if scraper is None:
+        scraper = _thread_state.scraper = cloudscraper.create_scraper(
+            browser={'browser': 'chrome', 'platform': 'darwin', 'desktop': True}
+        )
+    return scraper
+
+class PageFetchError(Exception):
+    pass
+
+class PageFetcher:
+    """
+    Завантажує та парсить сторінки категорій з повторами:
+    - тимчасові помилки (429/5xx, мережа) повторюються з експоненційною затримкою та jitter;
+    - CircuitBreaker при серії помилок вдвічі зменшує спільний ліміт запитів і робить паузу,
+      а після серії успішних запитів поступово повертає швидкість.
+    """
+
+    def __init__(self, limiter, archive=None, run_id=None, retry=None, breaker=None):
+        self.limiter = limiter
+        self.archive = archive
+        self.run_id = run_id
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker(limiter)
 
+    def fetch(self, base_url, category_name, page):
+        """
+        Повертає (page_data, кількість сторінок з пагінації) або None, якщо сторінки немає
+        (HTTP-статус, який немає сенсу повторювати). Якщо всі спроби вичерпано - PageFetchError.
+        """
+        url = f"{base_url}?page={page}"
+        for attempt in range(self.retry.attempts):
+            with RATE_WAIT.time(category=category_name):
+                self.breaker.wait()
+                self.limiter.acquire()
+            retry_after = None
             try:
-                response = scraper.get(url, timeout=15)
-                if response.status_code != 200:
+                with FETCH_SECONDS.time(category=category_name):
+                    response = _scraper().get(url, timeout=15)
+            except Exception as e:
+                FETCH_ATTEMPTS.inc(category=category_name, outcome='error')
+                reason = str(e) or type(e).__name__
+            else:
+                if response.status_code == 200:
+                    FETCH_ATTEMPTS.inc(category=category_name, outcome='ok')
+                    self.breaker.record_success()
                     break
+                FETCH_ATTEMPTS.inc(category=category_name, outcome=f'http_{response.status_code}')
+                if response.status_code not in RETRYABLE_STATUSES:
+                    print(f"[{category_name}] сторінка {page}: HTTP {response.status_code}")
+                    return None
+                reason = f"HTTP {response.status_code}"
+                retry_after = retry_after_seconds(response.headers)
 
-                soup = BeautifulSoup(response.text, 'html.parser')
-                current_page_data = get_products_from_page(soup, category_name)
+            self.breaker.record_failure()
+            if attempt + 1 == self.retry.attempts:
+                raise PageFetchError(f"{reason} після {self.retry.attempts} спроб")
+            time.sleep(self.retry.delay(attempt, retry_after))
 
-                current_page_titles = {p['originalTitle'] for p in current_page_data}
+        PAGES.inc(category=category_name)
+        BYTES.inc(len(response.content), category=category_name)
+        if self.archive is not None:
+            self.archive.put(url, response.text.encode('utf-8'),
+                             meta={'category': category_name, 'page': page, 'run': self.run_id})
 
-                if not current_page_data or current_page_titles == last_page_titles:
-                    print(f"Кінець категорії {category_name}. (Сторінка {page} повторює попередню або порожня)")
-                    break
+        with PARSE_SECONDS.time(category=category_name):
+            soup = BeautifulSoup(response.text, 'html.parser')
+        return get_products_from_page(soup, category_name, url), get_page_count(soup)
 
-                # Додаємо продукти, але зберігаємо тільки унікальні за нормалізованою назвою
-                for product in current_page_data:
-                    normalized_name = product['name'].lower()
-                    if normalized_name not in unique_products:
-                        unique_products[normalized_name] = product
-                    # Можна також зберігати найнижчу ціну, але для початку просто перший продукт
-                
-                last_page_titles = current_page_titles
+def parse_all_atb(archive=None, workers=4, rate=1 / ANTI_BAN_DELAY, site=None, requeue_rounds=2,
+                  scheduler=None, budget=None, max_age=DEFAULT_MAX_AGE, explore=DEFAULT_EXPLORE):
+    """
+    archive: PageArchive або None. Якщо задано, кожна отримана сторінка зберігається
+    в архів (стиснута, з URL, часом завантаження, категорією та номером сторінки).
+    site: інший хост замість ATB_SITE (наприклад, fixture_server.py для тестів).
+    scheduler: RefreshScheduler (див. refresh_scheduler.py) або None. Якщо задано разом
+    з archive, оновлюються лише сторінки з плану (не більше budget запитів, крім перших
+    сторінок категорій, нових і старших за max_age секунд), а решта береться з останньої
+    версії в архіві. Зміни отриманих сторінок записуються в scheduler.
 
-                page += 1
-                time.sleep(1.2) # Анти-бан затримка
+    Спочатку паралельно завантажуються перші сторінки всіх категорій; кількість сторінок
+    береться з пагінації, і решта сторінок одразу ставиться в чергу пулу потоків.
+    Усі потоки ділять один ліміт запитів (rate запитів/с). Сторінки, що не вдалося
+    завантажити навіть з повторами, ставляться в чергу ще раз наприкінці
+    (до requeue_rounds разів). Якщо пагінації немає (або остання сторінка повна),
+    категорію дочитуємо послідовно до порожньої або повторної сторінки, як раніше.
+    """
+    started = time.monotonic()
+    limiter = RateLimiter(rate, burst=1)
+    fetcher = PageFetcher(limiter, archive=archive, run_id=int(time.time()))
+    categories = [(base_url.replace(ATB_SITE, site.rstrip('/')) if site else base_url, name)
+                  for base_url, name in CATEGORIES]
+    pages = {}  # (категорія, сторінка) -> page_data
+    page_counts = {}
+    failed = []
 
-            except Exception as e:
-                print(f"Помилка: {e}")
+    # Адаптивне оновлення: які сторінки брати з мережі, а які - з архіву
+    plan = None
+    archived = {}
+    if scheduler is not None and archive is not None:
+        plan = scheduler.plan(time.time(), budget, max_age, explore)
+        archived = {e['url']: e for e in archive.entries() if e['meta'].get('category')}
+    reused = {}  # (категорія, сторінка) -> час завантаження архівної копії
+
+    def observe(category_name, page, page_data):
+        if scheduler is not None:
+            scheduler.observe((category_name, page), page_fingerprint(page_data), time.time())
+
+    def from_archive(base_url, category_name, page):
+        # Сторінка не в плані і є в архіві - розбираємо архівну копію замість запиту
+        if plan is None or (category_name, page) in plan or (category_name, page) not in scheduler.pages:
+            return None
+        entry = archived.get(f"{base_url}?page={page}")
+        if entry is None:
+            return None
+        reused[(category_name, page)] = entry['fetchedAt']
+        # Посилання в індексі під поточним запуском, щоб --replay бачив повний запуск
+        archive.link(entry, meta={'category': category_name, 'page': page, 'run': fetcher.run_id})
+        return _parse_archived_page((str(archive.root), entry))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        def run(jobs):
+            futures = {pool.submit(fetcher.fetch, *job): job for job in jobs}
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    base_url, category_name, page = job = futures.pop(fut)
+                    try:
+                        result = fut.result()
+                    except Exception as e:
+                        print(f"[{category_name}] сторінка {page}: помилка {e}")
+                        failed.append(job)
+                        continue
+                    if result is None:
+                        continue
+                    page_data, page_count = result
+                    pages[(category_name, page)] = page_data
+                    observe(category_name, page, page_data)
+                    if page != 1:
+                        continue
+                    page_counts[category_name] = page_count
+                    if page_count is None:
+                        continue
+                    print(f"[{category_name}] сторінок: {page_count}")
+                    for next_page in range(2, page_count + 1):
+                        page_data = from_archive(base_url, category_name, next_page)
+                        if page_data is not None:
+                            pages[(category_name, next_page)] = page_data
+                            continue
+                        next_job = (base_url, category_name, next_page)
+                        futures[pool.submit(fetcher.fetch, *next_job)] = next_job
+
+        run([(base_url, category_name, 1) for base_url, category_name in categories])
+        for _ in range(requeue_rounds):
+            if not failed:
                 break
+            jobs = sorted(failed, key=lambda job: (job[1], job[2]))
+            failed.clear()
+            print(f"\nПовторно ставимо в чергу сторінок: {len(jobs)}")
+            run(jobs)
 
-    # Конвертуємо в список продуктів
-    products_list = list(unique_products.values())
-    
-    # Групуємо за категоріями для зручності
-    products_by_category = {}
-    for product in products_list:
-        category = product['category']
-        if category not in products_by_category:
-            products_by_category[category] = []
-        products_by_category[category].append(product)
-
-    return {
-        'products': products_list,
-        'byCategory': products_by_category
-    }
+    for _, category_name, page in failed:
+        print(f"[{category_name}] сторінку {page} так і не вдалося завантажити")
+
+    collector = ProductCollector()
+    for base_url, category_name in categories:
+        print(f"\n--- ОБРОБКА КАТЕГОРІЇ: {category_name} ---")
+        if (category_name, 1) not in pages:
+            continue
+        page_count = page_counts.get(category_name)
+        first_size = len(pages[(category_name, 1)])
+
+        last_page_titles = set()
+        page = 1
+        while True:
+            if (category_name, page) not in pages:
+                if page_count is not None and page <= page_count:
+                    # Сторінка з пагінації не завантажилась - пропускаємо її, а не всю категорію
+                    page += 1
+                    continue
+                # Пагінації немає, або остання сторінка повна (пагінація могла показати
+                # не всі номери) - дочитуємо послідовно
+                if page_count is not None and len(pages.get((category_name, page - 1), [])) < first_size:
+                    break
+                print(f"Парсимо сторінку {page}...")
+                try:
+                    result = fetcher.fetch(base_url, category_name, page)
+                except Exception as e:
+                    print(f"Помилка: {e}")
+                    break
+                if result is None:
+                    break
+                pages[(category_name, page)] = result[0]
+                observe(category_name, page, result[0])
+
+            current_page_data = pages[(category_name, page)]
+            current_page_titles = {p['originalTitle'] for p in current_page_data}
+
+            if not current_page_data or current_page_titles == last_page_titles:
+                print(f"Кінець категорії {category_name}. (Сторінка {page} повторює попередню або порожня)")
+                break
+
+            collector.add_page(current_page_data)
+            last_page_titles = current_page_titles
+            page += 1
+
+        print(f"Сторінок оброблено: {page - 1}")
+
+    elapsed = time.monotonic() - started
+    fetched = sum(PAGES.value(category=name) for _, name in categories)
+    CRAWL_SECONDS.set(elapsed)
+    CRAWL_PAGES_PER_SECOND.set(fetched / elapsed if elapsed else 0.0)
+    stats = fetcher.breaker.stats
+    BREAKER_TRIPS.set(stats['trips'])
+    print(f"\nСторінок завантажено: {fetched:.0f} за {elapsed:.1f} с ({fetched / elapsed if elapsed else 0:.2f} сторінок/с)")
+    print(f"Запитів успішних: {stats['successes']}, невдалих спроб: {stats['failures']}, "
+          f"спрацювань запобіжника: {stats['trips']}, ліміт наприкінці: {limiter.rate:.2f} запитів/с")
+    if plan is not None:
+        oldest = (time.time() - min(reused.values())) / 3600 if reused else 0.0
+        print(f"Адаптивне оновлення: з мережі {fetched:.0f} сторінок, з архіву {len(reused)} "
+              f"(найстаріша копія {oldest:.1f} год)")
+    return collector.result()
+
+def _parse_archived_page(job):
+    # Виконується в окремому процесі (або потоці): розпакувати сторінку та розпарсити її
+    root, entry = job
+    html = PageArchive(Path(root)).read(entry).decode('utf-8')
+    soup = BeautifulSoup(html, 'html.parser')
+    return get_products_from_page(soup, entry['meta']['category'], entry['url'])
+
+def replay_archive(archive, workers=None, threads=False):
+    """
+    Повторний парсинг останнього запуску з архіву сторінок без мережі.
+    Сторінки розбираються паралельно в процесах, а збираються в тому ж порядку,
+    що й при живому парсингу (з тією ж умовою кінця категорії).
+    З threads=True сторінки розбираються в потоках: на free-threaded Python
+    (3.13t+) це масштабується по ядрах без запуску процесів і без пересилання
+    результатів між ними. Нормалізація назв не має спільного змінного стану.
+    """
+    entries = [e for e in archive.entries(latest_only=False) if e['meta'].get('category')]
+    if not entries:
+        return ProductCollector().result()
+    last_run = max(e['meta'].get('run', 0) for e in entries)
+    entries = [e for e in entries if e['meta'].get('run', 0) == last_run]
+    # Якщо сторінку в межах запуску отримали двічі, беремо останню версію
+    entries = list({e['url']: e for e in entries}.values())
+
+    jobs = [(str(archive.root), e) for e in entries]
+    with (ThreadPoolExecutor if threads else ProcessPoolExecutor)(max_workers=workers) as pool:
+        parsed = list(pool.map(_parse_archived_page, jobs, chunksize=4))
+
+    pages_by_category = {}
+    for entry, page_data in zip(entries, parsed):
+        pages_by_category.setdefault(entry['meta']['category'], []).append((entry['meta']['page'], page_data))
+
+    category_order = [name for _, name in CATEGORIES]
+    category_order += [name for name in pages_by_category if name not in category_order]
+
+    collector = ProductCollector()
+    for category_name in category_order:
+        last_page_titles = set()
+        for _page, page_data in sorted(pages_by_category.get(category_name, []), key=lambda x: x[0]):
+            current_page_titles = {p['originalTitle'] for p in page_data}
+            if not page_data or current_page_titles == last_page_titles:
+                break
+            collector.add_page(page_data)
+            last_page_titles = current_page_titles
+    return collector.result()
 
 # ЗАПУСК
 if __name__ == '__main__':
-    all_data = parse_all_atb()
+    parser = argparse.ArgumentParser(description='Парсер каталогу АТБ')
+    parser.add_argument('--out', default=None,
+                        help='Файл результату (за замовчуванням atb_products.json, для --replay - atb_products_replay.json)')
+    parser.add_argument('--archive', default=None,
+                        help='Зберігати сирі сторінки в цей архів (див. page_archive.py)')
+    parser.add_argument('--replay', default=None,
+                        help='Не ходити в мережу: розпарсити останній запуск з цього архіву')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Потоків для завантаження (за замовчуванням 4) або процесів для --replay (кількість ядер)')
+    parser.add_argument('--replay-threads', action='store_true',
+                        help='Розбирати --replay у потоках замість процесів (для free-threaded Python)')
+    parser.add_argument('--site', default=None,
+                        help=f'Інший хост замість {ATB_SITE} (наприклад, http://127.0.0.1:8765 з fixture_server.py)')
+    parser.add_argument('--rate', type=float, default=1 / ANTI_BAN_DELAY,
+                        help='Максимум запитів на секунду сумарно для всіх потоків')
+    parser.add_argument('--history', default='price_history',
+                        help='Каталог історії цін (див. price_history.py); "" - не записувати')
+    parser.add_argument('--metrics-file', default='atb_metrics.prom',
+                        help='Куди записати метрики наприкінці запуску (OpenMetrics); "" - не записувати')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='Віддавати метрики на http://127.0.0.1:PORT/metrics під час парсингу')
+    parser.add_argument('--refresh-state', default=None,
+                        help='Файл стану адаптивного оновлення (див. refresh_scheduler.py); потрібен --archive')
+    parser.add_argument('--refresh-budget', type=int, default=None,
+                        help='Скільки сторінок оновлювати з мережі (без бюджету - усі, але стан оновлюється)')
+    parser.add_argument('--max-age-hours', type=float, default=DEFAULT_MAX_AGE / 3600,
+                        help='Сторінки, старші за стільки годин, оновлюються завжди')
+    parser.add_argument('--explore', type=float, default=DEFAULT_EXPLORE,
+                        help='Частка бюджету на найдавніше оновлені стабільні сторінки')
+    args = parser.parse_args()
+    if args.refresh_state and not args.archive:
+        parser.error('--refresh-state потребує --archive: неоновлені сторінки беруться з архіву')
+
+    started = time.monotonic()
+    if args.replay:
+        # Сторінки розбираються в інших процесах, тому метрики тут не збираються
+        all_data = replay_archive(PageArchive(Path(args.replay)), workers=args.workers, threads=args.replay_threads)
+    else:
+        metrics_server = METRICS.serve(args.metrics_port) if args.metrics_port is not None else None
+        scheduler = RefreshScheduler.load(Path(args.refresh_state)) if args.refresh_state else None
+        try:
+            all_data = parse_all_atb(PageArchive(Path(args.archive)) if args.archive else None,
+                                     workers=args.workers or 4, rate=args.rate, site=args.site,
+                                     scheduler=scheduler, budget=args.refresh_budget,
+                                     max_age=args.max_age_hours * 3600, explore=args.explore)
+            if scheduler is not None:
+                scheduler.save(Path(args.refresh_state))
+        finally:
+            if args.metrics_file:
+                METRICS.write(Path(args.metrics_file))
+            if metrics_server is not None:
+                metrics_server.shutdown()
 
     # Збереження результатів
-    output_file = 'atb_products.json'
+    # --replay не перезаписує робочий atb_products.json, якщо --out не задано явно
+    output_file = args.out or ('atb_products_replay.json' if args.replay else 'atb_products.json')
     with open(output_file, 'w', encoding='utf-8') as f:
         json.dump(all_data, f, ensure_ascii=False, indent=2)
 
     total_products = len(all_data['products'])
     total_categories = len(all_data['byCategory'])
     
-    print(f"\n✓ Готово! Дані збережені в {output_file}")
+    # Дописуємо знімок цін в історію (atb_products.json щоразу перезаписується):
+    # ціна оголошення як на полиці, за фасування з назви, без перерахунку за кг/л.
+    # Повторний парсинг архіву нових цін не дає, а порожній запуск (бан, зміна
+    # верстки) лише засмітив би історію, тому в цих випадках не пишемо
+    if args.history and not args.replay and total_products:
+        history = PriceHistoryWriter(Path(__file__).resolve().parent / args.history)
+        history.append_snapshot('ATB', ((p['originalTitle'], p['price']) for p in all_data['products']))
+
+    print(f"\n✓ Готово за {time.monotonic() - started:.1f} с! Дані збережені в {output_file}")
     print(f"✓ Всього унікальних продуктів: {total_products}")
     print(f"✓ Всього категорій: {total_categories}")
+    print(f"✓ Всього кластерів назв: {len(all_data['clusters'])}")
     
     # Показуємо статистику по категоріях
     print("\nСтатистика по категоріях:")
@@ -0,0 +1,125 @@
+"""Dictionary phrase removal with an Aho-Corasick automaton.
+
+atb.normalize_product_name used to strip every brand and marketing phrase
+with its own ``re.sub(r'\\b<phrase>\\b', '', title, flags=re.IGNORECASE)``,
+so the cost grew linearly with the dictionary. ``PhraseStripper`` compiles
+the whole dictionary into one automaton and finds every occurrence in a
+single left-to-right pass over the title. The cost depends on the title
+length and the number of hits, not on the number of phrases.
+
+Matching is case-insensitive. A hit counts only on ``\\b`` word boundaries,
+the same as the regex version. Overlapping hits resolve leftmost-longest.
+"""
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+
+def _is_word(ch: str) -> bool:
+    # Same notion of a word character as ``\w`` in a ``str`` pattern.
+    return ch.isalnum() or ch == "_"
+
+
+def _lower(text: str) -> str:
+    # Per-character lowering that keeps offsets aligned with ``text``
+    # (a few characters, e.g. "İ", lower to two code points).
+    out = text.lower()
+    if len(out) == len(text):
+        return out
+    return "".join(c if len(c.lower()) != 1 else c.lower() for c in text)
+
+
+class PhraseStripper:
+    def __init__(self, phrases: Iterable[str]) -> None:
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # node -> lengths of the phrases ending there, longest first
+        self._out: List[Tuple[int, ...]] = [()]
+        self.phrases = sorted({_lower(p.strip()) for p in phrases if p and p.strip()})
+        for phrase in self.phrases:
+            node = 0
+            for ch in phrase:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                node = nxt
+            self._out[node] = (len(phrase),)
+        self._link()
+
+    def _link(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = tuple(sorted(set(self._out[nxt] + self._out[self._fail[nxt]]), reverse=True))
+
+    def __len__(self) -> int:
+        return len(self.phrases)
+
+    def find(self, text: str) -> List[Tuple[int, int]]:
+        """Non-overlapping (start, end) spans of dictionary phrases on word boundaries."""
+        low = _lower(text)
+        n = len(text)
+        goto, fail, out = self._goto, self._fail, self._out
+        hits: List[Tuple[int, int]] = []
+        node = 0
+        for j, ch in enumerate(low):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if not out[node]:
+                continue
+            end = j + 1
+            for length in out[node]:
+                start = end - length
+                # \b before and after: word-ness must change across each edge.
+                if (start > 0 and _is_word(text[start - 1])) == _is_word(text[start]):
+                    continue
+                if (end < n and _is_word(text[end])) == _is_word(text[end - 1]):
+                    continue
+                hits.append((start, end))
+        if len(hits) < 2:
+            return hits
+        hits.sort(key=lambda h: (h[0], -h[1]))
+        spans: List[Tuple[int, int]] = []
+        last_end = -1
+        for start, end in hits:
+            if start >= last_end:
+                spans.append((start, end))
+                last_end = end
+        return spans
+
+    def strip(self, text: str, repl: str = "") -> str:
+        spans = self.find(text)
+        if not spans:
+            return text
+        parts: List[str] = []
+        pos = 0
+        for start, end in spans:
+            parts.append(text[pos:start])
+            parts.append(repl)
+            pos = end
+        parts.append(text[pos:])
+        return "".join(parts)
+
+
+def load_phrases(path: Path) -> List[str]:
+    """One phrase per line; blank lines and ``#`` comments are ignored."""
+    if not path.exists():
+        return []
+    phrases: List[str] = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        line = line.split("#", 1)[0].strip()
+        if line:
+            phrases.append(line)
+    return phrases
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""Columnar, array-backed storage for price candidates.
+
+One ``PriceCandidate`` dataclass per listing costs several hundred bytes
+(two str objects, boxed floats, Optional strings), and a ``Dict[str,
+List[int]]`` inverted index boxes every posting. For Metro-scale catalogs
+this adds up to gigabytes, so this module keeps the same data in columns:
+
+- raw and normalized titles live in two string pools addressed by offsets;
+- prices are an ``array('d')``, unit codes and flags are ``array('B')``;
+- postings of every token are packed into one ``array('I')``.
+
+Rows are materialized on access, so callers that do ``candidates[i]`` and
+``inv.get(tok, [])`` keep working unchanged.
+"""
+import argparse
+import json
+import sys
+import tracemalloc
+from array import array
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+
+# Code 0 is reserved for "no base unit".
+_UNIT_CODES: Sequence[Optional[str]] = (None, "G", "KG", "ML", "L", "PCS")
+
+
+class PostingIndex:
+    """Read-only token -> candidate ids mapping backed by flat arrays."""
+
+    def __init__(self) -> None:
+        self._slots: Dict[str, int] = {}
+        self._offsets = array("I", [0])
+        self._ids = array("I")
+
+    @classmethod
+    def from_lists(cls, lists: Dict[str, "array[int]"]) -> "PostingIndex":
+        idx = cls()
+        for tok, ids in lists.items():
+            idx._slots[tok] = len(idx._offsets) - 1
+            idx._ids.extend(ids)
+            idx._offsets.append(len(idx._ids))
+        return idx
+
+    def subset(self, keep: Sequence[int]) -> "PostingIndex":
+        """Index over the ids with a truthy ``keep[id]``; tokens left without ids are dropped."""
+        lists: Dict[str, "array[int]"] = {}
+        for tok in self._slots:
+            ids = array("I", (i for i in self.get(tok) if keep[i]))
+            if ids:
+                lists[tok] = ids
+        return PostingIndex.from_lists(lists)
+
+    def get(self, tok: str, default: Sequence[int] = ()) -> Sequence[int]:
+        slot = self._slots.get(tok)
+        if slot is None:
+            return default
+        return self._ids[self._offsets[slot] : self._offsets[slot + 1]]
+
+    def __contains__(self, tok: object) -> bool:
+        return tok in self._slots
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._slots)
+
+    def keys(self) -> Iterable[str]:
+        return self._slots.keys()
+
+    def nbytes(self) -> int:
+        return (
+            self._offsets.itemsize * len(self._offsets)
+            + self._ids.itemsize * len(self._ids)
+            + sys.getsizeof(self._slots)
+            + sum(sys.getsizeof(t) for t in self._slots)
+        )
+
+
+class CandidateStore:
+    """Append-only columnar candidate table.
+
+    ``record_type`` is called as ``record_type(raw_title=..., norm_title=...,
+    price=..., base_unit=..., has_explicit_qty=...)`` when a row is read, so
+    the store stays independent of the matcher module.
+    """
+
+    def __init__(self, record_type: Callable[..., Any]) -> None:
+        self._record_type = record_type
+        self._raw_parts: List[str] = []
+        self._norm_parts: List[str] = []
+        self._raw_pool = ""
+        self._norm_pool = ""
+        self._raw_offsets = array("I", [0])
+        self._norm_offsets = array("I", [0])
+        self._raw_len = 0
+        self._norm_len = 0
+        self.prices = array("d")
+        self.unit_codes = array("B")
+        self._units: List[Optional[str]] = list(_UNIT_CODES)
+        self.explicit_qty = array("B")
+        self._building: Optional[Dict[str, "array[int]"]] = {}
+        self.index = PostingIndex()
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def append(
+        self,
+        raw_title: str,
+        norm_title: str,
+        price: float,
+        base_unit: Optional[str],
+        has_explicit_qty: bool,
+        tokens: Iterable[str],
+    ) -> int:
+        if self._building is None:
+            raise RuntimeError("CandidateStore is already frozen")
+
+        i = len(self.prices)
+        self._raw_parts.append(raw_title)
+        self._raw_len += len(raw_title)
+        self._raw_offsets.append(self._raw_len)
+        self._norm_parts.append(norm_title)
+        self._norm_len += len(norm_title)
+        self._norm_offsets.append(self._norm_len)
+
+        self.prices.append(price)
+        self.unit_codes.append(self._unit_code(base_unit))
+        self.explicit_qty.append(1 if has_explicit_qty else 0)
+
+        for tok in set(tokens):
+            ids = self._building.get(tok)
+            if ids is None:
+                ids = self._building[tok] = array("I")
+            ids.append(i)
+        return i
+
+    def freeze(self) -> "CandidateStore":
+        """Join the string pools and pack postings. Call once after loading."""
+        if self._building is None:
+            return self
+        self._raw_pool = "".join(self._raw_parts)
+        self._norm_pool = "".join(self._norm_parts)
+        self._raw_parts = []
+        self._norm_parts = []
+        self.index = PostingIndex.from_lists(self._building)
+        self._building = None
+        return self
+
+    def _unit_code(self, base_unit: Optional[str]) -> int:
+        if not base_unit:
+            return 0
+        u = base_unit.upper()
+        try:
+            return self._units.index(u)
+        except ValueError:
+            # Unknown units are rare; grow the table instead of losing them.
+            if len(self._units) >= 255:
+                raise ValueError(f"Too many distinct base units: {base_unit!r}")
+            self._units.append(u)
+            return len(self._units) - 1
+
+    def raw_title(self, i: int) -> str:
+        return self._raw_pool[self._raw_offsets[i] : self._raw_offsets[i + 1]]
+
+    def norm_title(self, i: int) -> str:
+        return self._norm_pool[self._norm_offsets[i] : self._norm_offsets[i + 1]]
+
+    def base_unit(self, i: int) -> Optional[str]:
+        return self._units[self.unit_codes[i]]
+
+    def __getitem__(self, i: int) -> Any:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._record_type(
+            raw_title=self.raw_title(i),
+            norm_title=self.norm_title(i),
+            price=self.prices[i],
+            base_unit=self.base_unit(i),
+            has_explicit_qty=bool(self.explicit_qty[i]),
+        )
+
+    def __iter__(self) -> Iterator[Any]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def nbytes(self) -> int:
+        """Approximate heap footprint of the columns, pools and index."""
+        cols = (self._raw_offsets, self._norm_offsets, self.prices, self.unit_codes, self.explicit_qty)
+        return (
+            sys.getsizeof(self._raw_pool)
+            + sys.getsizeof(self._norm_pool)
+            + sum(c.itemsize * len(c) for c in cols)
+            + self.index.nbytes()
+        )
+
+
+def _measure(build: Callable[[], Any]) -> int:
+    tracemalloc.start()
+    try:
+        obj = build()
+        size, _peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del obj
+    return size
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Memory benchmark: list-of-dataclasses vs columnar store.")
+    parser.add_argument("--atb", default="atb_products.json")
+    parser.add_argument("--metro", default="metro_full_catalog_all_pages.json")
+    args = parser.parse_args()
+
+    import update_prices as up
+
+    base_dir = Path(__file__).resolve().parent
+    atb_items: List[Dict[str, Any]] = json.loads((base_dir / args.atb).read_text(encoding="utf-8")).get("products") or []
+    metro_items: List[Dict[str, Any]] = json.loads((base_dir / args.metro).read_text(encoding="utf-8"))
+
+    datasets = [
+        ("ATB", atb_items, dict(title_keys=["name", "originalTitle"], price_key="price", base_unit_key="baseUnit")),
+        ("METRO", metro_items, dict(title_keys=["title"], price_key="price")),
+    ]
+    for name, items, kw in datasets:
+
+        def build_lists() -> Any:
+            cands = up._build_candidates(items, **kw)
+            return cands, up._build_inverted_index(cands)
+
+        def build_store() -> Any:
+            return up._build_candidate_store(items, **kw)
+
+        # Warm-up builds, so regex caches are not billed to the first run.
+        n = len(build_store())
+        build_lists()
+        before = _measure(build_lists)
+        after = _measure(build_store)
+        print(f"{name}: {n} candidates")
+        print(f"  dataclasses + dict index: {before / n:8.1f} bytes/candidate ({before / 1e6:.2f} MB)")
+        print(f"  columnar store:           {after / n:8.1f} bytes/candidate ({after / 1e6:.2f} MB)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,300 @@
+"""Shared HTTP plumbing for the catalog scrapers.
+
+- ``RateLimiter``: a thread-safe token bucket shared by all worker threads;
+- ``RetryPolicy``: exponential backoff with full jitter, honouring Retry-After;
+- ``CircuitBreaker``: slows a shared RateLimiter when the site starts
+  throttling, then ramps it back up (AIMD);
+- ``KeepAliveClient``: one persistent ``http.client`` connection per
+  (thread, host), so concurrent workers reuse TCP/TLS sessions;
+- ``JsonArrayWriter``: writes a JSON array record by record;
+- ``script_constant``: a literal constant from a scraper script (atb.py),
+  read without importing the script and its dependencies.
+"""
+import ast
+import http.client
+import json
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Any, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+class RateLimiter:
+    def __init__(self, rate_per_sec: float, burst: int = 1) -> None:
+        if rate_per_sec <= 0:
+            raise ValueError("rate_per_sec must be positive")
+        self.rate = rate_per_sec
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate_per_sec: float) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self.rate = rate_per_sec
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# Statuses worth retrying: throttling and transient server/proxy errors.
+RETRYABLE_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504, 520, 521, 522, 524})
+
+
+def retry_after_seconds(headers: Any) -> Optional[float]:
+    """Delay from a Retry-After header given in seconds (HTTP dates are ignored)."""
+    value = headers.get("Retry-After") if headers is not None else None
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    attempts: int = 4
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Sleep before retry number ``attempt`` (0-based): full jitter over an exponential cap."""
+        cap = min(self.max_delay, self.base_delay * (2 ** attempt))
+        wait = random.uniform(0.0, cap)
+        if retry_after is not None:
+            wait = max(wait, min(retry_after, self.max_delay))
+        return wait
+
+
+class CircuitBreaker:
+    """Slows a shared RateLimiter when failures dominate recent requests.
+
+    Trips when, within the last ``window`` seconds, there were at least
+    ``threshold`` failures and they make up at least ``failure_ratio`` of
+    the requests. Scattered transient errors (retried anyway) do not trip
+    it; sustained throttling does. Tripping halves the limiter's rate (down
+    to ``min_rate``) and pauses all requests for ``cooldown`` seconds.
+    Every ``recover_after`` consecutive successes raise the rate by 25%
+    again, up to the original rate.
+    """
+
+    def __init__(
+        self,
+        limiter: RateLimiter,
+        threshold: int = 3,
+        failure_ratio: float = 0.5,
+        window: float = 10.0,
+        cooldown: float = 2.0,
+        min_rate: Optional[float] = None,
+        recover_after: int = 10,
+    ) -> None:
+        self.limiter = limiter
+        self.base_rate = limiter.rate
+        self.min_rate = min_rate if min_rate is not None else limiter.rate / 8
+        self.threshold = threshold
+        self.failure_ratio = failure_ratio
+        self.window = window
+        self.cooldown = cooldown
+        self.recover_after = recover_after
+        self._recent: Deque[Tuple[float, bool]] = deque()
+        self._failures = 0
+        self._successes = 0
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"successes": 0, "failures": 0, "trips": 0}
+
+    def wait(self) -> None:
+        """Block while the breaker is open."""
+        while True:
+            with self._lock:
+                remaining = self._open_until - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(remaining)
+
+    def _record(self, ok: bool) -> float:
+        now = time.monotonic()
+        self._recent.append((now, ok))
+        if not ok:
+            self._failures += 1
+        while self._recent and self._recent[0][0] < now - self.window:
+            _, old_ok = self._recent.popleft()
+            if not old_ok:
+                self._failures -= 1
+        return now
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._record(True)
+            self.stats["successes"] += 1
+            self._successes += 1
+            if self._successes >= self.recover_after and self.limiter.rate < self.base_rate:
+                self._successes = 0
+                self.limiter.set_rate(min(self.base_rate, self.limiter.rate * 1.25))
+
+    def record_failure(self) -> None:
+        with self._lock:
+            now = self._record(False)
+            self.stats["failures"] += 1
+            self._successes = 0
+            if (
+                self._failures >= self.threshold
+                and self._failures >= self.failure_ratio * len(self._recent)
+                and now >= self._open_until
+            ):
+                self._recent.clear()
+                self._failures = 0
+                self._open_until = now + self.cooldown
+                self.limiter.set_rate(max(self.min_rate, self.limiter.rate / 2))
+                self.stats["trips"] += 1
+
+
+class HttpResponse:
+    def __init__(self, status: int, headers: Dict[str, str], body: bytes) -> None:
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self) -> Any:
+        return json.loads(self.body.decode("utf-8"))
+
+
+# Methods that may be resent after a dropped connection without repeating a side effect.
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+class KeepAliveClient:
+    def __init__(self, timeout: float = 15.0, headers: Optional[Dict[str, str]] = None) -> None:
+        self.timeout = timeout
+        self.headers = dict(headers or {})
+        self._local = threading.local()
+        # Every thread's connection map, so close() can reach them all.
+        self._pools: List[Dict[Tuple[str, str], http.client.HTTPConnection]] = []
+        self._pools_lock = threading.Lock()
+
+    def _connection(self, scheme: str, netloc: str) -> http.client.HTTPConnection:
+        conns: Optional[Dict[Tuple[str, str], http.client.HTTPConnection]] = getattr(self._local, "conns", None)
+        if conns is None:
+            conns = self._local.conns = {}
+            with self._pools_lock:
+                self._pools.append(conns)
+        conn = conns.get((scheme, netloc))
+        if conn is None:
+            cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            conn = cls(netloc, timeout=self.timeout)
+            conns[(scheme, netloc)] = conn
+        return conn
+
+    def _drop(self, scheme: str, netloc: str) -> None:
+        conn = self._local.conns.pop((scheme, netloc), None)
+        if conn is not None:
+            conn.close()
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> HttpResponse:
+        return self.request("GET", url, headers=headers)
+
+    def post_json(
+        self, url: str, payload: Any, headers: Optional[Dict[str, str]] = None, retry: bool = False
+    ) -> HttpResponse:
+        """POST ``payload`` as JSON. Pass ``retry=True`` only if the endpoint is safe to call twice."""
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        return self.request("POST", url, body, {"Content-Type": "application/json", **(headers or {})}, retry=retry)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        body: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+        retry: Optional[bool] = None,
+    ) -> HttpResponse:
+        """Send one request on this thread's keep-alive connection.
+
+        ``retry`` (default: only for IDEMPOTENT_METHODS) resends the request
+        once on a fresh connection if the kept-alive one turns out to be dead.
+        """
+        parts = urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        hdrs = {**self.headers, **(headers or {})}
+        if retry is None:
+            retry = method.upper() in IDEMPOTENT_METHODS
+
+        # A keep-alive connection may have been closed by the server while idle;
+        # retry once on a fresh connection before giving up.
+        attempts = 2 if retry else 1
+        for attempt in range(1, attempts + 1):
+            conn = self._connection(parts.scheme, parts.netloc)
+            try:
+                conn.request(method, path, body=body, headers=hdrs)
+                resp = conn.getresponse()
+                data = resp.read()
+            except (http.client.HTTPException, ConnectionError, OSError):
+                self._drop(parts.scheme, parts.netloc)
+                if attempt == attempts:
+                    raise
+                continue
+            if resp.will_close:
+                self._drop(parts.scheme, parts.netloc)
+            return HttpResponse(resp.status, {k.lower(): v for k, v in resp.getheaders()}, data)
+        raise RuntimeError("unreachable")
+
+    def close(self) -> None:
+        """Close every thread's connections; call once the worker threads are done."""
+        with self._pools_lock:
+            pools = list(self._pools)
+        for conns in pools:
+            for conn in list(conns.values()):
+                conn.close()
+            conns.clear()
+
+
+class JsonArrayWriter:
+    """Thread-safe streaming writer for a top-level JSON array."""
+
+    def __init__(self, fh: IO[str], indent: Optional[int] = 4) -> None:
+        self._fh = fh
+        self._indent = indent
+        self._lock = threading.Lock()
+        self.count = 0
+        fh.write("[")
+
+    def write(self, record: Any) -> None:
+        text = json.dumps(record, ensure_ascii=False, indent=self._indent)
+        if self._indent is not None:
+            pad = " " * self._indent
+            text = "\n" + "\n".join(pad + line for line in text.splitlines())
+        with self._lock:
+            if self.count:
+                self._fh.write(",")
+            self._fh.write(text)
+            self.count += 1
+
+    def close(self) -> None:
+        with self._lock:
+            self._fh.write("\n]\n" if self.count and self._indent is not None else "]\n")
+
+
+def script_constant(script: Path, name: str) -> Any:
+    """A literal module constant from ``script``, read without importing it (atb.py needs bs4)."""
+    tree = ast.parse(script.read_text(encoding="utf-8"))
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(isinstance(t, ast.Name) and t.id == name for t in node.targets):
+            return ast.literal_eval(node.value)
+    raise KeyError(f"{name} not found in {script}")
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""Fast scorer with the same results as update_prices._score.
+
+``_score(a, b) = 0.65 * Jaccard(tokens) + 0.35 * SequenceMatcher(None, a, b).ratio()``
+
+The scorer keeps the formula but avoids most of its cost:
+
+- the candidates' tokens are interned to small ints up front, and each
+  candidate's token set is kept as a sorted tuple of ids (about 8 bytes per
+  token, whatever the vocabulary size), so the Jaccard term is one C-level
+  set intersection. Query tokens outside that vocabulary cannot match any
+  candidate; they are counted, never interned, so the scorer is read-only
+  after construction and one instance can serve every thread;
+- an upper bound on the sequence term (the length-only
+  ``real_quick_ratio()``, then the LCS-based Indel ratio from rapidfuzz when
+  it is installed) gives an upper bound on the whole score. Candidates that
+  cannot beat the current runner-up are skipped before any
+  SequenceMatcher work;
+- the exact ratio comes from cydifflib (a compiled, drop-in difflib) when
+  installed, otherwise from difflib.
+
+Tolerance: with difflib the scores are bit-identical to ``_score``. The
+bounds only skip candidates, so best/runner-up selection, including
+tie-breaking by rank, is unchanged. With cydifflib the scores agree to
+1e-12. ``python fast_score.py`` checks both claims on the bundled catalogs
+(with timings); test_fast_score.py runs the same checks under pytest.
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+try:
+    from cydifflib import SequenceMatcher  # type: ignore
+except ImportError:
+    from difflib import SequenceMatcher
+
+try:
+    from rapidfuzz.distance import Indel  # type: ignore
+except ImportError:
+    Indel = None
+
+
+TOLERANCE = 1e-12
+
+
+def _real_quick_ratio(la: int, lb: int) -> float:
+    # Same value as SequenceMatcher.real_quick_ratio(), without building one.
+    return 2.0 * min(la, lb) / (la + lb) if la + lb else 1.0
+
+
+class FastScorer:
+    def __init__(self, candidates: Sequence[Any], tokenize: Callable[[str], List[str]]) -> None:
+        self._tokenize = tokenize
+        self._id_of: Dict[str, int] = {}
+        self._cand_ids: List[Tuple[int, ...]] = []
+        self._norms: List[str] = []
+        for cand in candidates:
+            norm = cand.norm_title
+            ids = set()
+            for t in tokenize(norm):
+                tid = self._id_of.get(t)
+                if tid is None:
+                    tid = self._id_of[t] = len(self._id_of)
+                ids.add(tid)
+            self._cand_ids.append(tuple(sorted(ids)))
+            self._norms.append(norm)
+        # Diagnostics only: unsynchronized, so approximate when threads share the scorer.
+        self.stats = {"scored": 0, "pruned": 0}
+
+    def _query(self, q_norm: str) -> Tuple[FrozenSet[int], int]:
+        """Ids of the query's known tokens, and its number of distinct tokens."""
+        toks = set(self._tokenize(q_norm))
+        id_of = self._id_of
+        return frozenset(id_of[t] for t in toks if t in id_of), len(toks)
+
+    def score(self, q_norm: str, i: int) -> float:
+        """Exactly _score(q_norm, candidates[i].norm_title)."""
+        q_ids, q_cnt = self._query(q_norm)
+        c_ids, c_norm = self._cand_ids[i], self._norms[i]
+        if not q_norm or not c_norm or not q_cnt or not c_ids:
+            return 0.0
+        inter = len(q_ids.intersection(c_ids))
+        jacc = inter / (q_cnt + len(c_ids) - inter)
+        return 0.65 * jacc + 0.35 * SequenceMatcher(None, q_norm, c_norm).ratio()
+
+    def best_of(self, q_norm: str, ranked_ids: Sequence[int]) -> Tuple[Optional[int], float, float]:
+        """(best id, best score, runner-up score) over ``ranked_ids``.
+
+        Same result as scoring every id with _score in order and keeping the
+        first maximum, but candidates whose upper bound cannot change the
+        best or the runner-up are not scored.
+        """
+        q_ids, q_cnt = self._query(q_norm)
+        if not q_norm or not q_cnt:
+            return None, 0.0, 0.0
+        q_len = len(q_norm)
+
+        # Cheap pass: exact Jaccard term + length-only bound for the ratio.
+        pre: List[Tuple[float, float, int, int, str]] = []
+        for pos, i in enumerate(ranked_ids):
+            c_ids, c_norm = self._cand_ids[i], self._norms[i]
+            if not c_norm or not c_ids:
+                pre.append((0.0, 0.0, pos, i, c_norm))
+                continue
+            inter = len(q_ids.intersection(c_ids))
+            jpart = 0.65 * (inter / (q_cnt + len(c_ids) - inter))
+            pre.append((jpart + 0.35 * _real_quick_ratio(q_len, len(c_norm)), jpart, pos, i, c_norm))
+
+        # Visit the most promising first so the runner-up bar rises quickly.
+        pre.sort(key=lambda x: (-x[0], x[2]))
+
+        best_id: Optional[int] = None
+        best_pos = -1
+        best = 0.0
+        second = 0.0
+        for ub, jpart, pos, i, c_norm in pre:
+            if ub < second or (ub == second and second < best):
+                self.stats["pruned"] += 1
+                continue
+            if ub == 0.0:
+                sc = 0.0
+            else:
+                if Indel is not None:
+                    ub = jpart + 0.35 * Indel.normalized_similarity(q_norm, c_norm)
+                    if ub < second or (ub == second and second < best):
+                        self.stats["pruned"] += 1
+                        continue
+                sc = jpart + 0.35 * SequenceMatcher(None, q_norm, c_norm).ratio()
+                self.stats["scored"] += 1
+
+            # Replay _find_best_price's update rule as if visited in rank order.
+            if best_id is None or sc > best or (sc == best and pos < best_pos):
+                if best_id is not None:
+                    second = max(second, best)
+                if sc > 0.0 or best_id is None:
+                    best_id, best_pos, best = i, pos, sc
+            else:
+                second = max(second, sc)
+
+        if best == 0.0:
+            # _find_best_price never records a zero-score winner.
+            return None, 0.0, 0.0
+        return best_id, best, second
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Verify FastScorer against update_prices._score on the bundled catalogs.")
+    parser.add_argument("--product-data", default="product_data.json")
+    parser.add_argument("--atb", default="atb_products.json")
+    parser.add_argument("--metro", default="metro_full_catalog_all_pages.json")
+    args = parser.parse_args()
+
+    import update_prices as up
+
+    base_dir = Path(__file__).resolve().parent
+    products = json.loads((base_dir / args.product_data).read_text(encoding="utf-8"))
+    atb = json.loads((base_dir / args.atb).read_text(encoding="utf-8")).get("products") or []
+    metro = json.loads((base_dir / args.metro).read_text(encoding="utf-8"))
+    stores = {
+        "ATB": up._build_candidate_store(atb, ["name", "originalTitle"], "price", "baseUnit"),
+        "METRO": up._build_candidate_store(metro, ["title"], "price"),
+    }
+
+    pairs = 0
+    max_diff = 0.0
+    mismatched = 0
+    slow_t = fast_t = 0.0
+    for name, store in stores.items():
+        scorer = FastScorer(store, up._tokenize)
+        for p in products:
+            title = p.get("title")
+            if not isinstance(title, str) or not title.strip():
+                continue
+            q_norm = up._normalize_title(title)
+            ids: List[int] = []
+            for t in set(up._tokenize(q_norm)):
+                ids.extend(store.index.get(t, ()))
+            ids = sorted(set(ids))
+            for i in ids:
+                diff = abs(scorer.score(q_norm, i) - up._score(q_norm, store.norm_title(i)))
+                max_diff = max(max_diff, diff)
+                pairs += 1
+
+            unit = p.get("unit") if isinstance(p.get("unit"), str) else ""
+            t0 = time.perf_counter()
+            slow = up._find_best_id(title, unit, store, store.index, 0.62, 1, 0.06)
+            t1 = time.perf_counter()
+            fast = up._find_best_id(title, unit, store, store.index, 0.62, 1, 0.06, scorer=scorer)
+            t2 = time.perf_counter()
+            slow_t += t1 - t0
+            fast_t += t2 - t1
+            if slow != fast:
+                mismatched += 1
+                print(f"MISMATCH [{name}] {title}: {slow} vs {fast}")
+        print(f"{name}: scored {scorer.stats['scored']}, pruned {scorer.stats['pruned']}")
+
+    print(f"Pairs compared: {pairs}, max |fast - _score| = {max_diff:.3g} (tolerance {TOLERANCE:g})")
+    print(f"_find_best_id mismatches: {mismatched}")
+    print(f"Matching time: _score {slow_t:.2f}s, FastScorer {fast_t:.2f}s")
+    return 0 if max_diff <= TOLERANCE and not mismatched else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""Local fixture server for testing the scrapers without the real sites.
+
+Serves the bundled catalogs over HTTP/1.1 with keep-alive:
+
+- ``/stores/<id>/categories/<category>/products/?page=N&per_page=M`` --
+  a zakaz.ua-style JSON API built from metro_full_catalog_all_pages.json
+  (prices in kopecks, ETag + If-None-Match support);
+- ``/uk/catalog/<slug>?page=N`` -- ATB-style catalog HTML built from
+  atb_products.json, 24 items per page, with a windowed pagination block.
+  Pages past the end repeat the last page, like the real site. Category slugs
+  come from ``CATEGORIES`` in atb.py;
+- ``/images/<slug>/<n>.png`` -- the card images: small solid-colour PNGs.
+  Products whose titles start with the same word get the same bytes under
+  different URLs, to exercise image_pipeline.py's content dedup.
+
+Catalog files are re-read when they change on disk, so incremental modes can
+be tested by editing them while the server runs.
+
+Fault injection (for retry/backoff testing) applies to every catalog request:
+``--fault-rate`` answers that fraction with 503 (half of them with
+Retry-After), ``--drop-rate`` closes the connection without a response, and
+``--throttle-rps`` answers 429 while the request rate over the last second
+exceeds the limit. ``--fault-seed`` makes the sequence reproducible.
+
+    python fixture_server.py --port 8765 &
+    python metro.py --api-base http://127.0.0.1:8765 --out /tmp/metro.json
+    python atb.py --site http://127.0.0.1:8765 --rate 50 --out /tmp/atb.json
+    python fixture_server.py --fault-rate 0.2 --drop-rate 0.05 --throttle-rps 20
+"""
+import argparse
+import ast
+import hashlib
+import html
+import json
+import random
+import socket
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+
+ATB_PAGE_SIZE = 24
+
+
+def _atb_categories(atb_script: Path) -> Dict[str, str]:
+    """slug -> category name, read from atb.py without importing it (it needs bs4)."""
+    tree = ast.parse(atb_script.read_text(encoding="utf-8"))
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(isinstance(t, ast.Name) and t.id == "CATEGORIES" for t in node.targets):
+            return {url.rstrip("/").rsplit("/", 1)[-1]: name for url, name in ast.literal_eval(node.value)}
+    return {}
+
+
+def _png(rgb: Tuple[int, int, int], size: int = 64) -> bytes:
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    rows = b"".join(b"\x00" + bytes(rgb) * size for _ in range(size))
+    header = struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b"")
+
+
+def _atb_image(title: str) -> bytes:
+    # Same first word, same picture.
+    words = title.lower().split()
+    h = zlib.crc32((words[0] if words else "").encode("utf-8"))
+    return _png((h & 0xFF, (h >> 8) & 0xFF, (h >> 16) & 0xFF))
+
+
+def _atb_page_html(slug: str, items: List[Dict[str, Any]], page: int, pages: int, start: int = 0) -> bytes:
+    cards = "".join(
+        '<article class="catalog-item">'
+        f'<img class="catalog-item__img" src="/images/{slug}/{start + i}.png" alt="{html.escape(p["originalTitle"])}">'
+        f'<div class="catalog-item__title"><a href="/uk/product/{i}">{html.escape(p["originalTitle"])}</a></div>'
+        f'<data class="product-price__top" value="{p["price"]}"><span>{p["price"]}</span></data>'
+        "</article>"
+        for i, p in enumerate(items)
+    )
+    shown = sorted({1, pages, *range(max(1, page - 2), min(pages, page + 2) + 1)})
+    links = "".join(
+        f'<li class="product-pagination__item"><a class="product-pagination__link" href="/uk/catalog/{slug}?page={n}">{n}</a></li>'
+        for n in shown
+    )
+    nav = f'<nav class="product-pagination"><ul class="product-pagination__list">{links}</ul></nav>' if pages > 1 else ""
+    return f"<!DOCTYPE html><html><body><main>{cards}</main>{nav}</body></html>".encode("utf-8")
+
+
+class FixtureData:
+    def __init__(self, metro_path: Path, atb_path: Optional[Path] = None, atb_script: Optional[Path] = None) -> None:
+        self.metro_path = metro_path
+        self.atb_path = atb_path
+        self.atb_script = atb_script
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._metro: Dict[str, List[Dict[str, Any]]] = {}
+        self._atb_mtime: Optional[float] = None
+        self._atb: Dict[str, List[Dict[str, Any]]] = {}
+
+    def atb(self) -> Dict[str, List[Dict[str, Any]]]:
+        """slug -> products, in catalog order."""
+        if self.atb_path is None or self.atb_script is None:
+            return {}
+        with self._lock:
+            mtime = self.atb_path.stat().st_mtime
+            if mtime != self._atb_mtime:
+                by_name: Dict[str, List[Dict[str, Any]]] = {}
+                for p in json.loads(self.atb_path.read_text(encoding="utf-8")).get("products") or []:
+                    by_name.setdefault(p["category"], []).append(p)
+                self._atb = {slug: by_name.get(name, []) for slug, name in _atb_categories(self.atb_script).items()}
+                self._atb_mtime = mtime
+            return self._atb
+
+    def metro(self) -> Dict[str, List[Dict[str, Any]]]:
+        with self._lock:
+            mtime = self.metro_path.stat().st_mtime
+            if mtime != self._mtime:
+                by_cat: Dict[str, List[Dict[str, Any]]] = {}
+                for rec in json.loads(self.metro_path.read_text(encoding="utf-8")):
+                    by_cat.setdefault(rec["category"], []).append(
+                        {"title": rec["title"], "price": int(round(rec["price"] * 100))}
+                    )
+                self._metro = by_cat
+                self._mtime = mtime
+            return self._metro
+
+
+class FaultInjector:
+    def __init__(self, fault_rate: float = 0.0, drop_rate: float = 0.0, throttle_rps: float = 0.0, seed: Optional[int] = None) -> None:
+        self.fault_rate = fault_rate
+        self.drop_rate = drop_rate
+        self.throttle_rps = throttle_rps
+        self._rng = random.Random(seed)
+        self._recent: "deque[float]" = deque()
+        self._lock = threading.Lock()
+        self.stats = {"ok": 0, "fault": 0, "drop": 0, "throttled": 0}
+
+    def decide(self) -> str:
+        """'ok', 'fault', 'drop' or 'throttled' for the next request."""
+        with self._lock:
+            now = time.monotonic()
+            self._recent.append(now)
+            while self._recent and self._recent[0] < now - 1.0:
+                self._recent.popleft()
+            if self.throttle_rps and len(self._recent) > self.throttle_rps:
+                outcome = "throttled"
+            else:
+                r = self._rng.random()
+                if r < self.drop_rate:
+                    outcome = "drop"
+                elif r < self.drop_rate + self.fault_rate:
+                    outcome = "fault"
+                else:
+                    outcome = "ok"
+            self.stats[outcome] += 1
+            return outcome
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "FixtureServer"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _inject_fault(self) -> bool:
+        outcome = self.server.faults.decide()
+        if outcome == "drop":
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return True
+        if outcome == "throttled":
+            self._send(429, b"too many requests", "text/plain", {"Retry-After": "1"})
+            return True
+        if outcome == "fault":
+            headers = {"Retry-After": "1"} if self.server.faults._rng.random() < 0.5 else {}
+            self._send(503, b"service unavailable", "text/plain", headers)
+            return True
+        return False
+
+    def do_GET(self) -> None:
+        parts = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        segs = [s for s in parts.path.split("/") if s]
+        if segs and segs[0] in ("stores", "uk", "images") and self._inject_fault():
+            return
+
+        if len(segs) == 5 and segs[0] == "stores" and segs[2] == "categories" and segs[4] == "products":
+            status, body, headers = self._metro_products(segs[3], query)
+            if status == 304:
+                self.send_response(304)
+                self.send_header("ETag", headers["ETag"])
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self._send(status, body, "application/json", headers)
+            return
+
+        if len(segs) == 3 and segs[0] == "uk" and segs[1] == "catalog":
+            status, body = self._atb_page(segs[2], query)
+            self._send(status, body, "text/html; charset=utf-8")
+            return
+
+        if len(segs) == 3 and segs[0] == "images" and segs[2].endswith(".png"):
+            body = self._atb_image(segs[1], segs[2][: -len(".png")])
+            if body is None:
+                self._send(404, b"not found", "text/plain")
+            else:
+                self._send(200, body, "image/png", {"Cache-Control": "max-age=86400"})
+            return
+
+        self._send(404, b"not found", "text/plain")
+
+    def _atb_image(self, slug: str, n: str) -> Optional[bytes]:
+        items = self.server.data.atb().get(slug)
+        if items is None or not n.isdigit() or int(n) >= len(items):
+            return None
+        return _atb_image(items[int(n)]["originalTitle"])
+
+    def _atb_page(self, slug: str, query: Dict[str, str]) -> Tuple[int, bytes]:
+        items = self.server.data.atb().get(slug)
+        if items is None:
+            return 404, b"<html><body>404</body></html>"
+        pages = max(1, -(-len(items) // ATB_PAGE_SIZE))
+        page = min(max(1, int(query.get("page", "1"))), pages)
+        chunk = items[(page - 1) * ATB_PAGE_SIZE : page * ATB_PAGE_SIZE]
+        return 200, _atb_page_html(slug, chunk, page, pages, start=(page - 1) * ATB_PAGE_SIZE)
+
+    def _metro_products(self, category: str, query: Dict[str, str]) -> Tuple[int, bytes, Dict[str, str]]:
+        items = self.server.data.metro().get(category)
+        if items is None:
+            return 404, b'{"detail": "Not found"}', {}
+        page = max(1, int(query.get("page", "1")))
+        per_page = max(1, int(query.get("per_page", "30")))
+        chunk = items[(page - 1) * per_page : page * per_page]
+        body = json.dumps({"count": len(items), "results": chunk}, ensure_ascii=False).encode("utf-8")
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            return 304, b"", {"ETag": etag}
+        return 200, body, {"ETag": etag}
+
+
+class FixtureServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self, addr: Tuple[str, int], data: FixtureData, verbose: bool = False, faults: Optional[FaultInjector] = None
+    ) -> None:
+        super().__init__(addr, FixtureHandler)
+        self.data = data
+        self.verbose = verbose
+        self.faults = faults or FaultInjector()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--metro", default="metro_full_catalog_all_pages.json")
+    parser.add_argument("--atb", default="atb_products.json")
+    parser.add_argument("--fault-rate", type=float, default=0.0, help="Fraction of requests answered with 503.")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Fraction of connections closed without a response.")
+    parser.add_argument("--throttle-rps", type=float, default=0.0, help="Answer 429 above this many requests/s (0 = off).")
+    parser.add_argument("--fault-seed", type=int, default=None)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    base_dir = Path(__file__).resolve().parent
+    data = FixtureData(
+        metro_path=(base_dir / args.metro).resolve(),
+        atb_path=(base_dir / args.atb).resolve(),
+        atb_script=base_dir / "atb.py",
+    )
+    faults = FaultInjector(args.fault_rate, args.drop_rate, args.throttle_rps, args.fault_seed)
+    server = FixtureServer((args.host, args.port), data, verbose=args.verbose, faults=faults)
+    print(f"Fixture server on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if any(faults.stats[k] for k in ("fault", "drop", "throttled")):
+            print(f"Requests: {faults.stats}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,123 @@
+"""Typo-tolerant token lookup over a fixed vocabulary (SymSpell-style).
+
+Every vocabulary term is expanded once into its deletion neighborhood (all
+strings obtained by deleting up to ``max_distance`` characters). A query
+term is expanded the same way; any vocabulary term sharing a deletion
+variant is a candidate and is verified with a bounded Damerau-Levenshtein
+distance. Lookups touch O(len(term) ** max_distance) hash buckets, which is
+independent of the vocabulary size.
+
+Before the edit-distance search, terms that mix Latin and Cyrillic letters
+are folded to Cyrillic ("kpeм" -> "крем"): scraped titles often contain
+Latin look-alikes, and folding fixes them at distance 0.
+"""
+from itertools import combinations
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+_LATIN_TO_CYRILLIC = str.maketrans(
+    {
+        "a": "а",
+        "b": "в",
+        "c": "с",
+        "e": "е",
+        "h": "н",
+        "i": "і",
+        "k": "к",
+        "m": "м",
+        "o": "о",
+        "p": "р",
+        "t": "т",
+        "x": "х",
+        "y": "у",
+    }
+)
+
+
+def fold_homoglyphs(term: str) -> str:
+    has_latin = any("a" <= ch <= "z" for ch in term)
+    has_cyrillic = any("а" <= ch <= "я" or ch in "іїєґ" for ch in term)
+    if has_latin and has_cyrillic:
+        return term.translate(_LATIN_TO_CYRILLIC)
+    return term
+
+
+def _deletes(term: str, max_distance: int) -> Set[str]:
+    out = {term}
+    n = len(term)
+    for d in range(1, min(max_distance, n - 1) + 1):
+        for idx in combinations(range(n), d):
+            skip = set(idx)
+            out.add("".join(ch for i, ch in enumerate(term) if i not in skip))
+    return out
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance, or ``limit + 1`` if it exceeds ``limit``."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2: List[int] = []
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        row_min = cur[0]
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            v = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                v = min(v, prev2[j - 2] + 1)
+            cur[j] = v
+            row_min = min(row_min, v)
+        if row_min > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1] if prev[-1] <= limit else limit + 1
+
+
+class SymSpellIndex:
+    def __init__(self, vocabulary: Dict[str, int], max_distance: int = 1, min_length: int = 4) -> None:
+        """``vocabulary`` maps term -> frequency; frequency breaks distance ties."""
+        self.max_distance = max_distance
+        self.min_length = min_length
+        self._freq = dict(vocabulary)
+        self._neighbors: Dict[str, List[str]] = {}
+        for term in self._freq:
+            if len(term) < min_length:
+                continue
+            for d in _deletes(term, max_distance):
+                self._neighbors.setdefault(d, []).append(term)
+
+    def __contains__(self, term: object) -> bool:
+        return term in self._freq
+
+    def lookup(self, term: str) -> Optional[str]:
+        """Closest vocabulary term within ``max_distance``, or None."""
+        if term in self._freq:
+            return term
+        folded = fold_homoglyphs(term)
+        if folded in self._freq:
+            return folded
+        if len(folded) < self.min_length:
+            return None
+
+        best: Optional[Tuple[int, int, str]] = None
+        seen: Set[str] = set()
+        for d in _deletes(folded, self.max_distance):
+            for cand in self._neighbors.get(d, ()):
+                if cand in seen:
+                    continue
+                seen.add(cand)
+                dist = edit_distance(folded, cand, self.max_distance)
+                if dist > self.max_distance:
+                    continue
+                key = (dist, -self._freq[cand], cand)
+                if best is None or key < best:
+                    best = key
+        return best[2] if best else None
+
+    @classmethod
+    def from_terms(cls, terms: Iterable[str], **kwargs: int) -> "SymSpellIndex":
+        freq: Dict[str, int] = {}
+        for t in terms:
+            freq[t] = freq.get(t, 0) + 1
+        return cls(freq, **kwargs)
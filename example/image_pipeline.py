@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""Product images: download, deduplicate by content, make thumbnails.
+
+atb.py keeps the image URL of each catalog card in atb_products.json
+(``image``). This tool fills the ``Product.image`` side:
+
+1. collects the products' image URLs, resolving relative ones against ``--site``;
+2. downloads the URLs that are not stored yet on a bounded thread pool.
+   Workers reuse keep-alive connections and share one rate limiter, and
+   failures are retried with backoff behind a circuit breaker
+   (crawl_utils.py);
+3. stores every image once under ``originals/<sha256[:2]>/<sha256>.<ext>``.
+   Different URLs with the same bytes (placeholders, one pack shot for
+   several sizes) share one file;
+4. resizes new originals into ``thumbs/<sha256>.jpg`` in a process pool.
+   This needs Pillow. Without it, thumbnails are skipped and the manifest
+   has ``"thumbnail": null``;
+5. writes ``manifest.json``: for each product (by its listing title), the
+   name and the local image and thumbnail paths, relative to ``--out-dir``.
+
+Reruns read the previous manifest. URLs whose file is still on disk are not
+downloaded again, and existing thumbnails are not rebuilt.
+
+    python image_pipeline.py
+    python fixture_server.py --port 8765 &
+    python atb.py --site http://127.0.0.1:8765 --rate 50 --out /tmp/atb.json
+    python image_pipeline.py --atb /tmp/atb.json --out-dir /tmp/images --rate 50
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+from crawl_utils import (
+    RETRYABLE_STATUSES,
+    CircuitBreaker,
+    KeepAliveClient,
+    RateLimiter,
+    RetryPolicy,
+    retry_after_seconds,
+    script_constant,
+)
+
+try:
+    from PIL import Image  # type: ignore
+except ImportError:
+    Image = None
+
+THUMB_SIZE = 256
+
+# Leading bytes -> file extension. Anything else (an HTML error page, say) is rejected.
+_MAGIC: List[Tuple[bytes, str]] = [
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+]
+
+
+def image_extension(data: bytes) -> Optional[str]:
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return ".webp"
+    for magic, ext in _MAGIC:
+        if data.startswith(magic):
+            return ext
+    return None
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Unique per thread: two workers may store the same content at once.
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+@dataclass(frozen=True)
+class Stored:
+    sha256: str
+    path: str  # relative to the output directory
+    size: int
+    new: bool  # False when the same content was already on disk
+
+
+class ImageStore:
+    """Content-addressed image files under ``root``."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+
+    def original(self, sha: str, ext: str) -> str:
+        return f"originals/{sha[:2]}/{sha}{ext}"
+
+    def thumbnail(self, sha: str) -> str:
+        return f"thumbs/{sha}.jpg"
+
+    def exists(self, rel: Optional[str]) -> bool:
+        return rel is not None and (self.root / rel).is_file()
+
+    def put(self, data: bytes) -> Optional[Stored]:
+        ext = image_extension(data)
+        if ext is None:
+            return None
+        sha = hashlib.sha256(data).hexdigest()
+        rel = self.original(sha, ext)
+        if self.exists(rel):
+            return Stored(sha, rel, len(data), new=False)
+        _write_atomic(self.root / rel, data)
+        return Stored(sha, rel, len(data), new=True)
+
+
+class ImageFetcher:
+    """GET with retries, shared rate limit and circuit breaker (like atb.PageFetcher)."""
+
+    def __init__(self, limiter: RateLimiter, retry: Optional[RetryPolicy] = None, timeout: float = 15.0) -> None:
+        self.limiter = limiter
+        self.retry = retry or RetryPolicy()
+        self.breaker = CircuitBreaker(limiter)
+        self.client = KeepAliveClient(timeout=timeout, headers={"Accept": "image/*"})
+
+    def fetch(self, url: str) -> Tuple[Optional[bytes], str]:
+        """(body, "ok") or (None, reason)."""
+        reason = ""
+        for attempt in range(self.retry.attempts):
+            self.breaker.wait()
+            self.limiter.acquire()
+            retry_after = None
+            try:
+                resp = self.client.get(url)
+            except Exception as e:
+                reason = str(e) or type(e).__name__
+            else:
+                if resp.status == 200:
+                    self.breaker.record_success()
+                    return resp.body, "ok"
+                if resp.status not in RETRYABLE_STATUSES:
+                    return None, f"HTTP {resp.status}"
+                reason = f"HTTP {resp.status}"
+                retry_after = retry_after_seconds(resp.headers)
+            self.breaker.record_failure()
+            if attempt + 1 < self.retry.attempts:
+                time.sleep(self.retry.delay(attempt, retry_after))
+        return None, f"{reason} after {self.retry.attempts} attempts"
+
+
+def _make_thumbnail(src: str, dst: str, size: int) -> Tuple[int, int]:
+    # Runs in a worker process.
+    with Image.open(src) as im:
+        im.thumbnail((size, size))
+        if im.mode not in ("RGB", "L"):
+            im = im.convert("RGBA")
+            bg = Image.new("RGB", im.size, (255, 255, 255))
+            bg.paste(im, mask=im.getchannel("A"))
+            im = bg
+        tmp = f"{dst}.{os.getpid()}.tmp"
+        Path(dst).parent.mkdir(parents=True, exist_ok=True)
+        im.save(tmp, "JPEG", quality=85)
+        os.replace(tmp, dst)
+        return im.size
+
+
+def _load_manifest(path: Path) -> Dict[str, Any]:
+    if not path.exists():
+        return {"urls": {}, "images": {}, "products": {}}
+    manifest = json.loads(path.read_text(encoding="utf-8"))
+    for key in ("urls", "images", "products"):
+        manifest.setdefault(key, {})
+    return manifest
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Download, deduplicate and thumbnail product images from atb_products.json.")
+    parser.add_argument("--atb", default="atb_products.json")
+    parser.add_argument("--out-dir", default="images")
+    parser.add_argument("--site", default=None, help="Base URL for relative image links (default: atb.py's ATB_SITE).")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent downloads.")
+    parser.add_argument("--rate", type=float, default=5.0, help="Maximum requests per second across all workers.")
+    parser.add_argument("--processes", type=int, default=None, help="Thumbnail worker processes (default: CPU count).")
+    parser.add_argument("--thumb-size", type=int, default=THUMB_SIZE, help="Longest thumbnail side in pixels.")
+    parser.add_argument("--limit", type=int, default=0, help="Only the first N products (0 = all).")
+    args = parser.parse_args()
+
+    base_dir = Path(__file__).resolve().parent
+    out_dir = (base_dir / args.out_dir).resolve()
+    store = ImageStore(out_dir)
+    manifest_path = out_dir / "manifest.json"
+    manifest = _load_manifest(manifest_path)
+    site = args.site or script_constant(base_dir / "atb.py", "ATB_SITE")
+
+    products = json.loads((base_dir / args.atb).read_text(encoding="utf-8")).get("products") or []
+    if args.limit:
+        products = products[: args.limit]
+    wanted: Dict[str, str] = {}  # listing title -> absolute image URL
+    for p in products:
+        if isinstance(p.get("image"), str) and p["image"].strip() and isinstance(p.get("originalTitle"), str):
+            wanted[p["originalTitle"]] = urljoin(site.rstrip("/") + "/", p["image"].strip())
+    urls = sorted(set(wanted.values()))
+
+    # Rerun: a URL is done when its original is still on disk.
+    def stored_path(url: str) -> Optional[str]:
+        sha = manifest["urls"].get(url)
+        image = manifest["images"].get(sha) if sha else None
+        return image["path"] if image and store.exists(image["path"]) else None
+
+    todo = [u for u in urls if stored_path(u) is None]
+    print(f"Products: {len(products)}, with image: {len(wanted)}, distinct URLs: {len(urls)}, to download: {len(todo)}")
+
+    started = time.monotonic()
+    fetcher = ImageFetcher(RateLimiter(args.rate, burst=max(1, args.workers)))
+    failed: Dict[str, str] = {}
+    downloaded = new_files = bytes_in = 0
+
+    def download(url: str) -> Tuple[str, Optional[Stored], str]:
+        body, reason = fetcher.fetch(url)
+        if body is None:
+            return url, None, reason
+        stored = store.put(body)
+        return url, stored, "ok" if stored is not None else "not an image"
+
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        for url, stored, reason in pool.map(download, todo):
+            if stored is None:
+                failed[url] = reason
+                continue
+            downloaded += 1
+            bytes_in += stored.size
+            new_files += stored.new
+            manifest["urls"][url] = stored.sha256
+            image = manifest["images"].setdefault(stored.sha256, {"thumbnail": None})
+            image.update(path=stored.path, bytes=stored.size)
+    fetched_at = time.monotonic()
+
+    # Thumbnails for every stored original that does not have one on disk.
+    thumbs_made = 0
+    pending = {
+        sha: img
+        for sha, img in manifest["images"].items()
+        if store.exists(img.get("path")) and not store.exists(img.get("thumbnail"))
+    }
+    if pending and Image is None:
+        print(f"Pillow is not installed: {len(pending)} thumbnails skipped (pip install Pillow)")
+    elif pending:
+        with ProcessPoolExecutor(max_workers=args.processes) as pool:
+            jobs = {
+                sha: pool.submit(_make_thumbnail, str(out_dir / img["path"]), str(out_dir / store.thumbnail(sha)), args.thumb_size)
+                for sha, img in pending.items()
+            }
+            for sha, fut in jobs.items():
+                try:
+                    width, height = fut.result()
+                except Exception as e:
+                    print(f"Thumbnail failed for {manifest['images'][sha]['path']}: {e}")
+                    continue
+                manifest["images"][sha].update(thumbnail=store.thumbnail(sha), width=width, height=height)
+                thumbs_made += 1
+    thumbed_at = time.monotonic()
+
+    names = {p["originalTitle"]: p.get("name") for p in products if isinstance(p.get("originalTitle"), str)}
+    for title, url in wanted.items():
+        sha = manifest["urls"].get(url)
+        image = manifest["images"].get(sha) if sha else None
+        if image is None:
+            continue
+        manifest["products"][title] = {
+            "name": names.get(title),
+            "url": url,
+            "image": image["path"],
+            "thumbnail": image.get("thumbnail"),
+        }
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    _write_atomic(manifest_path, (json.dumps(manifest, ensure_ascii=False, indent=2) + "\n").encode("utf-8"))
+
+    stats = fetcher.breaker.stats
+    print(
+        f"Downloaded {downloaded} images ({bytes_in / 1e6:.1f} MB) in {fetched_at - started:.1f}s: "
+        f"{new_files} new files, {downloaded - new_files} duplicates of stored content"
+    )
+    print(f"Requests ok: {stats['successes']}, failed attempts: {stats['failures']}, breaker trips: {stats['trips']}")
+    if failed:
+        print(f"Failed URLs: {len(failed)}")
+        for url, reason in sorted(failed.items())[:10]:
+            print(f"- {url}: {reason}")
+    print(f"Thumbnails: {thumbs_made} made in {thumbed_at - fetched_at:.1f}s")
+    print(f"Products with an image: {sum(1 for t in wanted if t in manifest['products'])}, "
+          f"distinct images: {len(manifest['images'])}, manifest: {manifest_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
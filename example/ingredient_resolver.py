@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""Resolve free-text recipe ingredients to Product names in one batch.
+
+``RecipeIngredient`` needs a ``productId``, but imported and AI-generated
+recipes name ingredients in free text ("курячого філе", "200 г сиру
+твердого", "2 ст. л. олії"). This tool maps thousands of them at once onto
+the product catalog (product_data.json titles, i.e. ``Product.name``),
+reusing update_prices.py's matching pipeline:
+
+1. amounts are parsed out first: metric sizes via quantities.py, household
+   measures (spoons, glasses, cloves) and bare counts ("2 яйця") here.
+   What remains is the ingredient name;
+2. names go through update_prices' normalization and light stemming.
+   Ingredients are mostly in the genitive ("олії", "сиру", "часнику"),
+   which the stemmer leaves alone, so tokens are cut further to a root:
+   trailing vowels dropped, the і/о alternation folded ("кріп"/"кропу",
+   "сіль"/"солі"), at most four letters ("гречка"/"гречана" -> "греч").
+   Numbers are dropped;
+3. every distinct name is looked up once in an inverted index of catalog
+   roots. The index is built once, so a batch costs one lookup per distinct
+   name, not one catalog scan per ingredient.
+
+Candidates sharing a root are ranked by ``confidence``:
+
+- 0.6 x coverage: the share of the ingredient's roots found in the title;
+- 0.25 x precision: the share of the title's roots found in the ingredient.
+  Extra words in the title count against it ("гречка" is "Крупа гречана",
+  not "Гречка тушкована з м'ясом"), except the qualifiers in ``_DEFAULTS``
+  that a recipe means when it does not say ("часник" is "Часник свіжий",
+  "яйця" are "Курячі яйця");
+- 0.15 x string similarity of the raw names, without the implied
+  qualifiers. Only word-separating commas are dropped from the ingredient,
+  so "молоко 2,5%" picks "Молоко 2,5% жирності" over "Молоко 3,2% жирності".
+
+``margin`` is the lead over the best candidate with a different set of
+roots (titles differing only in numbers, "Молоко 2,5%" / "Молоко 3,2%",
+do not compete). A result is ``resolved`` when the confidence clears
+``--min-confidence`` and the margin clears ``--min-margin``.
+
+``ingredient_samples.json`` lists sample ingredients with the product each
+should resolve to (or null: should stay unresolved); ``--check`` runs them
+against the current catalog and exits non-zero on any difference.
+
+Input is a text file with one ingredient per line, or a JSON list of strings
+or of ``{"productName", "amount", "unit"}`` objects (the AI recipe format).
+
+    python ingredient_resolver.py --in ingredients.txt --out resolved.json
+    python ingredient_resolver.py --check
+"""
+import argparse
+import json
+import re
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+try:
+    from cydifflib import SequenceMatcher  # type: ignore
+except ImportError:
+    from difflib import SequenceMatcher
+
+import update_prices as up
+from candidate_store import CandidateStore
+from quantities import parse_quantities, strip_quantities
+
+# Household measures -> (family, amount in the family's base unit).
+# Spoons and glasses are converted by volume; solids are about as dense.
+_HOUSEHOLD: List[Tuple[str, str, Optional[float]]] = [
+    (r"ст\.?\s*л\.?|столов\w*\s+ложк\w*", "l", 0.015),
+    (r"ч\.?\s*л\.?|чайн\w*\s+ложк\w*", "l", 0.005),
+    (r"склянк\w*", "l", 0.25),
+    (r"зубч\w*|зубок", "pcs", 1.0),
+    (r"пучк?\w*|щіпк\w*|дрібк\w*", "pcs", None),
+]
+_HOUSEHOLD_RE = re.compile(
+    r"(?<!\w)(?P<amt>\d+(?:[.,]\d+)?)?\s*(?:" + "|".join(f"(?P<h{k}>{p})" for k, (p, _f, _a) in enumerate(_HOUSEHOLD)) + r")(?!\w)",
+    re.IGNORECASE,
+)
+_COUNT_RE = re.compile(r"^\s*(\d+(?:[.,]\d+)?)\s+(?=\D)")
+_FILLER_RE = re.compile(r"\bза\s+смаком\b|\bдо\s+смаку\b|\bдля\s+подачі\b|\([^)]*\)", re.IGNORECASE)
+# Commas that separate words; a decimal comma ("2,5%") stays.
+_LIST_COMMA_RE = re.compile(r"(?<!\d),|,(?!\d)")
+
+_FAMILY_UNITS = {"kg": "кг", "l": "л", "pcs": "шт"}
+
+_VOWELS = "аеєиіїоуюяйь'"
+ROOT_LEN = 4
+
+
+def _root(tok: str) -> str:
+    t = up._stem_uk_token(tok)
+    while len(t) > 3 and t[-1] in _VOWELS:
+        t = t[:-1]
+    return t.replace("і", "о")[:ROOT_LEN]
+
+
+def root_tokens(norm: str) -> List[str]:
+    out: List[str] = []
+    for t in up._tokenize(norm):
+        if t == "тм":
+            break  # "Масло вершкове ТМ 'Терем'": the rest is the brand
+        if not t.isdigit():
+            out.append(_root(t))
+    return out
+
+
+# Qualifiers a recipe implies when it names just the product; they are not
+# extra words in a catalog title.
+_DEFAULTS = {
+    _root(w)
+    for w in ("свіжий", "звичайна", "білий", "ріпчаста", "курячі", "соняшникова", "рафінована",
+              "буряковий", "пшеничне", "вищого", "сорту", "крупа", "смажена", "чорний", "твердий",
+              "жирності")
+}
+
+
+@dataclass(frozen=True)
+class Amount:
+    value: Optional[float]  # in kg, l or pieces; None for "a pinch"
+    family: str  # "kg", "l" or "pcs"
+
+
+@dataclass
+class Resolution:
+    ingredient: str
+    name: str  # the ingredient with amounts removed
+    amount: Optional[Amount]
+    product: Optional[str]
+    confidence: float
+    runner_up: Optional[str]
+    margin: float
+    resolved: bool
+
+
+@dataclass(frozen=True)
+class _Hit:
+    best_id: Optional[int] = None
+    confidence: float = 0.0
+    second_id: Optional[int] = None
+    second: float = 0.0
+
+
+def parse_ingredient(text: str) -> Tuple[str, Optional[Amount]]:
+    """(name, amount) for one free-text ingredient."""
+    amount: Optional[Amount] = None
+    qs = parse_quantities(text)
+    if qs:
+        amount = Amount(qs[0].total, qs[0].family)
+        text = strip_quantities(text)
+    m = _HOUSEHOLD_RE.search(text)
+    if m:
+        k = next(int(g[1:]) for g, v in m.groupdict().items() if g.startswith("h") and v)
+        _pattern, family, per_unit = _HOUSEHOLD[k]
+        count = float(m.group("amt").replace(",", ".")) if m.group("amt") else 1.0
+        if amount is None:
+            amount = Amount(count * per_unit if per_unit is not None else None, family)
+        text = text[: m.start()] + " " + text[m.end() :]
+    m = _COUNT_RE.match(text)
+    if m:
+        if amount is None:
+            amount = Amount(float(m.group(1).replace(",", ".")), "pcs")
+        text = text[m.end() :]
+    text = _FILLER_RE.sub(" ", text)
+    return " ".join(_LIST_COMMA_RE.sub(" ", text).split()), amount
+
+
+def _structured(row: Dict[str, Any]) -> str:
+    # {"productName": "сир твердий", "amount": 200, "unit": "г"} -> "200 г сир твердий"
+    parts = [str(row.get(k)) for k in ("amount", "unit") if row.get(k) not in (None, "")]
+    return " ".join(parts + [str(row.get("productName") or row.get("name") or "")])
+
+
+def load_ingredients(path: Path) -> List[str]:
+    text = path.read_text(encoding="utf-8")
+    if path.suffix.lower() != ".json":
+        return [line.strip() for line in text.splitlines() if line.strip()]
+    out: List[str] = []
+    for row in json.loads(text):
+        if isinstance(row, str):
+            out.append(row)
+        elif isinstance(row, dict):
+            out.append(_structured(row))
+    return out
+
+
+class IngredientResolver:
+    def __init__(self, products: List[Dict[str, Any]], min_confidence: float = 0.8, min_margin: float = 0.05) -> None:
+        self.store = CandidateStore(up.PriceCandidate)
+        for p in products:
+            title = p.get("title")
+            if isinstance(title, str) and title.strip():
+                norm = up._normalize_title(title)
+                unit = p.get("unit") if isinstance(p.get("unit"), str) else None
+                # Prices do not matter here.
+                self.store.append(title, norm, 0.0, unit, False, root_tokens(norm))
+        self.store.freeze()
+        self.min_confidence = min_confidence
+        self.min_margin = min_margin
+        self._memo: Dict[str, _Hit] = {}
+
+    def _confidence(self, name: str, q_roots: Set[str], cid: int) -> Tuple[float, float]:
+        """(confidence, string similarity) of one candidate."""
+        implied = _DEFAULTS - q_roots
+        c_roots = set(root_tokens(self.store.norm_title(cid))) - implied
+        shared = len(q_roots & c_roots)
+        coverage = shared / len(q_roots)
+        precision = shared / len(c_roots) if c_roots else 1.0
+        # Raw strings: normalization drops the "20%" that tells sour creams apart.
+        # Implied qualifiers are left out, as in precision.
+        title = " ".join(w for w in self.store.raw_title(cid).lower().split() if _root(w) not in implied)
+        similarity = SequenceMatcher(None, name, title).ratio()
+        return 0.6 * coverage + 0.25 * precision + 0.15 * similarity, similarity
+
+    def _lookup(self, name: str) -> _Hit:
+        """Best product for a name; each distinct name is scored once."""
+        hit = self._memo.get(name)
+        if hit is not None:
+            return hit
+        q_norm = up._normalize_title(name)
+        q_roots = set(root_tokens(q_norm))
+        hit = _Hit()
+        if q_roots:
+            ranked = [i for i, _ov in up._rank_by_overlap(q_roots, self.store.index)[: up.MAX_RANKED]]
+            # Ties on confidence go to the closer string ("Сметана 20%" for "сметана 20%").
+            scored = sorted(((self._confidence(name, q_roots, i), i) for i in ranked), reverse=True)
+            if scored:
+                (best, _sim), best_id = scored[0]
+                implied = _DEFAULTS - q_roots
+                best_roots = set(root_tokens(self.store.norm_title(best_id))) - implied
+                second_id, second = None, 0.0
+                for (conf, _sim), i in scored[1:]:
+                    if set(root_tokens(self.store.norm_title(i))) - implied != best_roots:
+                        second_id, second = i, conf
+                        break
+                hit = _Hit(best_id, best, second_id, second)
+        self._memo[name] = hit
+        return hit
+
+    def resolve(self, ingredients: List[str]) -> List[Resolution]:
+        out: List[Resolution] = []
+        for text in ingredients:
+            name, amount = parse_ingredient(text)
+            hit = self._lookup(name.lower())
+            margin = hit.confidence - hit.second
+            out.append(
+                Resolution(
+                    ingredient=text,
+                    name=name,
+                    amount=amount,
+                    product=self.store.raw_title(hit.best_id) if hit.best_id is not None else None,
+                    confidence=round(hit.confidence, 4),
+                    runner_up=self.store.raw_title(hit.second_id) if hit.second_id is not None else None,
+                    margin=round(margin, 4),
+                    resolved=hit.best_id is not None and hit.confidence >= self.min_confidence and margin >= self.min_margin,
+                )
+            )
+        return out
+
+
+def check_samples(resolver: IngredientResolver, samples: List[Dict[str, Any]]) -> List[str]:
+    """Differences from the expected results; ``"product": null`` means "should stay unresolved"."""
+    results = resolver.resolve([row["ingredient"] for row in samples])
+    problems: List[str] = []
+    for row, r in zip(samples, results):
+        expected = row.get("product")
+        got = r.product if r.resolved else None
+        if got != expected:
+            problems.append(f"{r.ingredient!r}: expected {expected!r}, got {got!r} (best {r.product!r}, {r.confidence:.2f}, margin {r.margin:.2f})")
+    return problems
+
+
+def _format_amount(amount: Optional[Amount]) -> str:
+    if amount is None:
+        return ""
+    if amount.value is None:
+        return f"? {_FAMILY_UNITS[amount.family]}"
+    return f"{amount.value:g} {_FAMILY_UNITS[amount.family]}"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Resolve free-text recipe ingredients to product_data.json product names.")
+    parser.add_argument("--in", dest="in_path", default=None, help="Text file (one per line) or JSON list.")
+    parser.add_argument("--out", dest="out_path", default=None, help="Write the results as JSON.")
+    parser.add_argument("--product-data", default="product_data.json")
+    parser.add_argument("--min-confidence", type=float, default=0.8, help="Confidence needed to count as resolved.")
+    parser.add_argument("--min-margin", type=float, default=0.05, help="Score lead over the runner-up needed to count as resolved.")
+    parser.add_argument("--limit", type=int, default=20, help="Results to print (0 = none).")
+    parser.add_argument("--check", nargs="?", const="ingredient_samples.json", default=None,
+                        help="Check the resolver against samples with expected results (default: ingredient_samples.json).")
+    args = parser.parse_args()
+    if not args.in_path and not args.check:
+        parser.error("--in or --check is required")
+
+    base_dir = Path(__file__).resolve().parent
+    products: List[Dict[str, Any]] = json.loads((base_dir / args.product_data).read_text(encoding="utf-8"))
+    if args.check:
+        samples = json.loads((base_dir / args.check).read_text(encoding="utf-8"))
+        resolver = IngredientResolver(products, min_confidence=args.min_confidence, min_margin=args.min_margin)
+        problems = check_samples(resolver, samples)
+        for line in problems:
+            print(f"- {line}")
+        print(f"Samples: {len(samples)}, as expected: {len(samples) - len(problems)}")
+        return 1 if problems else 0
+
+    ingredients = load_ingredients(base_dir / args.in_path)
+
+    started = time.perf_counter()
+    resolver = IngredientResolver(products, min_confidence=args.min_confidence, min_margin=args.min_margin)
+    indexed = time.perf_counter()
+    results = resolver.resolve(ingredients)
+    elapsed = time.perf_counter() - indexed
+
+    for r in results[: args.limit]:
+        mark = "+" if r.resolved else "?"
+        print(f"{mark} {r.ingredient!r} -> {r.product} ({r.confidence:.2f}, margin {r.margin:.2f}) {_format_amount(r.amount)}")
+    resolved = sum(r.resolved for r in results)
+    print(
+        f"\nIngredients: {len(results)}, distinct names: {len(resolver._memo)}, resolved: {resolved} "
+        f"(min confidence {args.min_confidence:g}, min margin {args.min_margin:g})"
+    )
+    print(
+        f"Index {indexed - started:.2f}s ({len(resolver.store)} products), resolve {elapsed:.2f}s "
+        f"({len(results) / elapsed if elapsed else 0:.0f} ingredients/s)"
+    )
+
+    if args.out_path:
+        out_path = base_dir / args.out_path
+        rows = [asdict(r) for r in results]
+        out_path.write_text(json.dumps(rows, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"Wrote {out_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Load test for match_server.py.
+
+Replays product titles from product_data.json against a running matcher from
+several threads (one keep-alive connection each) and reports latency
+percentiles and throughput:
+
+    python match_server.py --cache-size 0 &      # measure uncached matching
+    python match_loadtest.py --threads 4 --seconds 10
+    python match_loadtest.py --batch 50          # POST /match with 50 items
+"""
+import argparse
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+from urllib.parse import urlencode
+
+from crawl_utils import KeepAliveClient
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    k = min(len(sorted_values) - 1, max(0, int(round(q / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[k]
+
+
+def run(
+    url: str, queries: List[Tuple[str, str]], threads: int, seconds: float, batch: int
+) -> Dict[str, Any]:
+    client = KeepAliveClient(timeout=10.0)
+    base = url.rstrip("/") + "/match"
+    deadline = time.monotonic() + seconds
+    latencies: List[List[float]] = [[] for _ in range(threads)]
+    counts = {"errors": 0, "items": 0, "matched": 0}
+    lock = threading.Lock()
+
+    def worker(n: int) -> None:
+        lat = latencies[n]
+        pos = n * 7919 % len(queries)
+        items = errors = matched = 0
+        while time.monotonic() < deadline:
+            t0 = time.perf_counter()
+            try:
+                if batch > 1:
+                    chunk = [queries[(pos + i) % len(queries)] for i in range(batch)]
+                    # Matching has no side effects, so a batch may be resent.
+                    resp = client.post_json(base, {"items": [{"title": t, "unit": u} for t, u in chunk]}, retry=True)
+                    results = resp.json()["results"] if resp.status == 200 else []
+                else:
+                    title, unit = queries[pos % len(queries)]
+                    resp = client.get(base + "?" + urlencode({"title": title, "unit": unit}))
+                    results = [resp.json()["match"]] if resp.status == 200 else []
+            except (OSError, ValueError, KeyError):
+                errors += 1
+                continue
+            lat.append(time.perf_counter() - t0)
+            if resp.status != 200:
+                errors += 1
+                continue
+            pos += max(1, batch)
+            items += len(results)
+            matched += sum(1 for r in results if r)
+        with lock:
+            counts["errors"] += errors
+            counts["items"] += items
+            counts["matched"] += matched
+
+    started = time.monotonic()
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    client.close()
+    elapsed = time.monotonic() - started
+
+    all_lat = sorted(x for lat in latencies for x in lat)
+    return {
+        "requests": len(all_lat),
+        "elapsed": elapsed,
+        "p50_ms": _percentile(all_lat, 50) * 1000,
+        "p90_ms": _percentile(all_lat, 90) * 1000,
+        "p99_ms": _percentile(all_lat, 99) * 1000,
+        "max_ms": (all_lat[-1] if all_lat else float("nan")) * 1000,
+        **counts,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8780")
+    parser.add_argument("--product-data", default="product_data.json")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--batch", type=int, default=1, help="Items per request (>1 uses batched POST /match).")
+    args = parser.parse_args()
+
+    base_dir = Path(__file__).resolve().parent
+    products = json.loads((base_dir / args.product_data).read_text(encoding="utf-8"))
+    queries = [
+        (p["title"], p.get("unit") if isinstance(p.get("unit"), str) else "")
+        for p in products
+        if isinstance(p.get("title"), str) and p["title"].strip()
+    ]
+    if not queries:
+        print("No product titles to replay")
+        return 1
+
+    r = run(args.url, queries, args.threads, args.seconds, args.batch)
+    print(f"Requests: {r['requests']} in {r['elapsed']:.1f}s ({r['errors']} errors)")
+    print(f"QPS: {r['requests'] / r['elapsed']:.0f} requests/s, {r['items'] / r['elapsed']:.0f} lookups/s")
+    print(f"Latency: p50={r['p50_ms']:.2f} ms p90={r['p90_ms']:.2f} ms p99={r['p99_ms']:.2f} ms max={r['max_ms']:.2f} ms")
+    print(f"Matched: {r['matched']} / {r['items']} lookups")
+    return 0 if not r["errors"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
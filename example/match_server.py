@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""Long-running price matcher over the ATB and Metro catalogs.
+
+update_prices.py reloads and re-indexes both catalogs on every run. This
+service loads them once, keeps the candidate stores, inverted indexes and
+fast scorers in memory, and answers lookups over HTTP/1.1 (keep-alive):
+
+    GET  /match?title=Молоко 2,5% 900г&unit=L
+    POST /match   {"title": "...", "unit": "L"}
+    POST /match   {"items": [{"title": "...", "unit": "L"}, ...]}
+    GET  /health
+
+A match is ``{"source", "title", "price", "listingPrice", "score"}`` or
+``null``, using the same rules as update_prices.py (ATB first, then Metro).
+
+The catalog files are polled for changes. A changed catalog is re-indexed in
+the background and swapped in atomically, so requests never wait on a reload
+and never see a half-built index. Recent answers are cached per index.
+
+    python match_server.py --port 8780 &
+    python match_loadtest.py --url http://127.0.0.1:8780 --threads 4 --seconds 10
+"""
+import argparse
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import update_prices as up
+from candidate_store import CandidateStore
+from fast_score import FastScorer
+
+
+@dataclass(frozen=True)
+class MatchConfig:
+    min_score: float = 0.62
+    min_token_overlap: int = 1
+    min_score_gap: float = 0.06
+    convert_packs: bool = False
+    fuzzy_tokens: bool = False
+    fuzzy_distance: int = 1
+    cache_size: int = 65536
+
+
+@dataclass
+class _Source:
+    name: str
+    store: CandidateStore
+    parts: up.UnitPartitions
+    scorer: FastScorer
+    fuzzy: Optional[up.FuzzyVocabulary]
+
+
+class MatcherIndex:
+    """Immutable snapshot of both catalogs; safe to share between threads."""
+
+    def __init__(self, atb_path: Path, metro_path: Path, config: MatchConfig) -> None:
+        self.config = config
+        self.mtimes = (atb_path.stat().st_mtime, metro_path.stat().st_mtime)
+        self.loaded_at = time.time()
+
+        atb_root: Any = json.loads(atb_path.read_text(encoding="utf-8"))
+        metro_items: Any = json.loads(metro_path.read_text(encoding="utf-8"))
+        atb = up._build_candidate_store(
+            atb_root.get("products") or [],
+            title_keys=["name", "originalTitle"],
+            price_key="price",
+            base_unit_key="baseUnit",
+        )
+        metro = up._build_candidate_store(metro_items, title_keys=["title"], price_key="price")
+        self.sources = [self._source("ATB", atb), self._source("METRO", metro)]
+
+        # Stores, partitions and scorers are read-only once built, so every
+        # connection thread shares them warm. The lock guards only the cache
+        # OrderedDict and the counters; matching runs outside it.
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[Tuple[str, str], Optional[Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _source(self, name: str, store: CandidateStore) -> _Source:
+        fuzzy = None
+        if self.config.fuzzy_tokens:
+            fuzzy = up._build_fuzzy_vocabulary(store, max_distance=self.config.fuzzy_distance)
+        return _Source(name, store, up._build_unit_partitions(store), FastScorer(store, up._tokenize), fuzzy)
+
+    def candidate_counts(self) -> Dict[str, int]:
+        return {s.name: len(s.store) for s in self.sources}
+
+    def match(self, title: str, unit: str) -> Optional[Dict[str, Any]]:
+        key = (title, unit)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+            self.misses += 1
+        result = self._match(title, unit)
+        with self._lock:
+            self._cache[key] = result
+            if len(self._cache) > self.config.cache_size:
+                self._cache.popitem(last=False)
+            return result
+
+    def _match(self, title: str, unit: str) -> Optional[Dict[str, Any]]:
+        cfg = self.config
+        for src in self.sources:
+            best_id, sc = up._find_best_id(
+                title,
+                unit,
+                src.store,
+                src.parts.for_unit(unit),
+                cfg.min_score,
+                cfg.min_token_overlap,
+                cfg.min_score_gap,
+                src.fuzzy,
+                scorer=src.scorer,
+            )
+            if best_id is None:
+                continue
+            cand = src.store[best_id]
+            return {
+                "source": src.name,
+                "title": cand.raw_title,
+                "price": up._target_price(cand, unit, cfg.convert_packs),
+                "listingPrice": cand.price,
+                "score": round(sc, 4),
+            }
+        return None
+
+
+class MatcherService:
+    """Holds the current MatcherIndex and swaps in a new one when files change."""
+
+    def __init__(self, atb_path: Path, metro_path: Path, config: MatchConfig) -> None:
+        self.atb_path = atb_path
+        self.metro_path = metro_path
+        self.config = config
+        self.index = MatcherIndex(atb_path, metro_path, config)
+        self.reloads = 0
+        self._stop = threading.Event()
+
+    def _mtimes(self) -> Tuple[float, float]:
+        return self.atb_path.stat().st_mtime, self.metro_path.stat().st_mtime
+
+    def reload_if_changed(self) -> bool:
+        try:
+            if self._mtimes() == self.index.mtimes:
+                return False
+            started = time.perf_counter()
+            index = MatcherIndex(self.atb_path, self.metro_path, self.config)
+        except (OSError, ValueError) as e:
+            # Scrapers replace the files atomically, but a half-written file
+            # from another tool must not take the service down.
+            print(f"Reload failed, keeping the previous catalogs: {e}")
+            return False
+        self.index = index
+        self.reloads += 1
+        print(f"Reloaded catalogs in {(time.perf_counter() - started) * 1000:.0f} ms: {index.candidate_counts()}")
+        return True
+
+    def watch(self, interval: float) -> threading.Thread:
+        def loop() -> None:
+            while not self._stop.wait(interval):
+                self.reload_if_changed()
+
+        t = threading.Thread(target=loop, name="catalog-reload", daemon=True)
+        t.start()
+        return t
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+class MatchHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, the body
+    # waits for the client's delayed ACK (~40 ms per request).
+    disable_nagle_algorithm = True
+    server: "MatchServer"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, payload: Any) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        parts = urlsplit(self.path)
+        if parts.path == "/health":
+            index = self.server.service.index
+            self._send_json(
+                200,
+                {
+                    "ok": True,
+                    "loadedAt": int(index.loaded_at),
+                    "reloads": self.server.service.reloads,
+                    "candidates": index.candidate_counts(),
+                    "cache": {"size": len(index._cache), "hits": index.hits, "misses": index.misses},
+                },
+            )
+            return
+        if parts.path == "/match":
+            query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+            title = query.get("title", "")
+            if not title.strip():
+                self._send_json(400, {"error": "title is required"})
+                return
+            self._send_json(200, {"match": self.server.service.index.match(title, query.get("unit", ""))})
+            return
+        self._send_json(404, {"error": "not found"})
+
+    def do_POST(self) -> None:
+        if urlsplit(self.path).path != "/match":
+            self._send_json(404, {"error": "not found"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length).decode("utf-8"))
+        except (UnicodeDecodeError, ValueError):
+            self._send_json(400, {"error": "invalid JSON"})
+            return
+        if not isinstance(payload, dict):
+            self._send_json(400, {"error": "expected an object"})
+            return
+
+        # One index for the whole batch, even if a reload lands midway.
+        index = self.server.service.index
+        if isinstance(payload.get("items"), list):
+            results: List[Optional[Dict[str, Any]]] = []
+            for item in payload["items"]:
+                title, unit = _title_unit(item)
+                results.append(index.match(title, unit) if title else None)
+            self._send_json(200, {"results": results})
+            return
+
+        title, unit = _title_unit(payload)
+        if not title:
+            self._send_json(400, {"error": "title is required"})
+            return
+        self._send_json(200, {"match": index.match(title, unit)})
+
+
+def _title_unit(item: Any) -> Tuple[str, str]:
+    if not isinstance(item, dict):
+        return "", ""
+    title = item.get("title")
+    unit = item.get("unit")
+    title = title if isinstance(title, str) and title.strip() else ""
+    return title, unit if isinstance(unit, str) else ""
+
+
+class MatchServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr: Tuple[str, int], service: MatcherService, verbose: bool = False) -> None:
+        super().__init__(addr, MatchHandler)
+        self.service = service
+        self.verbose = verbose
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8780)
+    parser.add_argument("--atb", default="atb_products.json")
+    parser.add_argument("--metro", default="metro_full_catalog_all_pages.json")
+    parser.add_argument("--min-score", type=float, default=0.62)
+    parser.add_argument("--min-token-overlap", type=int, default=1)
+    parser.add_argument("--min-score-gap", type=float, default=0.06)
+    parser.add_argument("--convert-packs", action="store_true")
+    parser.add_argument("--fuzzy-tokens", action="store_true")
+    parser.add_argument("--fuzzy-distance", type=int, default=1)
+    parser.add_argument("--cache-size", type=int, default=65536, help="Cached answers per catalog snapshot.")
+    parser.add_argument("--reload-interval", type=float, default=2.0, help="Seconds between catalog file checks.")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    base_dir = Path(__file__).resolve().parent
+    config = MatchConfig(
+        min_score=args.min_score,
+        min_token_overlap=args.min_token_overlap,
+        min_score_gap=args.min_score_gap,
+        convert_packs=args.convert_packs,
+        fuzzy_tokens=args.fuzzy_tokens,
+        fuzzy_distance=args.fuzzy_distance,
+        cache_size=args.cache_size,
+    )
+    started = time.perf_counter()
+    service = MatcherService((base_dir / args.atb).resolve(), (base_dir / args.metro).resolve(), config)
+    print(f"Loaded {service.index.candidate_counts()} in {(time.perf_counter() - started) * 1000:.0f} ms")
+    service.watch(args.reload_interval)
+
+    server = MatchServer((args.host, args.port), service, verbose=args.verbose)
+    print(f"Matcher on http://{args.host}:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
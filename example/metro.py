@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""Metro catalog scraper producing metro_full_catalog_all_pages.json.
+
+Metro's online catalog is served by the zakaz.ua stores API. Every category
+is paged with ``?page=N&per_page=M`` and each page reports the total
+``count``, so after the first page of every category all remaining pages are
+known and are fetched concurrently by a small thread pool. All workers share
+one token-bucket rate limit and reuse keep-alive connections.
+
+Records are written in ``{title, price, category}`` shape, the one
+``update_prices.py`` consumes. Each category is streamed to the output as
+soon as all its pages are in (and every category before it is written), in
+category and page order, so the output is the same across runs and only the
+categories still in flight are held in memory. A category whose pages do not
+all arrive (network or HTTP errors) keeps its records from the previous
+output instead of being dropped or written partially.
+
+With ``--incremental`` the first page of each category is compared with the
+signature stored in the state file (ETag when the server sends one, otherwise
+total count + hash of the first page). Unchanged categories are copied from
+the previous output instead of being re-fetched. Only changes visible in the
+total count or on the first page are detected, so run a full crawl
+periodically.
+
+For local testing point ``--api-base`` at ``fixture_server.py``.
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from crawl_utils import HttpResponse, JsonArrayWriter, KeepAliveClient, RateLimiter
+from price_history import PriceHistoryWriter
+
+
+API_BASE = "https://stores-api.zakaz.ua"
+METRO_STORE_ID = "48215611"
+
+CATEGORIES = [
+    "dairy-and-eggs-metro",
+    "packets-cereals-metro",
+    "fruits-and-vegetables-metro",
+    "meat-fish-poultry-metro",
+    "sauces-and-spices-metro",
+    "health-and-lifestyle-metro",
+    "frozen-metro",
+    "canned-food-oil-vinegar-metro",
+    "fish-and-seafood-metro",
+    "bakery-metro",
+]
+
+PER_PAGE = 30
+
+
+def _page_url(api_base: str, store_id: str, category: str, page: int, per_page: int) -> str:
+    return f"{api_base.rstrip('/')}/stores/{store_id}/categories/{category}/products/?page={page}&per_page={per_page}"
+
+
+def _records_from_page(payload: Dict[str, Any], category: str) -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    for row in payload.get("results") or []:
+        if not isinstance(row, dict):
+            continue
+        title = row.get("title")
+        price = row.get("price")
+        if not isinstance(title, str) or not title.strip():
+            continue
+        if not isinstance(price, (int, float)):
+            continue
+        # The API reports prices in kopecks.
+        out.append({"title": title.strip(), "price": round(price / 100.0, 2), "category": category})
+    return out
+
+
+def _signature(resp: HttpResponse, payload: Dict[str, Any]) -> str:
+    etag = resp.headers.get("etag")
+    if etag:
+        return f"etag:{etag}"
+    digest = hashlib.sha1(resp.body).hexdigest()
+    return f"count:{payload.get('count')}:sha1:{digest}"
+
+
+def _load_previous(path: Path) -> Dict[str, List[Dict[str, Any]]]:
+    if not path.exists():
+        return {}
+    by_cat: Dict[str, List[Dict[str, Any]]] = {}
+    for rec in json.loads(path.read_text(encoding="utf-8")):
+        if isinstance(rec, dict) and isinstance(rec.get("category"), str):
+            by_cat.setdefault(rec["category"], []).append(rec)
+    return by_cat
+
+
+def fetch_catalog(
+    out_path: Path,
+    state_path: Path,
+    api_base: str = API_BASE,
+    store_id: str = METRO_STORE_ID,
+    categories: Optional[List[str]] = None,
+    per_page: int = PER_PAGE,
+    workers: int = 8,
+    rate: float = 5.0,
+    incremental: bool = False,
+    timeout: float = 15.0,
+) -> Dict[str, Any]:
+    categories = categories or CATEGORIES
+    client = KeepAliveClient(timeout=timeout, headers={"Accept": "application/json", "Accept-Language": "uk"})
+    limiter = RateLimiter(rate, burst=workers)
+
+    state: Dict[str, Any] = {}
+    if incremental and state_path.exists():
+        state = json.loads(state_path.read_text(encoding="utf-8"))
+    # Also the fallback for categories that fail in this run.
+    previous = _load_previous(out_path)
+
+    def fetch(category: str, page: int, etag: Optional[str] = None) -> Tuple[str, int, HttpResponse]:
+        limiter.acquire()
+        headers = {"If-None-Match": etag} if etag else None
+        return category, page, client.get(_page_url(api_base, store_id, category, page, per_page), headers)
+
+    stats = {"requests": 0, "reused_categories": 0, "fetched_categories": 0, "failed_pages": 0, "fallback_categories": 0}
+    new_state: Dict[str, Any] = {}
+    failed: set = set()
+    reused: Dict[str, List[Dict[str, Any]]] = {}
+    pages: Dict[str, Dict[int, List[Dict[str, Any]]]] = {}  # category -> page -> records, until written
+    remaining: Dict[str, int] = {}  # pages of a category still in flight
+    ready: Dict[str, List[Dict[str, Any]]] = {}  # settled, waiting for earlier categories
+    order = iter(categories)
+    next_category = next(order, None)
+
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    with tmp_path.open("w", encoding="utf-8") as fh, ThreadPoolExecutor(max_workers=workers) as pool:
+        writer = JsonArrayWriter(fh)
+
+        def settle(category: str) -> None:
+            # All pages of the category are in (or failed). A failed or partial
+            # category is replaced by its records from the previous output;
+            # without one, whatever pages did arrive are kept.
+            got = pages.pop(category, {})
+            if category in failed and category in previous:
+                print(f"[{category}] не завантажено повністю: беремо записи попереднього запуску")
+                ready[category] = previous[category]
+                stats["fallback_categories"] += 1
+            elif category in reused:
+                ready[category] = reused.pop(category)
+            else:
+                ready[category] = [rec for page in sorted(got) for rec in got[page]]
+            # Stream out in category order, so the output is the same across runs.
+            nonlocal next_category
+            while next_category is not None and next_category in ready:
+                for rec in ready.pop(next_category):
+                    writer.write(rec)
+                next_category = next(order, None)
+            fh.flush()
+
+        def page_done(category: str) -> None:
+            remaining[category] -= 1
+            if not remaining[category]:
+                settle(category)
+
+        in_flight = {
+            pool.submit(fetch, c, 1, (state.get(c) or {}).get("etag") if incremental and c in previous else None): (c, 1)
+            for c in categories
+        }
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for fut in done:
+                category, page = in_flight.pop(fut)
+                stats["requests"] += 1
+                where = f"[{category}]" if page == 1 else f"[{category}] сторінка {page}:"
+                try:
+                    _category, _page, resp = fut.result()
+                except Exception as e:
+                    print(f"{where} помилка: {e}")
+                    resp = None
+                if page > 1:
+                    if resp is not None and resp.status == 200:
+                        pages[category][page] = _records_from_page(resp.json(), category)
+                    else:
+                        if resp is not None:
+                            print(f"{where} HTTP {resp.status}")
+                        failed.add(category)
+                        stats["failed_pages"] += 1
+                    page_done(category)
+                    continue
+
+                old = state.get(category) or {}
+                if resp is not None and resp.status == 304 and category in previous:
+                    reused[category] = previous[category]
+                    new_state[category] = old
+                    stats["reused_categories"] += 1
+                    settle(category)
+                    continue
+                if resp is None or resp.status != 200:
+                    if resp is not None:
+                        print(f"{where} HTTP {resp.status}")
+                    failed.add(category)
+                    stats["failed_pages"] += 1
+                    settle(category)
+                    continue
+
+                payload = resp.json()
+                sig = _signature(resp, payload)
+                if incremental and old.get("signature") == sig and category in previous:
+                    reused[category] = previous[category]
+                    new_state[category] = old
+                    stats["reused_categories"] += 1
+                    settle(category)
+                    continue
+
+                stats["fetched_categories"] += 1
+                pages[category] = {1: _records_from_page(payload, category)}
+                count = int(payload.get("count") or 0)
+                n_pages = max(1, math.ceil(count / per_page))
+                print(f"[{category}] {count} товарів, {n_pages} сторінок")
+                new_state[category] = {
+                    "signature": sig,
+                    "etag": resp.headers.get("etag"),
+                    "count": count,
+                    "fetchedAt": int(time.time()),
+                }
+                remaining[category] = n_pages
+                for p in range(2, n_pages + 1):
+                    in_flight[pool.submit(fetch, category, p)] = (category, p)
+                page_done(category)
+
+        writer.close()
+        stats["records"] = writer.count
+    client.close()
+    os.replace(tmp_path, out_path)
+
+    # A partially fetched category must be re-fetched next time.
+    for category in failed:
+        new_state.pop(category, None)
+    state_path.write_text(json.dumps(new_state, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    return stats
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", default="metro_full_catalog_all_pages.json")
+    parser.add_argument("--state", default="metro_state.json")
+    parser.add_argument("--api-base", default=API_BASE)
+    parser.add_argument("--store-id", default=METRO_STORE_ID)
+    parser.add_argument("--category", action="append", help="Limit to these category ids (repeatable).")
+    parser.add_argument("--per-page", type=int, default=PER_PAGE)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=5.0, help="Max requests per second across all workers.")
+    parser.add_argument("--incremental", action="store_true", help="Re-fetch only categories whose listing changed.")
+    parser.add_argument("--history", default="price_history", help="Price history directory ('' to disable).")
+    args = parser.parse_args()
+
+    base_dir = Path(__file__).resolve().parent
+    started = time.monotonic()
+    stats = fetch_catalog(
+        out_path=(base_dir / args.out).resolve(),
+        state_path=(base_dir / args.state).resolve(),
+        api_base=args.api_base,
+        store_id=args.store_id,
+        categories=args.category,
+        per_page=args.per_page,
+        workers=args.workers,
+        rate=args.rate,
+        incremental=args.incremental,
+    )
+    elapsed = time.monotonic() - started
+
+    if args.history:
+        out_path = (base_dir / args.out).resolve()
+        records = json.loads(out_path.read_text(encoding="utf-8"))
+        PriceHistoryWriter((base_dir / args.history).resolve()).append_snapshot(
+            "METRO", ((r["title"], r["price"]) for r in records)
+        )
+
+    print(f"\n✓ Готово за {elapsed:.1f} с")
+    print(f"✓ Записів: {stats['records']}")
+    print(f"✓ Запитів: {stats['requests']} (помилок: {stats['failed_pages']})")
+    if stats["fallback_categories"]:
+        print(f"✓ Категорій з попереднього запуску через помилки: {stats['fallback_categories']}")
+    print(f"✓ Категорій завантажено: {stats['fetched_categories']}, взято з попереднього запуску: {stats['reused_categories']}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""Propose brand tokens for atb.py's brand stripper from the catalogs.
+
+Brand names look different from product words in listing titles:
+
+- they are written in Latin script inside Cyrillic titles ("Сир Dziugas");
+- they are capitalized in the middle of a title, and rarely start it
+  ("Молоко Галичина", "Сир Комо"), while product nouns usually come first;
+- the same brand shows up across unrelated categories (dairy, sauces, snacks).
+
+Each title token (and each pair of adjacent capitalized tokens, for
+two-word brands like "Metro Chef") is scored on these signals. Phrases
+already in BRANDS, MARKETING_WORDS or brands_extra.txt are skipped.
+Proposals are printed, and ``--write`` saves them to a file for review.
+Reviewed phrases go into brands_extra.txt, which atb.py loads into its
+Aho-Corasick stripper, so the dictionary can grow without slowing
+normalization.
+
+    python mine_brands.py --limit 50
+    python mine_brands.py --min-categories 3 --write brands_proposed.txt
+"""
+import argparse
+import json
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Set, Tuple
+
+from brand_stripper import load_phrases
+from crawl_utils import script_constant
+from update_prices import _STOPWORDS
+
+_TOKEN_RE = re.compile(r"[A-Za-zА-Яа-яІіЇїЄєҐґ][A-Za-zА-Яа-яІіЇїЄєҐґ'’`\-]*")
+_LATIN_RE = re.compile(r"^[A-Za-z][A-Za-z'’`\-]*$")
+
+# Latin tokens that are units or sizes, not brands.
+_NOT_BRANDS = {"ml", "kg", "gr", "pcs", "xl", "xxl", "uht", "bio", "eco", "mini", "max", "light", "zero"}
+
+
+@dataclass
+class TokenStats:
+    count: int = 0
+    first: int = 0
+    capitalized: int = 0
+    latin: bool = False
+    categories: Set[str] = field(default_factory=set)
+    forms: Counter = field(default_factory=Counter)
+
+    def score(self) -> float:
+        mid = self.count - self.first
+        cap_ratio = self.capitalized / mid if mid else 0.0
+        return len(self.categories) * (1.0 + cap_ratio) * (1.5 if self.latin else 1.0)
+
+
+def _titles(atb_path: Path, metro_path: Path) -> Iterable[Tuple[str, str]]:
+    for p in json.loads(atb_path.read_text(encoding="utf-8")).get("products") or []:
+        if isinstance(p.get("originalTitle"), str):
+            yield p["originalTitle"], "ATB:" + str(p.get("category"))
+    for p in json.loads(metro_path.read_text(encoding="utf-8")):
+        if isinstance(p.get("title"), str):
+            yield p["title"], "METRO:" + str(p.get("category"))
+
+
+def collect(titles: Iterable[Tuple[str, str]]) -> Dict[str, TokenStats]:
+    stats: Dict[str, TokenStats] = defaultdict(TokenStats)
+
+    def add(key: str, form: str, category: str, first: bool, capitalized: bool, latin: bool) -> None:
+        s = stats[key]
+        s.count += 1
+        s.first += first
+        s.capitalized += capitalized and not first
+        s.latin = s.latin or latin
+        s.categories.add(category)
+        s.forms[form] += 1
+
+    for title, category in titles:
+        words = _TOKEN_RE.findall(title)
+        caps = [w[0].isupper() for w in words]
+        for n, w in enumerate(words):
+            add(w.lower(), w, category, n == 0, caps[n], bool(_LATIN_RE.match(w)))
+            if n > 0 and caps[n] and n + 1 < len(words) and caps[n + 1]:
+                pair = f"{w} {words[n + 1]}"
+                add(pair.lower(), pair, category, False, True, bool(_LATIN_RE.match(w) and _LATIN_RE.match(words[n + 1])))
+    return stats
+
+
+def propose(
+    stats: Dict[str, TokenStats], known: Set[str], min_count: int, min_categories: int, min_cap_ratio: float
+) -> List[Tuple[str, TokenStats]]:
+    # Single words of known phrases ("своя" from "своя лінія") are not brands on their own.
+    known_words = {w for phrase in known if " " in phrase for w in phrase.split()}
+    out: List[Tuple[str, TokenStats]] = []
+    for key, s in stats.items():
+        if key in known or key in known_words or key in _STOPWORDS or key in _NOT_BRANDS or len(key) < 3 or s.count < min_count:
+            continue
+        mid = s.count - s.first
+        if not mid or s.first / s.count > 0.2:
+            continue  # product nouns start titles
+        cap_ratio = s.capitalized / mid
+        if s.latin and cap_ratio >= min_cap_ratio:
+            out.append((key, s))
+        elif cap_ratio >= min_cap_ratio and len(s.categories) >= min_categories:
+            out.append((key, s))
+    out.sort(key=lambda kv: (-kv[1].score(), -kv[1].count, kv[0]))
+    return out
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Propose brand names for atb.py's brand dictionary.")
+    parser.add_argument("--atb", default="atb_products.json")
+    parser.add_argument("--metro", default="metro_full_catalog_all_pages.json")
+    parser.add_argument("--min-count", type=int, default=3)
+    parser.add_argument("--min-categories", type=int, default=2, help="For Cyrillic tokens: distinct categories they appear in.")
+    parser.add_argument("--min-cap-ratio", type=float, default=0.8, help="Share of mid-title occurrences that are capitalized.")
+    parser.add_argument("--limit", type=int, default=100, help="Proposals to print (0 = all).")
+    parser.add_argument("--write", default=None, help="Save all proposals to this file, one per line.")
+    args = parser.parse_args()
+
+    base_dir = Path(__file__).resolve().parent
+    atb_script = base_dir / "atb.py"
+    known = {p.lower() for p in script_constant(atb_script, "BRANDS") + script_constant(atb_script, "MARKETING_WORDS")}
+    known |= {p.lower() for p in load_phrases(base_dir / "brands_extra.txt")}
+
+    stats = collect(_titles(base_dir / args.atb, base_dir / args.metro))
+    proposals = propose(stats, known, args.min_count, args.min_categories, args.min_cap_ratio)
+
+    shown = proposals[: args.limit] if args.limit else proposals
+    print(f"{'phrase':<28} {'count':>5} {'cats':>4} {'latin':>5}  example")
+    for key, s in shown:
+        print(f"{key:<28} {s.count:>5} {len(s.categories):>4} {'yes' if s.latin else '':>5}  {s.forms.most_common(1)[0][0]}")
+    print(f"\nProposals: {len(proposals)} (known phrases: {len(known)}, distinct tokens: {len(stats)})")
+
+    if args.write:
+        path = base_dir / args.write
+        lines = [f"# mine_brands.py: {len(proposals)} proposals; move reviewed ones to brands_extra.txt"]
+        lines += [key for key, _s in proposals]
+        path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        print(f"Wrote {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
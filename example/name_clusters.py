@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""Near-duplicate clustering of product names with MinHash + LSH banding.
+
+Names are reduced to character 3-gram shingles of their lightly stemmed
+tokens (the same stemmer update_prices.py uses), so inflected variants like
+"Яблука червоні" / "Яблуко червоне" produce (nearly) the same shingle set.
+
+Each name gets a MinHash signature; the signature is split into bands and
+only clusters sharing at least one band bucket are compared, which keeps
+clustering sub-quadratic. Clustering is streaming: ``add()`` assigns a
+cluster id as names arrive, and ``ClusterStats`` keeps running price
+statistics per key (atb.py uses (cluster, pack size)).
+
+MinHash similarity alone merges variants of one product line whose names
+differ by a single word: "рафінована" / "нерафінована" олія, Millennium
+"Білий" / "Чорний". So a name joins a cluster only when every stemmed
+token it does not share with the cluster's name pairs up with an inflected
+form there (a shared prefix of at least ``_MIN_PREFIX`` letters), and
+neither of the pair is the other with a "не"/"без" prefix. Names with
+different ``variant`` keys (atb.py passes the fat percentages from the
+listing title) never merge.
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+from pathlib import Path
+from typing import Dict, Hashable, List, Optional, Sequence, Set, Tuple
+
+from update_prices import _stem_uk_token
+
+
+_MERSENNE = (1 << 61) - 1
+_WORD_RE = re.compile(r"[a-zа-яіїєґ']+", re.IGNORECASE)
+_NEGATIONS = ("не", "без")
+_MIN_PREFIX = 4
+
+
+def name_tokens(name: str) -> List[str]:
+    return [t for t in (_stem_uk_token(t) for t in _WORD_RE.findall(name.lower())) if t]
+
+
+def _inflected(a: str, b: str) -> bool:
+    for neg in _NEGATIONS:
+        if a.startswith(neg) != b.startswith(neg) and (a[len(neg):].startswith(b[:_MIN_PREFIX]) or b[len(neg):].startswith(a[:_MIN_PREFIX])):
+            return False
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n >= min(_MIN_PREFIX, len(a), len(b)) and n >= min(len(a), len(b)) - 2
+
+
+def same_variant(a: Set[str], b: Set[str]) -> bool:
+    """True when the token sets differ only by inflection (no extra or negated words)."""
+    only_a, only_b = a - b, b - a
+    return all(any(_inflected(x, y) for y in only_b) for x in only_a) and all(
+        any(_inflected(y, x) for x in only_a) for y in only_b
+    )
+
+
+def shingles(name: str, k: int = 3) -> Set[str]:
+    toks = name_tokens(name)
+    text = " " + " ".join(t for t in toks if t) + " "
+    if len(text) <= k:
+        return {text}
+    return {text[i : i + k] for i in range(len(text) - k + 1)}
+
+
+def _shingle_hash(s: str) -> int:
+    return int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = 64, seed: int = 1) -> None:
+        rnd = random.Random(seed)
+        self.num_perm = num_perm
+        self._params = [(rnd.randrange(1, _MERSENNE), rnd.randrange(0, _MERSENNE)) for _ in range(num_perm)]
+
+    def signature(self, shingle_set: Set[str]) -> Tuple[int, ...]:
+        hashes = [_shingle_hash(s) for s in shingle_set]
+        return tuple(min((a * h + b) % _MERSENNE for h in hashes) for a, b in self._params)
+
+
+def estimate_jaccard(a: Sequence[int], b: Sequence[int]) -> float:
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+class NameClusterer:
+    """Streaming near-duplicate clusterer.
+
+    ``bands * rows`` must equal ``num_perm``; with 16 x 4 two names land in a
+    common bucket with ~50% probability at Jaccard 0.5 and ~99% at 0.8.
+    """
+
+    def __init__(self, threshold: float = 0.75, num_perm: int = 64, bands: int = 16, seed: int = 1) -> None:
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._hasher = MinHasher(num_perm=num_perm, seed=seed)
+        self._buckets: List[Dict[Tuple[int, ...], List[int]]] = [{} for _ in range(bands)]
+        self._signatures: List[Tuple[int, ...]] = []
+        self.names: List[str] = []
+        self._tokens: List[Set[str]] = []
+        self._variants: List[Optional[str]] = []
+        self._exact: Dict[Tuple[str, Optional[str]], int] = {}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _bands(self, sig: Tuple[int, ...]) -> List[Tuple[int, ...]]:
+        r = self.rows
+        return [sig[i * r : (i + 1) * r] for i in range(self.bands)]
+
+    def add(self, name: str, variant: Optional[str] = None) -> int:
+        key = (" ".join(name.lower().split()), variant)
+        cid = self._exact.get(key)
+        if cid is not None:
+            return cid
+
+        tokens = set(name_tokens(name))
+        sig = self._hasher.signature(shingles(name))
+        bands = self._bands(sig)
+
+        best: Optional[int] = None
+        best_sim = self.threshold
+        seen: Set[int] = set()
+        for i, band in enumerate(bands):
+            for cand in self._buckets[i].get(band, ()):
+                if cand in seen:
+                    continue
+                seen.add(cand)
+                if self._variants[cand] != variant or not same_variant(tokens, self._tokens[cand]):
+                    continue
+                sim = estimate_jaccard(sig, self._signatures[cand])
+                if sim >= best_sim:
+                    best, best_sim = cand, sim
+
+        if best is None:
+            best = len(self.names)
+            self.names.append(name)
+            self._tokens.append(tokens)
+            self._variants.append(variant)
+            self._signatures.append(sig)
+            for i, band in enumerate(bands):
+                self._buckets[i].setdefault(band, []).append(best)
+
+        self._exact[key] = best
+        return best
+
+
+class ClusterStats:
+    """Running min/max/mean/count per key (a cluster id, or a (cluster, pack) pair)."""
+
+    def __init__(self) -> None:
+        self._stats: Dict[Hashable, List[float]] = {}
+
+    def add(self, cluster_id: Hashable, price: float) -> None:
+        st = self._stats.get(cluster_id)
+        if st is None:
+            self._stats[cluster_id] = [price, price, price, 1.0]
+            return
+        st[3] += 1
+        st[0] = min(st[0], price)
+        st[1] = max(st[1], price)
+        st[2] += (price - st[2]) / st[3]
+
+    def has(self, cluster_id: Hashable) -> bool:
+        return cluster_id in self._stats
+
+    def get(self, cluster_id: Hashable) -> Dict[str, float]:
+        mn, mx, mean, n = self._stats[cluster_id]
+        return {"min": mn, "max": mx, "mean": round(mean, 2), "count": int(n)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Cluster product names from an ATB dump and print multi-name clusters.")
+    parser.add_argument("--atb", default="atb_products.json")
+    parser.add_argument("--threshold", type=float, default=0.75)
+    args = parser.parse_args()
+
+    base_dir = Path(__file__).resolve().parent
+    products = json.loads((base_dir / args.atb).read_text(encoding="utf-8")).get("products") or []
+
+    clusterer = NameClusterer(threshold=args.threshold)
+    members: Dict[int, Set[str]] = {}
+    for p in products:
+        cid = clusterer.add(p["name"])
+        members.setdefault(cid, set()).add(p["name"])
+
+    multi = {cid: names for cid, names in members.items() if len(names) > 1}
+    print(f"Names: {len(products)}, clusters: {len(clusterer)}, clusters with variants: {len(multi)}")
+    for cid, names in sorted(multi.items()):
+        print(f"- [{cid}] " + " | ".join(sorted(names)))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
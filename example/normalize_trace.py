@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""Per-rule calls, hits and time inside atb.normalize_product_name.
+
+normalize_product_name applies about fifty ordered rules: latin brands,
+homoglyphs, brackets, ``PACKAGING_PATTERNS``, sizes, percents, brand and
+marketing dictionaries, abbreviations. This tool shows which of them ever
+change a title and which ones cost the most CPU.
+
+Every rule in normalize_product_name is a module-level object that the
+function looks up at call time: a compiled pattern, a list of them, a
+PhraseStripper or a function. ``trace_normalize()`` swaps each one for a
+proxy that counts calls, hits (the output differs from the input) and time,
+and it restores the originals on exit. The function itself is not changed,
+so tracing costs nothing while it is off. A rule added to
+normalize_product_name must also be listed in ``RULES``. Otherwise its time
+and hits are reported under "(rest)", together with the function's own code
+after the last rule (trimming, the four-word cut).
+
+Each timing has the cost of reading the clock subtracted (calibrated at
+start). A proxy call still costs more than the bare rule, so the report
+also shows the untraced total for the same corpus.
+
+    python normalize_trace.py
+    python normalize_trace.py --corpus atb_products.json metro_full_catalog_all_pages.json --sort hits
+    python normalize_trace.py --json /tmp/rules.json --examples 2
+"""
+import argparse
+import json
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Sequence
+
+import atb
+
+# Module globals of atb used by normalize_product_name, in the order it applies them.
+RULES = [
+    "LATIN_BRAND_RES",
+    "normalize_latin_to_cyrillic",
+    "PARENS_RE",
+    "BRACKETS_RE",
+    "ORIGINAL_RES",
+    "PACKAGING_RES",
+    "GRADE_RE",
+    "strip_quantities",
+    "PERCENT_RE",
+    "BRAND_STRIPPER",
+    "MARKETING_STRIPPER",
+    "PHRASE_RES",
+    "AT_RES",
+    "PCS_RE",
+    "KG_RE",
+    "GRAMS_RE",
+    "LONE_G_RE",
+    "LONE_ML_RE",
+    "NUMBER_RE",
+    "SPACES_RE",
+    "SPECIAL_CHARS_RE",
+    "DASHES_RE",
+]
+REST = "(rest)"
+
+
+def _clock_cost_ns(samples: int = 2000) -> int:
+    """Median cost of one perf_counter_ns() pair."""
+    costs = []
+    for _ in range(samples):
+        t0 = time.perf_counter_ns()
+        costs.append(time.perf_counter_ns() - t0)
+    costs.sort()
+    return costs[len(costs) // 2]
+
+
+@dataclass
+class RuleStats:
+    name: str
+    calls: int = 0
+    hits: int = 0
+    ns: int = 0
+    examples: List[List[str]] = field(default_factory=list)  # [before, after]
+
+
+class RuleTracer:
+    def __init__(self, examples: int = 0) -> None:
+        self.stats: Dict[str, RuleStats] = {}
+        self.examples = examples
+        self.clock_cost = _clock_cost_ns()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def rule(self, name: str) -> RuleStats:
+        return self.stats.setdefault(name, RuleStats(name))
+
+    def record(self, name: str, before: str, after: str, ns: int) -> None:
+        st = self.stats[name]
+        with self._lock:
+            st.calls += 1
+            st.ns += max(0, ns - self.clock_cost)
+            if after != before:
+                st.hits += 1
+                if len(st.examples) < self.examples:
+                    st.examples.append([before, after])
+        self._local.last = after
+        self._local.ended = time.perf_counter_ns()
+
+    def timed(self, name: str, fn: Callable[..., str]) -> Callable[..., str]:
+        self.rule(name)
+
+        def traced(text: str, *args: Any, **kwargs: Any) -> str:
+            t0 = time.perf_counter_ns()
+            out = fn(text, *args, **kwargs)
+            self.record(name, text, out, time.perf_counter_ns() - t0)
+            return out
+
+        return traced
+
+    def entry(self, fn: Callable[[str], str]) -> Callable[[str], str]:
+        """Wrap normalize_product_name: whatever happens after the last rule goes to REST."""
+        self.rule(REST)
+
+        def traced(title: str) -> str:
+            self._local.last = title
+            self._local.ended = time.perf_counter_ns()
+            out = fn(title)
+            self.record(REST, self._local.last, out, time.perf_counter_ns() - self._local.ended)
+            return out
+
+        return traced
+
+
+class _TracedPattern:
+    def __init__(self, tracer: RuleTracer, name: str, pattern: Any) -> None:
+        self.pattern = pattern
+        self._tracer = tracer
+        self._name = name
+        tracer.rule(name)
+
+    def sub(self, repl: str, string: str, count: int = 0) -> str:
+        t0 = time.perf_counter_ns()
+        out = self.pattern.sub(repl, string, count)
+        self._tracer.record(self._name, string, out, time.perf_counter_ns() - t0)
+        return out
+
+
+class _TracedStripper:
+    def __init__(self, tracer: RuleTracer, name: str, stripper: Any) -> None:
+        self.strip = tracer.timed(name, stripper.strip)
+
+
+def _proxy(tracer: RuleTracer, name: str, obj: Any) -> Any:
+    if isinstance(obj, list):
+        return [_proxy(tracer, f"{name}[{i}] {getattr(o, 'pattern', '')}".rstrip(), o) for i, o in enumerate(obj)]
+    if hasattr(obj, "sub"):
+        return _TracedPattern(tracer, name, obj)
+    if hasattr(obj, "strip"):
+        return _TracedStripper(tracer, name, obj)
+    if callable(obj):
+        return tracer.timed(name, obj)
+    raise TypeError(f"atb.{name}: cannot trace {type(obj).__name__}")
+
+
+@contextmanager
+def trace_normalize(tracer: RuleTracer) -> Iterator[Callable[[str], str]]:
+    """Patch atb's rules with tracing proxies; yields the traced normalize_product_name."""
+    missing = [name for name in RULES if not hasattr(atb, name)]
+    if missing:
+        raise AttributeError(f"atb has no {', '.join(missing)}; update normalize_trace.RULES")
+    originals = {name: getattr(atb, name) for name in RULES}
+    try:
+        for name, obj in originals.items():
+            setattr(atb, name, _proxy(tracer, name, obj))
+        yield tracer.entry(atb.normalize_product_name)
+    finally:
+        for name, obj in originals.items():
+            setattr(atb, name, obj)
+
+
+def load_titles(paths: Sequence[Path]) -> List[str]:
+    """Titles from atb_products.json-style ({"products": [...]}) or Metro-style (list) files."""
+    titles: List[str] = []
+    for path in paths:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        rows = data.get("products") or [] if isinstance(data, dict) else data
+        for row in rows:
+            title = row.get("originalTitle") or row.get("title")
+            if isinstance(title, str):
+                titles.append(title)
+    return titles
+
+
+def report(tracer: RuleTracer, sort: str) -> List[str]:
+    rows = list(tracer.stats.values())
+    total_ns = sum(r.ns for r in rows) or 1
+    if sort == "time":
+        rows.sort(key=lambda r: -r.ns)
+    elif sort == "hits":
+        rows.sort(key=lambda r: (-r.hits, -r.ns))
+    width = max(len(r.name) for r in rows)
+    lines = [f"{'rule':<{width}} {'calls':>8} {'hits':>7} {'hit%':>6} {'ms':>8} {'ns/call':>8} {'time%':>6}"]
+    for r in rows:
+        lines.append(
+            f"{r.name:<{width}} {r.calls:>8} {r.hits:>7} {r.hits / r.calls if r.calls else 0:>6.1%} "
+            f"{r.ns / 1e6:>8.1f} {r.ns / r.calls if r.calls else 0:>8.0f} {r.ns / total_ns:>6.1%}"
+        )
+        for before, after in r.examples:
+            lines.append(f"    {before!r} -> {after!r}")
+    dead = [r.name for r in tracer.stats.values() if r.calls and not r.hits]
+    lines.append(f"\nRules that never changed a title: {len(dead)}")
+    lines.extend(f"- {name}" for name in dead)
+    return lines
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Trace atb.normalize_product_name rule by rule over a title corpus.")
+    parser.add_argument("--corpus", nargs="+", default=["atb_products.json"], help="atb_products.json and/or Metro catalog files.")
+    parser.add_argument("--sort", choices=["time", "hits", "order"], default="time", help="Report order (order = pipeline order).")
+    parser.add_argument("--examples", type=int, default=0, help="Before/after examples to keep per rule.")
+    parser.add_argument("--json", dest="json_path", default=None, help="Also write the per-rule stats as JSON.")
+    args = parser.parse_args()
+
+    base_dir = Path(__file__).resolve().parent
+    titles = load_titles([base_dir / p for p in args.corpus])
+
+    t0 = time.perf_counter()
+    plain = [atb.normalize_product_name(t) for t in titles]
+    plain_s = time.perf_counter() - t0
+
+    tracer = RuleTracer(examples=args.examples)
+    t0 = time.perf_counter()
+    with trace_normalize(tracer) as normalize:
+        traced = [normalize(t) for t in titles]
+    traced_s = time.perf_counter() - t0
+    if traced != plain:
+        print("Warning: traced output differs from normalize_product_name")
+
+    print(f"Titles: {len(titles)}; normalize_product_name {plain_s * 1e6 / max(1, len(titles)):.1f} us/title untraced, "
+          f"{traced_s * 1e6 / max(1, len(titles)):.1f} us/title traced (clock cost {tracer.clock_cost} ns subtracted per rule call)\n")
+    print("\n".join(report(tracer, args.sort)))
+
+    if args.json_path:
+        out = {"titles": len(titles), "untracedSeconds": plain_s, "rules": [asdict(r) for r in tracer.stats.values()]}
+        Path(args.json_path).write_text(json.dumps(out, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"\nWrote {args.json_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -2,12 +2,12 @@
 import argparse
 import json
 import os
-import ssl
 import time
-import urllib.request
 from pathlib import Path
 from typing import Any, Dict, List, Sequence
 
+from openai_protocol import DEFAULT_API_BASE, Traffic, classify, item_line, make_ssl_context
+
 
 ALLOWED_UNITS: List[str] = ["KG", "L", "PCS"]
 
@@ -49,122 +49,18 @@ def _heuristic_unit_from_existing(unit: Any) -> str | None:
     return None
 
 
-def _build_prompt(items: List[Dict[str, Any]]) -> str:
-    allowed = "\n".join([f"- {u}" for u in ALLOWED_UNITS])
-
-    lines: List[str] = []
-    for i, p in enumerate(items, start=1):
-        title = p.get("title")
-        unit = p.get("unit")
-        lines.append(f"{i}. title=\"{title}\"; unit=\"{unit}\"")
-
-    inp = "\n".join(lines)
-
-    return (
-        "Ти нормалізатор одиниць виміру товарів українською. "
-        "Потрібно для кожного товару визначити базову одиницю з переліку. "
-        "ЦІНА (price) ВЖЕ є ціною за КГ/Л/ШТ — її НЕ потрібно змінювати, лише визначити unit. "
-        "ПОВЕРНИ ТІЛЬКИ JSON-масив без markdown.\n\n"
-        "Правила:\n"
-        "- дозволені значення unit: тільки з дозволеного списку\n"
-        "- KG: для вагових продуктів (фрукти, м'ясо, крупи тощо)\n"
-        "- L: для рідин (молоко, олія, соки тощо)\n"
-        "- PCS: для штучних товарів (яйця, банани якщо рахують поштучно, тощо)\n"
-        "- якщо в назві є явні підказки типу 'мл', 'л', 'кг', 'г', 'шт', врахуй їх\n"
-        "- якщо не впевнений, обирай найбільш типову одиницю для такого товару\n\n"
-        f"Дозволені unit:\n{allowed}\n\n"
-        "Вхідні товари (пронумеровані):\n"
-        f"{inp}\n\n"
-        "Формат відповіді: JSON-масив об'єктів [{index: number, unit: string}] з усіма індексами."
-    )
+# Static across batches; items go in the user message, one per line.
+SYSTEM_PROMPT = (
+    "Ти нормалізатор одиниць виміру товарів. Кожен рядок: назва | поточна unit (може бракувати). "
+    "Ціна вже за KG/L/PCS, визнач лише unit. "
+    "KG: вагові (фрукти, м'ясо, крупи), L: рідини (молоко, олія, соки), PCS: штучні (яйця тощо). "
+    "Враховуй підказки в назві (мл, л, кг, г, шт); якщо не впевнений, обирай типову одиницю. "
+    "v[i] - unit для рядка i+1."
+)
 
 
-def _openai_normalize_units(
-    api_key: str,
-    model: str,
-    items: List[Dict[str, Any]],
-    timeout_sec: int,
-    max_retries: int,
-    retry_sleep_sec: float,
-    cafile: str | None,
-    insecure: bool,
-) -> Dict[int, str]:
-    prompt = _build_prompt(items)
-
-    payload = {
-        "model": model,
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 0.0,
-        "max_tokens": 1500,
-    }
-
-    data = json.dumps(payload).encode("utf-8")
-
-    if insecure:
-        ssl_context = ssl._create_unverified_context()
-    else:
-        if cafile:
-            ssl_context = ssl.create_default_context(cafile=cafile)
-        else:
-            try:
-                import certifi  # type: ignore
-
-                ssl_context = ssl.create_default_context(cafile=certifi.where())
-            except Exception:
-                ssl_context = ssl.create_default_context()
-
-    last_err: Exception | None = None
-    for attempt in range(1, max_retries + 1):
-        try:
-            req = urllib.request.Request(
-                "https://api.openai.com/v1/chat/completions",
-                data=data,
-                headers={
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {api_key}",
-                },
-                method="POST",
-            )
-            with urllib.request.urlopen(req, timeout=timeout_sec, context=ssl_context) as resp:
-                body = resp.read().decode("utf-8")
-
-            parsed = json.loads(body)
-            content = (
-                parsed.get("choices", [{}])[0]
-                .get("message", {})
-                .get("content", "")
-            )
-            if not isinstance(content, str) or not content.strip():
-                raise ValueError("Empty OpenAI response content")
-
-            arr = json.loads(content)
-            if not isinstance(arr, list):
-                raise ValueError("OpenAI did not return a JSON array")
-
-            out: Dict[int, str] = {}
-            for row in arr:
-                if not isinstance(row, dict):
-                    continue
-                idx = row.get("index")
-                unit = row.get("unit")
-                if not isinstance(idx, int):
-                    continue
-                if not isinstance(unit, str):
-                    continue
-                u = unit.strip().upper()
-                if u not in ALLOWED_UNITS:
-                    raise ValueError(f"Invalid unit '{u}' for index {idx}")
-                out[idx] = u
-
-            return out
-        except Exception as e:
-            last_err = e
-            if attempt < max_retries:
-                time.sleep(retry_sleep_sec)
-                continue
-            raise
-
-    raise last_err or RuntimeError("Unknown OpenAI error")
+def _item_lines(items: List[Dict[str, Any]]) -> List[str]:
+    return [item_line(p.get("title"), p.get("unit")) for p in items]
 
 
 def main() -> int:
@@ -172,6 +68,11 @@ def main() -> int:
     parser.add_argument("--in", dest="in_path", default="product_data_new.json")
     parser.add_argument("--out", dest="out_path", default="product_data_new_units.json")
     parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument(
+        "--api-base",
+        default=os.environ.get("OPENAI_BASE_URL", DEFAULT_API_BASE),
+        help="Chat Completions API base URL (e.g. openai_stub.py's http://127.0.0.1:8766/v1).",
+    )
     parser.add_argument("--batch-size", type=int, default=80)
     parser.add_argument("--timeout-sec", type=int, default=60)
     parser.add_argument("--max-retries", type=int, default=3)
@@ -218,56 +119,37 @@ def main() -> int:
     print(f"Heuristically mapped: {len(products) - len(unresolved)}")
     print(f"Needs OpenAI: {len(unresolved)}")
 
+    traffic = Traffic()
     if unresolved:
+        ssl_context = make_ssl_context(args.cafile, args.insecure)
         batches = _chunks(unresolved, args.batch_size)
         for bi, batch in enumerate(batches, start=1):
             print(f"OpenAI batch {bi}/{len(batches)} (size={len(batch)})...")
 
-            # Indices in the prompt are per-batch (1..N). Keep __pos stable for writing back.
-            batch_for_openai: List[Dict[str, Any]] = []
-            for i, row in enumerate(batch, start=1):
-                rr = dict(row)
-                rr["__needs_openai_index"] = i
-                batch_for_openai.append(rr)
-
-            mapping = _openai_normalize_units(
-                api_key=api_key,
-                model=args.model,
-                items=batch_for_openai,
+            # One unit per input line, in order; __pos says where each row goes back.
+            units = classify(
+                api_key,
+                args.model,
+                SYSTEM_PROMPT,
+                _item_lines(batch),
+                ALLOWED_UNITS,
+                api_base=args.api_base,
                 timeout_sec=args.timeout_sec,
                 max_retries=args.max_retries,
                 retry_sleep_sec=args.retry_sleep_sec,
-                cafile=args.cafile,
-                insecure=args.insecure,
+                ssl_context=ssl_context,
+                traffic=traffic,
             )
 
-            mapped_by_marker: Dict[int, str] = {k: v for k, v in mapping.items()}
-
-            expected_indices = {
-                row.get("__needs_openai_index")
-                for row in batch_for_openai
-                if isinstance(row.get("__needs_openai_index"), int)
-            }
-            if expected_indices != set(mapped_by_marker.keys()):
-                missing = sorted(expected_indices - set(mapped_by_marker.keys()))
-                extra = sorted(set(mapped_by_marker.keys()) - expected_indices)
-                raise SystemExit(f"OpenAI batch mismatch. missing={missing} extra={extra}")
-
-            for row in batch_for_openai:
-                idx = row.get("__needs_openai_index")
-                pos = row.get("__pos")
-                if not isinstance(idx, int) or not isinstance(pos, int):
-                    continue
-                u = mapped_by_marker[idx]
-
+            for row, u in zip(batch, units):
                 pp = dict(row)
-                pp.pop("__needs_openai_index", None)
-                pp.pop("__pos", None)
+                pos = pp.pop("__pos")
                 pp["unit"] = u
                 out_products[pos] = pp
 
             if bi < len(batches):
                 time.sleep(0.7)
+        print(traffic.summary(len(unresolved)))
 
     if args.dry_run:
         print("Dry-run: not writing output")
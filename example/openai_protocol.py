@@ -0,0 +1,171 @@
+"""Compact request/response protocol shared by the OpenAI normalizers.
+
+normalize_units_openai.py and recat_product_data_openai.py both ask the
+model to pick one value from a closed list for each item in a batch. They
+used to send a long instruction text and verbose ``title="..."; unit="..."``
+lines in one user message, and then parse whatever JSON came back. A
+malformed reply failed and retried the whole batch. The protocol here is:
+
+- a static system prompt per task, identical for every batch;
+- one item per line in the user message, in a short form ("title | unit");
+- a structured-output response schema (``response_format: json_schema``,
+  strict). The answer is ``{"v": [...]}``, where ``v[i]`` answers line
+  ``i + 1`` and every value is an ``enum`` of the allowed labels. The model
+  cannot return an unknown label, skip an item or wrap the JSON in markdown.
+
+The reply is still checked (length and labels) before use. A failed check
+retries the batch like a transport error.
+
+``python openai_stub.py`` serves a local stand-in for the API that counts
+bytes; pass ``--api-base http://127.0.0.1:8766/v1`` to either script.
+"""
+import json
+import ssl
+import time
+import urllib.request
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+DEFAULT_API_BASE = "https://api.openai.com/v1"
+
+
+@dataclass
+class Traffic:
+    """Running totals for one script run."""
+
+    requests: int = 0
+    retries: int = 0
+    bytes_sent: int = 0
+    bytes_received: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    def summary(self, items: int) -> str:
+        per_item = f", {self.bytes_sent / items:.0f} B sent per item" if items else ""
+        tokens = ""
+        if self.prompt_tokens or self.completion_tokens:
+            tokens = f", tokens: {self.prompt_tokens} prompt + {self.completion_tokens} completion"
+        return (
+            f"API requests: {self.requests} ({self.retries} retries), "
+            f"bytes: {self.bytes_sent} sent + {self.bytes_received} received{per_item}{tokens}"
+        )
+
+
+def make_ssl_context(cafile: Optional[str] = None, insecure: bool = False) -> ssl.SSLContext:
+    if insecure:
+        return ssl._create_unverified_context()
+    if cafile:
+        return ssl.create_default_context(cafile=cafile)
+    try:
+        import certifi  # type: ignore
+
+        return ssl.create_default_context(cafile=certifi.where())
+    except Exception:
+        return ssl.create_default_context()
+
+
+def item_line(*fields: Any) -> str:
+    """One input line: non-empty fields joined by " | ", whitespace collapsed."""
+    parts = [" ".join(str(f).split()) for f in fields if f is not None and str(f).strip()]
+    return " | ".join(p.replace("|", "/") for p in parts)
+
+
+def labels_schema(labels: Sequence[str], count: int) -> Dict[str, Any]:
+    """``{"v": [label, ...]}`` with exactly ``count`` values from ``labels``."""
+    return {
+        "type": "object",
+        "properties": {
+            "v": {
+                "type": "array",
+                "items": {"type": "string", "enum": list(labels)},
+                "minItems": count,
+                "maxItems": count,
+            }
+        },
+        "required": ["v"],
+        "additionalProperties": False,
+    }
+
+
+def build_request(model: str, system: str, lines: Sequence[str], labels: Sequence[str], max_tokens: int) -> Dict[str, Any]:
+    return {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": system},
+            {"role": "user", "content": "\n".join(lines)},
+        ],
+        "temperature": 0.0,
+        "max_tokens": max_tokens,
+        "response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": "labels", "strict": True, "schema": labels_schema(labels, len(lines))},
+        },
+    }
+
+
+def parse_labels(body: str, labels: Sequence[str], count: int) -> List[str]:
+    """Labels from a chat completion body; ValueError if they do not fit the request."""
+    parsed = json.loads(body)
+    message = parsed.get("choices", [{}])[0].get("message", {})
+    if message.get("refusal"):
+        raise ValueError(f"Model refused: {message['refusal']}")
+    content = message.get("content")
+    if not isinstance(content, str) or not content.strip():
+        raise ValueError("Empty OpenAI response content")
+    values = json.loads(content).get("v")
+    if not isinstance(values, list) or len(values) != count:
+        raise ValueError(f"Expected {count} labels, got {len(values) if isinstance(values, list) else values!r}")
+    allowed = set(labels)
+    for i, v in enumerate(values, start=1):
+        if v not in allowed:
+            raise ValueError(f"Invalid label {v!r} for line {i}")
+    return values
+
+
+def classify(
+    api_key: str,
+    model: str,
+    system: str,
+    lines: Sequence[str],
+    labels: Sequence[str],
+    *,
+    api_base: str = DEFAULT_API_BASE,
+    timeout_sec: int = 60,
+    max_retries: int = 3,
+    retry_sleep_sec: float = 2.0,
+    max_tokens: int = 1500,
+    ssl_context: Optional[ssl.SSLContext] = None,
+    traffic: Optional[Traffic] = None,
+) -> List[str]:
+    """One label per line, in order."""
+    data = json.dumps(build_request(model, system, lines, labels, max_tokens), ensure_ascii=False).encode("utf-8")
+    traffic = traffic if traffic is not None else Traffic()
+
+    for attempt in range(1, max_retries + 1):
+        try:
+            req = urllib.request.Request(
+                api_base.rstrip("/") + "/chat/completions",
+                data=data,
+                headers={
+                    "Content-Type": "application/json",
+                    "Authorization": f"Bearer {api_key}",
+                },
+                method="POST",
+            )
+            traffic.requests += 1
+            traffic.bytes_sent += len(data)
+            with urllib.request.urlopen(req, timeout=timeout_sec, context=ssl_context) as resp:
+                raw = resp.read()
+            traffic.bytes_received += len(raw)
+            body = raw.decode("utf-8")
+            usage = json.loads(body).get("usage") or {}
+            traffic.prompt_tokens += int(usage.get("prompt_tokens") or 0)
+            traffic.completion_tokens += int(usage.get("completion_tokens") or 0)
+            return parse_labels(body, labels, len(lines))
+        except Exception:
+            if attempt >= max_retries:
+                raise
+            traffic.retries += 1
+            time.sleep(retry_sleep_sec)
+
+    raise RuntimeError("Unknown OpenAI error")
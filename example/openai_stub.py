@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""Local stand-in for the OpenAI Chat Completions API that counts bytes.
+
+Answers ``POST /v1/chat/completions`` requests that carry a
+``response_format`` JSON schema (see openai_protocol.py) with a reply that
+fits the schema. For array items with an ``enum``, item ``i`` gets the allowed
+value that appears as a field of input line ``i + 1`` ("Молоко | L" -> "L"),
+or else the first one. This is not a model: it checks the protocol, the
+batching and the byte counts of the normalizers, not the quality of answers.
+
+Totals of requests, input lines and bytes received/sent are printed on exit
+and served at ``GET /stats``. ``--malformed-rate`` answers that fraction of
+requests with content that is not JSON, to exercise the client retries.
+
+    python openai_stub.py --port 8766 &
+    OPENAI_API_KEY=stub python normalize_units_openai.py --api-base http://127.0.0.1:8766/v1 --openai-only --dry-run
+"""
+import argparse
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def _pick(enum: List[Any], line: str) -> Any:
+    fields = {f.strip().upper() for f in line.split("|")}
+    for value in enum:
+        if str(value).upper() in fields:
+            return value
+    return enum[0]
+
+
+def _instance(schema: Dict[str, Any], lines: List[str], index: int = 0) -> Any:
+    """A value that fits ``schema``; enum items of arrays follow the input lines."""
+    if "enum" in schema:
+        return _pick(schema["enum"], lines[index] if index < len(lines) else "")
+    kind = schema.get("type")
+    if kind == "object":
+        props = schema.get("properties") or {}
+        return {k: _instance(props[k], lines) for k in schema.get("required") or list(props)}
+    if kind == "array":
+        count = schema.get("minItems", len(lines))
+        return [_instance(schema.get("items") or {}, lines, i) for i in range(count)]
+    if kind in ("integer", "number"):
+        return 0
+    if kind == "boolean":
+        return False
+    return ""
+
+
+class StubStats:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.totals = {"requests": 0, "lines": 0, "bytes_received": 0, "bytes_sent": 0, "malformed": 0}
+
+    def add(self, **counts: int) -> None:
+        with self._lock:
+            for k, v in counts.items():
+                self.totals[k] += v
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.totals)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "StubServer"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/") == "/stats":
+            self._send(200, json.dumps(self.server.stats.snapshot()).encode("utf-8"))
+            return
+        self._send(404, b'{"error": {"message": "not found"}}')
+
+    def do_POST(self) -> None:
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path.rstrip("/") != "/v1/chat/completions":
+            self._send(404, b'{"error": {"message": "not found"}}')
+            return
+        status, body, lines, malformed = self._complete(raw)
+        self.server.stats.add(requests=1, lines=lines, bytes_received=len(raw), bytes_sent=len(body), malformed=malformed)
+        self._send(status, body)
+
+    def _complete(self, raw: bytes) -> Tuple[int, bytes, int, int]:
+        try:
+            request = json.loads(raw)
+            schema = request["response_format"]["json_schema"]["schema"]
+        except (ValueError, KeyError, TypeError):
+            return 400, b'{"error": {"message": "expected a response_format json_schema request"}}', 0, 0
+        user = [m.get("content", "") for m in request.get("messages") or [] if m.get("role") == "user"]
+        lines = user[-1].split("\n") if user else []
+        malformed = self.server.malformed()
+        content = "Sorry, here you go: {" if malformed else json.dumps(_instance(schema, lines), ensure_ascii=False)
+        reply = {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "model": request.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        }
+        return 200, json.dumps(reply, ensure_ascii=False).encode("utf-8"), len(lines), int(malformed)
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr: Tuple[str, int], malformed_rate: float = 0.0, seed: Optional[int] = None, verbose: bool = False) -> None:
+        super().__init__(addr, StubHandler)
+        self.stats = StubStats()
+        self.verbose = verbose
+        self.malformed_rate = malformed_rate
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def malformed(self) -> bool:
+        with self._rng_lock:
+            return self._rng.random() < self.malformed_rate
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Local OpenAI Chat Completions stub for the normalizers.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Fraction of replies with non-JSON content.")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = StubServer((args.host, args.port), args.malformed_rate, args.seed, args.verbose)
+    print(f"OpenAI stub on http://{args.host}:{server.server_address[1]}/v1", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Stub totals: {server.stats.snapshot()}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""Compressed archive of raw pages fetched by the scrapers.
+
+    page_archive/
+        index.jsonl         one line per page: url, fetchedAt, codec, segment,
+                            offset, length, size, meta
+        2026-02-04.pages    one segment per UTC day, compressed pages back to back
+
+A page reused without refetching (see refresh_scheduler.py) gets an index
+line pointing at the existing data, with ``"linked": true``; its bytes are
+stored once.
+
+Each page is compressed on its own (zstd when the ``zstandard`` package is
+installed, gzip otherwise), so any page can be read with one seek and
+replays can decompress pages in parallel. The codec is recorded per page, and
+an archive may mix both.
+
+    python page_archive.py stats
+    python page_archive.py ls --url-prefix https://www.atbmarket.com/uk/catalog/siri
+"""
+import argparse
+import gzip
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None  # type: ignore[assignment]
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None  # type: ignore[assignment]
+
+
+DEFAULT_CODEC = "zstd" if zstandard is not None else "gzip"
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd codec requires the zstandard package")
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    if codec == "gzip":
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    raise ValueError(f"unknown codec: {codec}")
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("page archived with zstd; install the zstandard package to read it")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "gzip":
+        return gzip.decompress(data)
+    raise ValueError(f"unknown codec: {codec}")
+
+
+class PageArchive:
+    def __init__(self, root: Path, codec: Optional[str] = None) -> None:
+        self.root = root
+        self.codec = codec or DEFAULT_CODEC
+        self.index_path = root / "index.jsonl"
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        self.root.mkdir(parents=True, exist_ok=True)
+        with self._lock, (self.root / ".lock").open("a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def put(self, url: str, body: bytes, fetched_at: Optional[float] = None, meta: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Archive one page. Safe to call from several threads and processes."""
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        blob = _compress(body, self.codec)
+        segment = datetime.fromtimestamp(fetched_at, tz=timezone.utc).strftime("%Y-%m-%d") + ".pages"
+        with self._locked():
+            with (self.root / segment).open("ab") as fh:
+                offset = fh.tell()
+                fh.write(blob)
+            entry = {
+                "url": url,
+                "fetchedAt": round(fetched_at, 3),
+                "codec": self.codec,
+                "segment": segment,
+                "offset": offset,
+                "length": len(blob),
+                "size": len(body),
+                "meta": meta or {},
+            }
+            # The index line is written after the data, so a crash never
+            # leaves an entry pointing past the end of a segment.
+            with self.index_path.open("a", encoding="utf-8") as fh:
+                fh.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return entry
+
+    def link(self, entry: Dict[str, Any], meta: Dict[str, Any]) -> Dict[str, Any]:
+        """Index an archived page again under new ``meta`` without copying it."""
+        linked = dict(entry, meta=meta, linked=True)
+        with self._locked():
+            with self.index_path.open("a", encoding="utf-8") as fh:
+                fh.write(json.dumps(linked, ensure_ascii=False) + "\n")
+        return linked
+
+    def entries(self, latest_only: bool = True, url_prefix: str = "") -> List[Dict[str, Any]]:
+        """Index entries in fetch order; with ``latest_only`` one per URL."""
+        if not self.index_path.exists():
+            return []
+        out: List[Dict[str, Any]] = []
+        with self.index_path.open(encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn last line of an interrupted write
+                if entry["url"].startswith(url_prefix):
+                    out.append(entry)
+        out.sort(key=lambda e: e["fetchedAt"])
+        if latest_only:
+            latest = {e["url"]: e for e in out}
+            out = sorted(latest.values(), key=lambda e: e["fetchedAt"])
+        return out
+
+    def read(self, entry: Dict[str, Any]) -> bytes:
+        with (self.root / entry["segment"]).open("rb") as fh:
+            fh.seek(entry["offset"])
+            blob = fh.read(entry["length"])
+        return _decompress(blob, entry["codec"])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", default="page_archive")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("stats", help="Page count and compression ratio.")
+    p_ls = sub.add_parser("ls", help="List archived pages.")
+    p_ls.add_argument("--url-prefix", default="")
+    p_ls.add_argument("--all", action="store_true", help="Include older fetches of the same URL.")
+    args = parser.parse_args()
+
+    base_dir = Path(__file__).resolve().parent
+    archive = PageArchive((base_dir / args.root).resolve())
+
+    if args.cmd == "stats":
+        entries = [e for e in archive.entries(latest_only=False) if not e.get("linked")]
+        raw = sum(e["size"] for e in entries)
+        packed = sum(e["length"] for e in entries)
+        urls = len({e["url"] for e in entries})
+        ratio = raw / packed if packed else 0.0
+        print(f"Pages: {len(entries)} ({urls} URLs)")
+        print(f"Raw: {raw} bytes, archived: {packed} bytes (x{ratio:.1f})")
+        return 0
+
+    for e in archive.entries(latest_only=not args.all, url_prefix=args.url_prefix):
+        when = datetime.fromtimestamp(e["fetchedAt"], tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        print(f"{when} {e['codec']} {e['size']:>8} -> {e['length']:>7} {e['url']}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
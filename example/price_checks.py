@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""Batch sanity checks for matched prices before they are written.
+
+A confident title match can still carry a wrong price, e.g. a multipack
+listing ("Coca-Cola Zero 0,33л" at 289 UAH for a case) matched to a single
+item. ``validate_prices`` checks every proposed price in one vectorized pass:
+
+- ratio: the new price is more than ``max_ratio`` times the old one (or
+  less than 1 / ``max_ratio``);
+- outlier: the new price is more than ``max_z`` robust z-scores from the
+  median of its (category, unit) group. Scores use log prices, because
+  prices spread multiplicatively. The robust z-score is
+  ``|log p - median| / (1.4826 * MAD)`` over the catalog's current prices.
+  Groups with fewer than ``min_group`` prices, or with no spread, are not
+  checked.
+
+NumPy does the grouping and medians when it is installed. Otherwise a
+pure-Python path gives the same verdicts.
+
+    python price_checks.py                  # check product_data.json's own prices
+    python price_checks.py --product-data /tmp/synth1000/product_data.json
+"""
+import argparse
+import json
+import math
+import statistics
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # type: ignore[assignment]
+
+
+# MAD of a normal distribution is 0.6745 sigma.
+MAD_SCALE = 1.4826
+
+
+@dataclass(frozen=True)
+class PriceCheckConfig:
+    max_ratio: float = 3.0
+    max_z: float = 3.5
+    min_group: int = 5
+
+
+@dataclass(frozen=True)
+class GroupStats:
+    count: int
+    median: float  # of log prices
+    mad: float  # of log prices
+
+    def z(self, price: float) -> float:
+        return abs(math.log(price) - self.median) / (MAD_SCALE * self.mad)
+
+
+def _group_key(product: Dict[str, Any]) -> Tuple[str, str]:
+    unit = product.get("unit")
+    return str(product.get("category") or ""), unit.upper() if isinstance(unit, str) else ""
+
+
+def _valid(price: Any) -> bool:
+    return isinstance(price, (int, float)) and not isinstance(price, bool) and price > 0 and math.isfinite(price)
+
+
+def _grouped_medians(values: "np.ndarray", groups: "np.ndarray", n_groups: int) -> Tuple["np.ndarray", "np.ndarray"]:
+    """(median per group, size per group); NaN for empty groups. Same as statistics.median."""
+    # One integer sort brings each group together; np.median then
+    # partitions each slice in linear time. Far fewer groups than prices.
+    v = values[np.argsort(groups, kind="stable")]
+    counts = np.bincount(groups, minlength=n_groups)
+    ends = np.cumsum(counts)
+    med = np.full(n_groups, np.nan)
+    for g in np.flatnonzero(counts):
+        med[g] = np.median(v[ends[g] - counts[g] : ends[g]])
+    return med, counts
+
+
+class _Groups:
+    """(category, unit) group ids shared by the catalog and the proposals."""
+
+    def __init__(self) -> None:
+        self.ids: Dict[Tuple[str, str], int] = {}
+
+    def of(self, product: Dict[str, Any]) -> int:
+        return self.ids.setdefault(_group_key(product), len(self.ids))
+
+
+def _catalog_prices(catalog: Sequence[Dict[str, Any]], groups: _Groups) -> Tuple[List[int], List[float]]:
+    gids: List[int] = []
+    prices: List[float] = []
+    for p in catalog:
+        price = p.get("price")
+        if _valid(price):
+            gids.append(groups.of(p))
+            prices.append(price)
+    return gids, prices
+
+
+def _np_stats(gids: List[int], prices: List[float], n_groups: int) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    groups = np.asarray(gids, dtype=np.int64)
+    values = np.log(np.asarray(prices, dtype=np.float64))
+    med, counts = _grouped_medians(values, groups, n_groups)
+    mad, _ = _grouped_medians(np.abs(values - med[groups]), groups, n_groups)
+    return med, mad, counts
+
+
+def _py_stats(gids: List[int], prices: List[float]) -> Dict[int, GroupStats]:
+    by_group: Dict[int, List[float]] = {}
+    for g, price in zip(gids, prices):
+        by_group.setdefault(g, []).append(math.log(price))
+    out: Dict[int, GroupStats] = {}
+    for g, xs in by_group.items():
+        m = statistics.median(xs)
+        out[g] = GroupStats(len(xs), m, statistics.median([abs(x - m) for x in xs]))
+    return out
+
+
+def validate_prices(
+    proposals: Sequence[Tuple[Dict[str, Any], Optional[float], float]],
+    catalog: Sequence[Dict[str, Any]],
+    config: PriceCheckConfig = PriceCheckConfig(),
+) -> List[List[str]]:
+    """Reasons to hold back each ``(product, old price, new price)``; empty list = OK."""
+    if not proposals:
+        return []
+    groups = _Groups()
+    gids, prices = _catalog_prices(catalog, groups)
+    prop_gids = [groups.of(p) for p, _old, _new in proposals]
+    names = {g: f"{k[0]}/{k[1] or '?'}" for k, g in groups.ids.items()}
+    if np is not None:
+        return _np_validate(proposals, prop_gids, names, gids, prices, len(groups.ids), config)
+    return _py_validate(proposals, prop_gids, names, _py_stats(gids, prices), config)
+
+
+def _np_validate(
+    proposals: Sequence[Tuple[Dict[str, Any], Optional[float], float]],
+    prop_gids: List[int],
+    names: Dict[int, str],
+    gids: List[int],
+    prices: List[float],
+    n_groups: int,
+    config: PriceCheckConfig,
+) -> List[List[str]]:
+    if gids:
+        med, mad, counts = _np_stats(gids, prices, n_groups)
+    else:
+        med = mad = np.full(n_groups, np.nan)
+        counts = np.zeros(n_groups, dtype=np.int64)
+    # Groups that are too small or have no spread are not checked.
+    mad = np.where((counts >= config.min_group) & (mad > 0), mad, np.nan)
+
+    old = np.array([o if _valid(o) else np.nan for _p, o, _n in proposals], dtype=np.float64)
+    new = np.array([x if _valid(x) else np.nan for _p, _o, x in proposals], dtype=np.float64)
+    pg = np.asarray(prop_gids, dtype=np.int64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratio = new / old
+        z = np.abs(np.log(new) - med[pg]) / (MAD_SCALE * mad[pg])
+    bad_price = np.isnan(new)
+    bad_ratio = (ratio > config.max_ratio) | (ratio < 1 / config.max_ratio)
+    bad_z = z > config.max_z
+
+    reasons: List[List[str]] = [[] for _ in proposals]
+    for i in np.flatnonzero(bad_price | bad_ratio | bad_z):
+        if bad_price[i]:
+            reasons[i].append("invalid price")
+            continue
+        if bad_ratio[i]:
+            reasons[i].append(f"x{ratio[i]:.2f} vs old price")
+        if bad_z[i]:
+            reasons[i].append(f"z={z[i]:.1f} in {names[prop_gids[i]]}")
+    return reasons
+
+
+def _py_validate(
+    proposals: Sequence[Tuple[Dict[str, Any], Optional[float], float]],
+    prop_gids: List[int],
+    names: Dict[int, str],
+    stats: Dict[int, GroupStats],
+    config: PriceCheckConfig,
+) -> List[List[str]]:
+    reasons: List[List[str]] = [[] for _ in proposals]
+    for i, ((_p, o, x), g) in enumerate(zip(proposals, prop_gids)):
+        if not _valid(x):
+            reasons[i].append("invalid price")
+            continue
+        if _valid(o):
+            ratio = x / o
+            if ratio > config.max_ratio or ratio < 1 / config.max_ratio:
+                reasons[i].append(f"x{ratio:.2f} vs old price")
+        s = stats.get(g)
+        if s is not None and s.count >= config.min_group and s.mad > 0 and s.z(x) > config.max_z:
+            reasons[i].append(f"z={s.z(x):.1f} in {names[g]}")
+    return reasons
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Flag outlier prices in a product_data.json-style file.")
+    parser.add_argument("--product-data", default="product_data.json")
+    parser.add_argument("--max-z", type=float, default=PriceCheckConfig.max_z)
+    parser.add_argument("--min-group", type=int, default=PriceCheckConfig.min_group)
+    parser.add_argument("--limit", type=int, default=20, help="Outliers to list.")
+    args = parser.parse_args()
+
+    base_dir = Path(__file__).resolve().parent
+    products: List[Dict[str, Any]] = json.loads((base_dir / args.product_data).read_text(encoding="utf-8"))
+    config = PriceCheckConfig(max_z=args.max_z, min_group=args.min_group)
+
+    # Each product's own price against its group (no old price, so no ratio check).
+    proposals = [(p, None, p.get("price")) for p in products if p.get("price") is not None]
+    started = time.perf_counter()
+    reasons = validate_prices(proposals, products, config)  # type: ignore[arg-type]
+    elapsed = time.perf_counter() - started
+
+    flagged = [(p, r) for (p, _o, _x), r in zip(proposals, reasons) if r]
+    print(f"Checked {len(proposals)} prices in {elapsed * 1000:.1f} ms ({'numpy' if np is not None else 'pure Python'})")
+    print(f"Outliers: {len(flagged)}")
+    for p, r in flagged[: args.limit]:
+        print(f"- {p.get('title')} ({p.get('unit') or '?'}): {p.get('price')} [{'; '.join(r)}]")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
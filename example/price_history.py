@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""Append-only price history written by the scrapers.
+
+Each scrape overwrites atb_products.json / metro_full_catalog_all_pages.json,
+so the time series is kept here instead:
+
+    price_history/
+        keys.tsv            append-only "id<TAB>listing title" dictionary
+        2026-02-04.bin      one partition per UTC day, fixed 13-byte records
+        ...
+
+A record is (key id uint32, source uint8, unix time uint32, listing price
+float32). The price is the shelf price as scraped, for the pack named in the
+listing title, not normalized per kg / l / piece. A key's series is
+comparable across snapshots because the title carries the pack size;
+quantities.quantity_totals() on the key gives the unit price when needed.
+Writing needs only the standard library; queries memory-map the
+partitions inside the requested window with NumPy, so "last N days"
+aggregates touch N small files. The records of a daily snapshot of both
+catalogs (~9k rows) take ~120 KB, about 5% of the 2.4 MB JSON dumps.
+keys.tsv adds ~70 bytes per distinct listing title: ~660 KB on the first
+run, and after that only for listings not seen before.
+
+    python price_history.py import --source ATB atb_products.json
+    python price_history.py stats --days 90 --limit 20
+    python price_history.py series "Банан" --days 30
+"""
+import argparse
+import json
+import os
+import struct
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None  # type: ignore[assignment]
+
+
+SOURCES: Dict[str, int] = {"ATB": 1, "METRO": 2, "USER": 3}
+_RECORD = struct.Struct("<IBIf")
+RECORD_DTYPE = [("key", "<u4"), ("source", "u1"), ("ts", "<u4"), ("price", "<f4")]
+
+
+def _day(ts: int) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def _load_keys(path: Path) -> Dict[str, int]:
+    keys: Dict[str, int] = {}
+    if path.exists():
+        with path.open(encoding="utf-8") as fh:
+            for line in fh:
+                kid, _, key = line.rstrip("\n").partition("\t")
+                if key:
+                    keys[key] = int(kid)
+    return keys
+
+
+class PriceHistoryWriter:
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.keys_path = root / "keys.tsv"
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with (self.root / ".lock").open("a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def append_snapshot(self, source: str, records: Iterable[Tuple[str, float]], ts: Optional[int] = None) -> int:
+        """Append one scrape; ``records`` are (listing title, listing price) pairs.
+
+        Nothing is written when no record has a valid price.
+        """
+        code = SOURCES[source]
+        ts = int(time.time()) if ts is None else int(ts)
+        with self._locked():
+            # Another scraper may have added keys since we last looked.
+            keys = _load_keys(self.keys_path)
+            new_keys: List[str] = []
+            buf = bytearray()
+            for key, price in records:
+                key = key.replace("\t", " ").replace("\n", " ").strip()
+                if not key or not isinstance(price, (int, float)) or price <= 0:
+                    continue
+                kid = keys.get(key)
+                if kid is None:
+                    kid = keys[key] = len(keys)
+                    new_keys.append(key)
+                buf += _RECORD.pack(kid, code, ts, price)
+
+            if not buf:
+                return 0
+            if new_keys:
+                with self.keys_path.open("a", encoding="utf-8") as fh:
+                    fh.write("".join(f"{keys[k]}\t{k}\n" for k in new_keys))
+            with (self.root / f"{_day(ts)}.bin").open("ab") as fh:
+                fh.write(buf)
+                fh.flush()
+                os.fsync(fh.fileno())
+        return len(buf) // _RECORD.size
+
+
+class PriceHistory:
+    """Read side; requires NumPy."""
+
+    def __init__(self, root: Path) -> None:
+        import numpy as np
+
+        self.np = np
+        self.root = root
+        self.keys = _load_keys(root / "keys.tsv")
+        self.names = {kid: key for key, kid in self.keys.items()}
+        self.dtype = np.dtype(RECORD_DTYPE)
+
+    def load(self, days: int, now: Optional[int] = None, source: Optional[str] = None) -> Any:
+        np = self.np
+        now = int(time.time()) if now is None else now
+        since = now - days * 86400
+        start = datetime.fromtimestamp(since, tz=timezone.utc).date()
+        end = datetime.fromtimestamp(now, tz=timezone.utc).date()
+
+        parts = []
+        d = start
+        while d <= end:
+            path = self.root / f"{d.isoformat()}.bin"
+            # A writer may be mid-append; ignore a trailing partial record.
+            n = path.stat().st_size // self.dtype.itemsize if path.exists() else 0
+            if n:
+                parts.append(np.memmap(path, dtype=self.dtype, mode="r", shape=(n,)))
+            d += timedelta(days=1)
+        if not parts:
+            return np.zeros(0, dtype=self.dtype)
+
+        rec = np.concatenate(parts)
+        mask = (rec["ts"] >= since) & (rec["ts"] <= now)
+        if source is not None:
+            mask &= rec["source"] == SOURCES[source]
+        return rec[mask]
+
+    def aggregate(self, days: int, now: Optional[int] = None, source: Optional[str] = None) -> Dict[str, Any]:
+        """Per-key min/max/mean/last/count over the window, as NumPy columns."""
+        np = self.np
+        rec = self.load(days, now=now, source=source)
+        if not len(rec):
+            empty = np.zeros(0)
+            return {"key": empty.astype("u4"), "min": empty, "max": empty, "mean": empty, "last": empty, "count": empty}
+
+        order = np.lexsort((rec["ts"], rec["key"]))
+        rec = rec[order]
+        keys, starts, counts = np.unique(rec["key"], return_index=True, return_counts=True)
+        prices = rec["price"].astype("f8")
+        ends = starts + counts - 1
+        return {
+            "key": keys,
+            "min": np.minimum.reduceat(prices, starts),
+            "max": np.maximum.reduceat(prices, starts),
+            "mean": np.add.reduceat(prices, starts) / counts,
+            "last": prices[ends],
+            "count": counts,
+        }
+
+    def series(self, key: str, days: int, now: Optional[int] = None) -> Any:
+        kid = self.keys.get(key)
+        rec = self.load(days, now=now)
+        if kid is None:
+            return rec[:0]
+        rec = rec[rec["key"] == kid]
+        return rec[self.np.argsort(rec["ts"], kind="stable")]
+
+
+def _records_from_dump(path: Path, source: str) -> List[Tuple[str, float]]:
+    root: Any = json.loads(path.read_text(encoding="utf-8"))
+    if source == "ATB":
+        return [(p.get("originalTitle") or p.get("name") or "", p.get("price")) for p in root.get("products") or []]
+    return [(p.get("title") or "", p.get("price")) for p in root]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", default="price_history")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_imp = sub.add_parser("import", help="Append a scraper JSON dump as one snapshot.")
+    p_imp.add_argument("--source", choices=sorted(SOURCES), required=True)
+    p_imp.add_argument("--ts", type=int, default=None, help="Snapshot time (default: file mtime).")
+    p_imp.add_argument("path")
+
+    p_stats = sub.add_parser("stats", help="Per-listing min/max/mean/last over the last N days.")
+    p_stats.add_argument("--days", type=int, default=90)
+    p_stats.add_argument("--source", choices=sorted(SOURCES), default=None)
+    p_stats.add_argument("--limit", type=int, default=20, help="Show the most volatile listings.")
+
+    p_series = sub.add_parser("series", help="Price series of one listing.")
+    p_series.add_argument("key")
+    p_series.add_argument("--days", type=int, default=90)
+
+    args = parser.parse_args()
+    base_dir = Path(__file__).resolve().parent
+    root = (base_dir / args.root).resolve()
+
+    if args.cmd == "import":
+        path = (base_dir / args.path).resolve()
+        ts = args.ts if args.ts is not None else int(path.stat().st_mtime)
+        n = PriceHistoryWriter(root).append_snapshot(args.source, _records_from_dump(path, args.source), ts=ts)
+        size = sum(p.stat().st_size for p in root.iterdir() if p.is_file())
+        print(f"Appended {n} records ({n * _RECORD.size} bytes; history {size} bytes, dump {path.stat().st_size} bytes)")
+        return 0
+
+    hist = PriceHistory(root)
+    if args.cmd == "stats":
+        started = time.perf_counter()
+        agg = hist.aggregate(args.days, source=args.source)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        print(f"Listings: {len(agg['key'])} ({elapsed_ms:.1f} ms)")
+        spread = (agg["max"] - agg["min"]) / agg["mean"] if len(agg["key"]) else agg["mean"]
+        for i in hist.np.argsort(-spread)[: args.limit]:
+            print(
+                f"- {hist.names[int(agg['key'][i])]}: min={agg['min'][i]:.2f} max={agg['max'][i]:.2f} "
+                f"mean={agg['mean'][i]:.2f} last={agg['last'][i]:.2f} n={int(agg['count'][i])}"
+            )
+        return 0
+
+    rec = hist.series(args.key, args.days)
+    for r in rec:
+        when = datetime.fromtimestamp(int(r["ts"]), tz=timezone.utc).strftime("%Y-%m-%d %H:%M")
+        src = next(k for k, v in SOURCES.items() if v == r["source"])
+        print(f"{when} {src} {float(r['price']):.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
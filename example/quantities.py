@@ -0,0 +1,176 @@
+"""Structured quantity parsing for product titles, shared by atb.py and update_prices.py.
+
+One compiled pattern recognizes, in a single left-to-right pass:
+
+- plain sizes:   "950г", "0,5 кг", "1л", "8шт", also glued to a word ("Вода1л")
+- multipacks:    "2x500г", "4 х 0,33 л", "18г x 10шт", "0,5л 4шт"
+  (a count after a volume is the number of bottles/cans; after a weight,
+  "2,44кг 50шт", it is the pieces in the pack and stays a separate size)
+- ranges:        "300/500 г", "1-1,5 кг"
+
+Results are memoized by title, so matching, compatibility checks and pack
+price conversion can ask about the same listing repeatedly for free. The
+memo is per thread: matching threads on a free-threaded build never share
+(or lock) a cache.
+"""
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+
+_NUM = r"\d+(?:[.,]\d+)?"
+_UNIT = r"кг|гр|г|мл|л|шт|pcs|kg|gr|g|ml|l"
+_TIMES = r"[xх×*]"
+_PCS = r"шт|pcs"
+_VOLUME = r"мл|л|ml|l"
+
+_QTY_RE = re.compile(
+    rf"""
+    (?<![\d.,])
+    (?:
+        (?P<packs>\d+)\s*{_TIMES}\s*(?P<m_amt>{_NUM})\s*(?P<m_unit>{_UNIT})
+      | (?P<lo>{_NUM})\s*[/\-–]\s*(?P<hi>{_NUM})\s*(?P<r_unit>{_UNIT})
+      | (?P<c_amt>{_NUM})\s*(?P<c_unit>{_VOLUME})\s*(?P<c_packs>\d+)\s*(?:{_PCS})
+      | (?P<amt>{_NUM})\s*(?P<unit>{_UNIT})(?:\s*{_TIMES}\s*(?P<packs2>\d+)(?:\s*(?:{_PCS}))?)?
+    )
+    (?!\w)
+    """,
+    re.IGNORECASE | re.VERBOSE,
+)
+
+# What may be left between two stripped quantities ("1кг/2кг", "0,5л + 1л").
+_SEPARATORS_RE = re.compile(r"[\s/+,;|\-–]*")
+
+# unit -> (family, divisor to the family's base unit)
+_UNITS: Dict[str, Tuple[str, float]] = {
+    "кг": ("kg", 1.0),
+    "kg": ("kg", 1.0),
+    "г": ("kg", 1000.0),
+    "гр": ("kg", 1000.0),
+    "g": ("kg", 1000.0),
+    "gr": ("kg", 1000.0),
+    "л": ("l", 1.0),
+    "l": ("l", 1.0),
+    "мл": ("l", 1000.0),
+    "ml": ("l", 1000.0),
+    "шт": ("pcs", 1.0),
+    "pcs": ("pcs", 1.0),
+}
+
+
+@dataclass(frozen=True)
+class Quantity:
+    """One size mention. ``amount`` is per pack, in kg / l / pcs."""
+
+    amount: float
+    family: str
+    packs: int = 1
+    range_max: Optional[float] = None
+    span: Tuple[int, int] = (0, 0)
+
+    @property
+    def per_pack(self) -> float:
+        # For "300/500 г" use the middle of the range.
+        if self.range_max is None:
+            return self.amount
+        return (self.amount + self.range_max) / 2.0
+
+    @property
+    def total(self) -> float:
+        return self.per_pack * self.packs
+
+
+def _num(s: str) -> float:
+    return float(s.replace(",", "."))
+
+
+_CACHE_SIZE = 65536
+_local = threading.local()
+
+
+def parse_quantities(title: str) -> Tuple[Quantity, ...]:
+    cache: Optional[Dict[str, Tuple[Quantity, ...]]] = getattr(_local, "cache", None)
+    if cache is None:
+        cache = _local.cache = {}
+    hit = cache.get(title)
+    if hit is None:
+        if len(cache) >= _CACHE_SIZE:
+            cache.clear()
+        hit = cache[title] = _parse_quantities(title)
+    return hit
+
+
+def _parse_quantities(title: str) -> Tuple[Quantity, ...]:
+    out = []
+    for m in _QTY_RE.finditer(title):
+        packs = 1
+        range_max: Optional[float] = None
+        if m.group("m_unit"):
+            family, div = _UNITS[m.group("m_unit").lower()]
+            amount = _num(m.group("m_amt")) / div
+            packs = int(m.group("packs"))
+        elif m.group("c_unit"):
+            family, div = _UNITS[m.group("c_unit").lower()]
+            amount = _num(m.group("c_amt")) / div
+            packs = int(m.group("c_packs"))
+        elif m.group("r_unit"):
+            family, div = _UNITS[m.group("r_unit").lower()]
+            amount = _num(m.group("lo")) / div
+            range_max = _num(m.group("hi")) / div
+            if range_max < amount:
+                amount, range_max = range_max, amount
+        else:
+            family, div = _UNITS[m.group("unit").lower()]
+            amount = _num(m.group("amt")) / div
+            if m.group("packs2"):
+                packs = int(m.group("packs2"))
+        if amount <= 0 or packs <= 0:
+            continue
+        out.append(Quantity(amount=amount, family=family, packs=packs, range_max=range_max, span=m.span()))
+    return tuple(out)
+
+
+def quantity_totals(title: str) -> Dict[str, float]:
+    """Total quantity per family ("kg", "l", "pcs") for a title.
+
+    When a family is mentioned more than once, the first mention wins: a second
+    size in a title is a repeat or a nested pack size, not extra content.
+    A multipack like "18г x 10шт" or "0,5л 4шт" also counts as 10 or 4 pieces.
+    """
+    out: Dict[str, float] = {}
+    for q in parse_quantities(title):
+        if q.family not in out:
+            out[q.family] = q.total
+        if q.packs > 1 and q.family != "pcs" and "pcs" not in out:
+            out["pcs"] = float(q.packs)
+    return out
+
+
+def has_quantity(title: str) -> bool:
+    return bool(parse_quantities(title))
+
+
+def strip_quantities(title: str, repl: str = " ") -> str:
+    """Replace every quantity with ``repl``, collapsing the whitespace around it.
+
+    A blank ``repl`` leaves a single space between the neighbouring words
+    (none at the ends); any other ``repl`` is set off by single spaces.
+    Separators between two quantities ("1кг/2кг") go with them.
+    """
+    qs = parse_quantities(title)
+    if not qs:
+        return title
+    token = repl.strip()
+    text = ""
+    pos = 0
+    for q in qs:
+        start, end = q.span
+        between = title[pos:start]
+        if pos and _SEPARATORS_RE.fullmatch(between):
+            between = ""
+        text = " ".join(filter(None, (text, between.rstrip(), token)))
+        pos = end
+        while pos < len(title) and title[pos].isspace():
+            pos += 1
+    return " ".join(filter(None, (text, title[pos:])))
@@ -3,9 +3,10 @@ import argparse
 import json
 import os
 import time
-import urllib.request
 from pathlib import Path
-from typing import Any, Dict, List, Sequence, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from openai_protocol import DEFAULT_API_BASE, Traffic, classify, item_line
 
 
 ALLOWED_CATEGORIES: List[str] = [
@@ -36,21 +37,11 @@ def _chunks(items: Sequence[str], size: int) -> List[List[str]]:
     return out
 
 
-def _build_prompt(old_categories: List[str]) -> str:
-    allowed = "\n".join([f"- {c}" for c in ALLOWED_CATEGORIES])
-    olds = "\n".join([f"- {c}" for c in old_categories])
-
-    return (
-        "Ти класифікатор категорій продуктів українською. "
-        "Потрібно замапити наявні категорії до одного з дозволених значень. "
-        "ПОВЕРНИ ТІЛЬКИ JSON-об'єкт без markdown.\n\n"
-        "Правила:\n"
-        "- значення мапи повинні бути ТІЛЬКИ з дозволеного списку\n"
-        "- ключі повинні бути точними як у вхідному списку\n"
-        "- якщо не впевнений, обирай найближчу за змістом\n\n"
-        f"Дозволені категорії:\n{allowed}\n\n"
-        f"Вхідні категорії для мапінгу:\n{olds}\n"
-    )
+# Static across batches; the old categories go in the user message, one per line.
+SYSTEM_PROMPT = (
+    "Ти класифікатор категорій продуктів. Кожен рядок - наявна категорія; "
+    "зістав її з найближчою за змістом дозволеною. v[i] - категорія для рядка i+1."
+)
 
 
 def _openai_map_categories(
@@ -60,70 +51,24 @@ def _openai_map_categories(
     timeout_sec: int,
     max_retries: int,
     retry_sleep_sec: float,
+    api_base: str = DEFAULT_API_BASE,
+    traffic: Optional[Traffic] = None,
 ) -> Dict[str, str]:
-    prompt = _build_prompt(old_categories)
-
-    payload = {
-        "model": model,
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 0.0,
-        "max_tokens": 1000,
-    }
-
-    data = json.dumps(payload).encode("utf-8")
-
-    last_err: Exception | None = None
-    for attempt in range(1, max_retries + 1):
-        try:
-            req = urllib.request.Request(
-                "https://api.openai.com/v1/chat/completions",
-                data=data,
-                headers={
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {api_key}",
-                },
-                method="POST",
-            )
-            with urllib.request.urlopen(req, timeout=timeout_sec) as resp:
-                body = resp.read().decode("utf-8")
-
-            parsed = json.loads(body)
-            content = (
-                parsed.get("choices", [{}])[0]
-                .get("message", {})
-                .get("content", "")
-            )
-            if not isinstance(content, str) or not content.strip():
-                raise ValueError("Empty OpenAI response content")
-
-            # The assistant is instructed to return ONLY a JSON object
-            mapping = json.loads(content)
-            if not isinstance(mapping, dict):
-                raise ValueError("OpenAI did not return a JSON object")
-
-            out: Dict[str, str] = {}
-            for k, v in mapping.items():
-                if not isinstance(k, str):
-                    continue
-                if not isinstance(v, str):
-                    continue
-                kk = k.strip()
-                vv = v.strip()
-                if not kk:
-                    continue
-                if vv not in ALLOWED_CATEGORIES:
-                    raise ValueError(f"Invalid mapped category '{vv}' for key '{kk}'")
-                out[kk] = vv
-
-            return out
-        except Exception as e:
-            last_err = e
-            if attempt < max_retries:
-                time.sleep(retry_sleep_sec)
-                continue
-            raise
-
-    raise last_err or RuntimeError("Unknown OpenAI error")
+    lines = [item_line(c) for c in old_categories]
+    mapped = classify(
+        api_key,
+        model,
+        SYSTEM_PROMPT,
+        lines,
+        ALLOWED_CATEGORIES,
+        api_base=api_base,
+        timeout_sec=timeout_sec,
+        max_retries=max_retries,
+        retry_sleep_sec=retry_sleep_sec,
+        max_tokens=1000,
+        traffic=traffic,
+    )
+    return dict(zip(old_categories, mapped))
 
 
 def _validate_and_fill(mapping: Dict[str, str], expected_keys: List[str]) -> Tuple[Dict[str, str], List[str]]:
@@ -140,6 +85,11 @@ def main() -> int:
     parser.add_argument("--in", dest="in_path", default="product_data.json")
     parser.add_argument("--out", dest="out_path", default="product_data_recategorized.json")
     parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument(
+        "--api-base",
+        default=os.environ.get("OPENAI_BASE_URL", DEFAULT_API_BASE),
+        help="Chat Completions API base URL (e.g. openai_stub.py's http://127.0.0.1:8766/v1).",
+    )
     parser.add_argument("--batch-size", type=int, default=60)
     parser.add_argument("--timeout-sec", type=int, default=60)
     parser.add_argument("--max-retries", type=int, default=3)
@@ -171,6 +121,7 @@ def main() -> int:
     batches = _chunks(old_categories, args.batch_size)
 
     full_mapping: Dict[str, str] = {}
+    traffic = Traffic()
     for i, batch in enumerate(batches, start=1):
         print(f"Mapping batch {i}/{len(batches)} (size={len(batch)})...")
         m = _openai_map_categories(
@@ -180,6 +131,8 @@ def main() -> int:
             timeout_sec=args.timeout_sec,
             max_retries=args.max_retries,
             retry_sleep_sec=args.retry_sleep_sec,
+            api_base=args.api_base,
+            traffic=traffic,
         )
         full_mapping.update(m)
 
@@ -187,6 +140,8 @@ def main() -> int:
         if i < len(batches):
             time.sleep(0.7)
 
+    print(traffic.summary(len(old_categories)))
+
     full_mapping, missing = _validate_and_fill(full_mapping, old_categories)
     if missing:
         print("Unmapped categories (will remain unchanged):")
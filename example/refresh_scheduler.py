@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""Adaptive refresh of ATB catalog pages from observed change rates.
+
+A full ATB crawl fetches every page of every category, but most pages come
+back unchanged: "Бакалія" prices move rarely, "Овочі та фрукти" daily. The
+scheduler remembers, for each (category, page), when it was last fetched,
+a fingerprint of its (title, price) pairs, and how often a refetch found it
+changed. Each crawl then refreshes only some of the pages, and atb.py takes
+the rest from the page archive.
+
+Change rates are estimated per page with Cho and Garcia-Molina's estimator
+for a Poisson process observed at intervals: with ``n`` refetches,
+``x`` of which saw a change, and mean interval ``I``,
+``rate = -ln((n - x + 0.5) / (n + 0.5)) / I``. Counts decay by ``DECAY`` per
+refetch, so the estimate follows seasonal changes. Pages with fewer than
+``MIN_VISITS`` refetches use their category's pooled rate.
+
+``plan()`` chooses the pages for one crawl:
+
+1. always: the first page of each category (it carries the pagination),
+   pages never fetched, and pages older than ``max_age``. This bounds
+   staleness, even if it exceeds the budget;
+2. a share ``explore`` of the remaining budget goes to the oldest of the
+   other pages, so stable pages are sampled and their rates stay current;
+3. the rest goes to the pages most likely to have changed since their last
+   fetch, ``1 - exp(-rate * age)``.
+
+State lives in a JSON file next to the script (``refresh_state.json``).
+
+    python atb.py --archive page_archive --refresh-state refresh_state.json --refresh-budget 40
+    python refresh_scheduler.py show
+    python refresh_scheduler.py simulate --archive page_archive --budget 40 --max-age-hours 72
+
+``simulate`` replays the crawls recorded in a page archive. Each recorded run
+is the ground truth at its time. The scheduler fetches only the pages it
+plans, and the report shows requests and staleness: the share of pages served
+with an outdated copy, and how long ago that copy was last current (an upper
+bound on how long it has been outdated). A full crawl and an
+age-ordered round robin with the same budget are shown for comparison.
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+PageKey = Tuple[str, int]  # (category, page)
+
+DECAY = 0.9
+MIN_VISITS = 3
+DEFAULT_RATE = 1 / 86400.0  # one change a day until observed otherwise
+DEFAULT_MAX_AGE = 72 * 3600.0
+DEFAULT_EXPLORE = 0.1
+
+
+def page_fingerprint(page_data: Iterable[Dict[str, Any]]) -> str:
+    """Hash of a parsed page's (title, price) pairs; card order is ignored."""
+    pairs = sorted((str(p.get("originalTitle")), float(p.get("price") or 0)) for p in page_data)
+    return hashlib.sha1(json.dumps(pairs, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+def _poisson_rate(visits: float, changes: float, interval: float) -> Optional[float]:
+    if visits <= 0 or interval <= 0:
+        return None
+    mean_interval = interval / visits
+    return max(0.0, -math.log((visits - changes + 0.5) / (visits + 0.5)) / mean_interval)
+
+
+@dataclass
+class PageStats:
+    fetched_at: float = 0.0
+    fingerprint: str = ""
+    visits: float = 0.0  # decayed number of refetches
+    changes: float = 0.0  # decayed number of refetches that saw a change
+    interval: float = 0.0  # decayed sum of refetch intervals, seconds
+
+    def observe(self, fingerprint: str, now: float) -> bool:
+        """Record a fetch; True when the page changed since the previous one."""
+        changed = bool(self.fingerprint) and fingerprint != self.fingerprint
+        if self.fetched_at and now > self.fetched_at:
+            self.visits = self.visits * DECAY + 1
+            self.changes = self.changes * DECAY + changed
+            self.interval = self.interval * DECAY + (now - self.fetched_at)
+        self.fetched_at = now
+        self.fingerprint = fingerprint
+        return changed
+
+    def rate(self) -> Optional[float]:
+        return _poisson_rate(self.visits, self.changes, self.interval)
+
+
+class RefreshScheduler:
+    def __init__(self, pages: Optional[Dict[PageKey, PageStats]] = None) -> None:
+        self.pages: Dict[PageKey, PageStats] = pages or {}
+
+    @classmethod
+    def load(cls, path: Path) -> "RefreshScheduler":
+        if not path.exists():
+            return cls()
+        data = json.loads(path.read_text(encoding="utf-8"))
+        return cls({(row["category"], int(row["page"])): PageStats(**row["stats"]) for row in data.get("pages", [])})
+
+    def save(self, path: Path) -> None:
+        rows = [{"category": c, "page": p, "stats": asdict(s)} for (c, p), s in sorted(self.pages.items())]
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps({"pages": rows}, ensure_ascii=False, indent=1) + "\n", encoding="utf-8")
+        os.replace(tmp, path)
+
+    def observe(self, key: PageKey, fingerprint: str, now: float) -> bool:
+        return self.pages.setdefault(key, PageStats()).observe(fingerprint, now)
+
+    def category_rates(self) -> Dict[str, float]:
+        """Pooled rate per category over its pages' decayed counts."""
+        totals: Dict[str, List[float]] = {}
+        for (category, _page), s in self.pages.items():
+            t = totals.setdefault(category, [0.0, 0.0, 0.0])
+            t[0] += s.visits
+            t[1] += s.changes
+            t[2] += s.interval
+        rates: Dict[str, float] = {}
+        for category, (visits, changes, interval) in totals.items():
+            rate = _poisson_rate(visits, changes, interval)
+            if rate is not None:
+                rates[category] = rate
+        return rates
+
+    def rate(self, key: PageKey, category_rates: Optional[Dict[str, float]] = None) -> float:
+        s = self.pages[key]
+        if s.visits >= MIN_VISITS:
+            return s.rate() or 0.0
+        if category_rates is None:
+            category_rates = self.category_rates()
+        return category_rates.get(key[0], DEFAULT_RATE)
+
+    def plan(
+        self,
+        now: float,
+        budget: Optional[int],
+        max_age: float = DEFAULT_MAX_AGE,
+        explore: float = DEFAULT_EXPLORE,
+        keys: Optional[Iterable[PageKey]] = None,
+    ) -> Set[PageKey]:
+        """Known pages to refresh now; pages not in the state are always fetched by the caller."""
+        keys = list(self.pages if keys is None else keys)
+        if budget is None:
+            return set(keys)
+        chosen: Set[PageKey] = set()
+        rest: List[PageKey] = []
+        for key in keys:
+            s = self.pages.get(key)
+            if key[1] == 1 or s is None or not s.fetched_at or now - s.fetched_at >= max_age:
+                chosen.add(key)
+            else:
+                rest.append(key)
+        slots = max(0, budget - len(chosen))
+        if not slots or not rest:
+            return chosen
+
+        rest.sort(key=lambda k: self.pages[k].fetched_at)  # oldest first
+        n_explore = min(len(rest), math.ceil(slots * explore))
+        chosen.update(rest[:n_explore])
+        rest = rest[n_explore:]
+
+        category_rates = self.category_rates()
+
+        def stale_probability(key: PageKey) -> float:
+            return 1.0 - math.exp(-self.rate(key, category_rates) * (now - self.pages[key].fetched_at))
+
+        rest.sort(key=stale_probability, reverse=True)
+        chosen.update(rest[: slots - n_explore])
+        return chosen
+
+
+# --- simulation -------------------------------------------------------------
+
+
+@dataclass
+class SimResult:
+    policy: str
+    requests: int = 0
+    page_runs: int = 0  # (page, run) pairs served
+    stale_page_runs: int = 0  # of those, served with an outdated copy
+    stale_seconds: float = 0.0  # summed time those copies had been outdated
+    max_stale: float = 0.0
+
+    def line(self, full_requests: int) -> str:
+        saved = 1 - self.requests / full_requests if full_requests else 0.0
+        stale = self.stale_page_runs / self.page_runs if self.page_runs else 0.0
+        mean = self.stale_seconds / self.stale_page_runs if self.stale_page_runs else 0.0
+        return (
+            f"{self.policy:<12} requests {self.requests:>6} ({saved:>4.0%} saved)  "
+            f"stale pages {stale:>5.1%}  mean staleness {mean / 3600:>5.1f} h  max {self.max_stale / 3600:>5.1f} h"
+        )
+
+
+def load_runs(archive_root: Path, fingerprint: Callable[[Dict[str, Any]], str]) -> List[Tuple[float, Dict[PageKey, str]]]:
+    """Recorded crawls from a page archive: [(time, {(category, page): fingerprint})]."""
+    from page_archive import PageArchive
+
+    runs: Dict[Any, Tuple[float, Dict[PageKey, str]]] = {}
+    for entry in PageArchive(archive_root).entries(latest_only=False):
+        meta = entry.get("meta") or {}
+        # Linked entries are copies reused by a scheduled crawl, not observations.
+        if entry.get("linked") or not meta.get("category") or not meta.get("page"):
+            continue
+        at, pages = runs.setdefault(meta.get("run", 0), (entry["fetchedAt"], {}))
+        pages[(meta["category"], int(meta["page"]))] = fingerprint(entry)
+    return sorted(runs.values(), key=lambda r: r[0])
+
+
+def simulate(
+    runs: List[Tuple[float, Dict[PageKey, str]]],
+    policy: str,
+    budget: Optional[int],
+    max_age: float = DEFAULT_MAX_AGE,
+    explore: float = DEFAULT_EXPLORE,
+) -> SimResult:
+    """Replay recorded runs; ``policy`` is "full", "round-robin" or "adaptive"."""
+    scheduler = RefreshScheduler()
+    held: Dict[PageKey, str] = {}
+    current_at: Dict[PageKey, float] = {}  # last run at which the held copy was still current
+    result = SimResult(policy)
+    for at, truth in runs:
+        if policy == "full":
+            chosen = set(truth)
+        else:
+            share = 1.0 if policy == "round-robin" else explore
+            chosen = scheduler.plan(at, budget, max_age, share, keys=[k for k in truth if k in scheduler.pages])
+            chosen |= {k for k in truth if k not in scheduler.pages}
+        for key, fp in truth.items():
+            result.page_runs += 1
+            if key in chosen:
+                result.requests += 1
+                scheduler.observe(key, fp, at)
+                held[key] = fp
+                current_at[key] = at
+            elif held.get(key) != fp:
+                result.stale_page_runs += 1
+                result.stale_seconds += at - current_at[key]
+                result.max_stale = max(result.max_stale, at - current_at[key])
+            else:
+                current_at[key] = at
+    return result
+
+
+def _archive_fingerprint(archive_root: Path) -> Callable[[Dict[str, Any]], str]:
+    # atb.py needs bs4 and cloudscraper, so it is imported only here.
+    from atb import _parse_archived_page
+
+    return lambda entry: page_fingerprint(_parse_archived_page((str(archive_root), entry)))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Adaptive page refresh for the ATB crawl.")
+    parser.add_argument("--state", default="refresh_state.json")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_show = sub.add_parser("show", help="Estimated change rates per category and the next plan.")
+    p_show.add_argument("--budget", type=int, default=None)
+    p_show.add_argument("--max-age-hours", type=float, default=DEFAULT_MAX_AGE / 3600)
+    p_sim = sub.add_parser("simulate", help="Replay the crawls recorded in a page archive.")
+    p_sim.add_argument("--archive", default="page_archive")
+    p_sim.add_argument("--budget", type=int, required=True, help="Page requests per crawl.")
+    p_sim.add_argument("--max-age-hours", type=float, default=DEFAULT_MAX_AGE / 3600)
+    p_sim.add_argument("--explore", type=float, default=DEFAULT_EXPLORE)
+    args = parser.parse_args()
+
+    base_dir = Path(__file__).resolve().parent
+    max_age = args.max_age_hours * 3600
+
+    if args.cmd == "show":
+        scheduler = RefreshScheduler.load(base_dir / args.state)
+        if not scheduler.pages:
+            print(f"No state in {base_dir / args.state}")
+            return 0
+        rates = scheduler.category_rates()
+        counts: Dict[str, int] = {}
+        for category, _page in scheduler.pages:
+            counts[category] = counts.get(category, 0) + 1
+        for category in sorted(counts, key=lambda c: -rates.get(c, 0.0)):
+            rate = rates.get(category)
+            per_day = f"{rate * 86400:6.2f} changes/day per page" if rate is not None else "  not observed yet"
+            print(f"{category:<40} {counts[category]:>4} pages  {per_day}")
+        plan = scheduler.plan(time.time(), args.budget, max_age)
+        print(f"\nNext crawl: {len(plan)} of {len(scheduler.pages)} pages")
+        return 0
+
+    archive_root = (base_dir / args.archive).resolve()
+    runs = load_runs(archive_root, _archive_fingerprint(archive_root))
+    if len(runs) < 2:
+        print(f"Need at least two recorded runs in {archive_root}, found {len(runs)}")
+        return 1
+    pages = sum(len(pages) for _at, pages in runs)
+    span = (runs[-1][0] - runs[0][0]) / 86400
+    print(f"Runs: {len(runs)} over {span:.1f} days, {pages} page fetches recorded; budget {args.budget} pages/run")
+    full = simulate(runs, "full", None)
+    for policy in ("full", "round-robin", "adaptive"):
+        result = full if policy == "full" else simulate(runs, policy, args.budget, max_age, args.explore)
+        print(result.line(full.requests))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
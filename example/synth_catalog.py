@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""Synthetic catalogs for scale and stress testing.
+
+Writes ATB-format, Metro-format and product_data.json-format files that are
+``--scale`` times the size of the bundled ones (10x to 1000x). Items are
+sampled from the bundled data. Each copy after the first gets realistic noise:
+
+- a brand from atb.BRANDS inserted after the first word;
+- a new size ("500г", "2х500г", "0,5л", "10шт", ...), in the unit family of
+  the original item;
+- a packaging suffix ("п/ванночку", "д/пак", "в уп", ...);
+- Latin homoglyphs for some Cyrillic letters ("Kpeм");
+- a descriptor word borrowed from another title in the same category;
+- a price moved by -15%..+20%.
+
+Item ``i`` is generated from its own RNG seeded with ``(seed, kind, i)``.
+Output is therefore identical for the same seed and scale. Files are
+streamed, so memory stays flat even at 1000x.
+
+    python synth_catalog.py --scale 100 --seed 1 --out-dir /tmp/synth100
+    python update_prices.py --product-data /tmp/synth100/product_data.json \\
+        --atb /tmp/synth100/atb_products.json --metro /tmp/synth100/metro_full_catalog_all_pages.json
+"""
+import argparse
+import json
+import random
+import re
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, TextIO
+
+from crawl_utils import script_constant
+from quantities import quantity_totals, strip_quantities
+
+SIZES: Dict[str, List[str]] = {
+    "kg": ["100г", "150г", "200г", "250г", "300г", "400г", "500г", "750г", "900г", "1кг", "1,5кг", "2кг", "2х500г", "300/500г"],
+    "l": ["250мл", "330мл", "0,5л", "900мл", "950мл", "1л", "1,5л", "2л", "4х0,33л"],
+    "pcs": ["1шт", "4шт", "6шт", "10шт", "12шт", "18шт"],
+}
+
+# atb.py baseUnit / product_data unit -> size family
+UNIT_SIZE_FAMILY = {"G": "kg", "KG": "kg", "ML": "l", "L": "l", "PCS": "pcs"}
+
+PACKAGING_SUFFIXES = ["п/ванночку", "д/пак", "пл/відро", "пл/стак", "пл/уп", "в пакеті", "в уп", "в упаковці", "(М)", "(L)"]
+
+# Cyrillic letters that atb.normalize_latin_to_cyrillic maps back from Latin.
+HOMOGLYPHS = {
+    "а": "a", "е": "e", "о": "o", "р": "p", "с": "c", "х": "x", "у": "y",
+    "А": "A", "Е": "E", "О": "O", "Р": "P", "С": "C", "Х": "X", "У": "Y",
+    "К": "K", "М": "M", "Т": "T", "Н": "H", "В": "B",
+}
+
+_WORD_RE = re.compile(r"[а-яієїґ']{4,}", re.IGNORECASE)
+
+
+class Noiser:
+    def __init__(self, brands: Sequence[str], titles_by_category: Dict[str, List[str]]) -> None:
+        self.brands = sorted(set(brands))
+        # category -> words that can be appended as descriptors
+        self.descriptors: Dict[str, List[str]] = {}
+        for category, titles in titles_by_category.items():
+            words = set()
+            for title in titles:
+                words.update(w.lower() for w in _WORD_RE.findall(title)[1:])
+            self.descriptors[category] = sorted(words)
+
+    def descriptor(self, rng: random.Random, category: str) -> str:
+        words = self.descriptors.get(category)
+        return rng.choice(words) if words else ""
+
+    @staticmethod
+    def size_family(title: str, unit: Optional[str]) -> str:
+        families = quantity_totals(title)
+        if families:
+            return "l" if "l" in families else "pcs" if set(families) == {"pcs"} else "kg"
+        return UNIT_SIZE_FAMILY.get((unit or "").upper(), "kg")
+
+    def title(self, rng: random.Random, title: str, category: str, unit: Optional[str], descriptor: str) -> str:
+        words = title.split()
+        if descriptor:
+            words.append(descriptor)
+        if rng.random() < 0.5 and self.brands:
+            brand = rng.choice(self.brands)
+            words.insert(1, brand.title() if rng.random() < 0.7 else brand)
+        if rng.random() < 0.4:
+            family = self.size_family(title, unit)
+            words = strip_quantities(" ".join(words)).split()
+            words.append(rng.choice(SIZES[family]))
+        if rng.random() < 0.3:
+            words.append(rng.choice(PACKAGING_SUFFIXES))
+        out = " ".join(words)
+        if rng.random() < 0.15:
+            positions = [k for k, ch in enumerate(out) if ch in HOMOGLYPHS]
+            for k in rng.sample(positions, min(len(positions), rng.randint(1, 2))):
+                out = out[:k] + HOMOGLYPHS[out[k]] + out[k + 1 :]
+        return out
+
+
+def _price(rng: random.Random, price: Any) -> Any:
+    if not isinstance(price, (int, float)) or price <= 0:
+        return price
+    return round(price * rng.uniform(0.85, 1.2), 2)
+
+
+def _rng(seed: int, kind: str, i: int) -> random.Random:
+    # String seeds are hashed with SHA-512, so this is stable across runs and
+    # independent of PYTHONHASHSEED.
+    return random.Random(f"{seed}/{kind}/{i}")
+
+
+def atb_item(noiser: Noiser, base: Sequence[Dict[str, Any]], seed: int, i: int) -> Dict[str, Any]:
+    src = base[i % len(base)]
+    if i < len(base):
+        return dict(src)
+    rng = _rng(seed, "atb", i)
+    descriptor = noiser.descriptor(rng, src["category"]) if rng.random() < 0.3 else ""
+    name = f"{src['name']} {descriptor}" if descriptor else src["name"]
+    return {
+        "originalTitle": noiser.title(rng, src["originalTitle"], src["category"], src.get("baseUnit"), descriptor),
+        "name": name,
+        "category": src["category"],
+        "baseUnit": src.get("baseUnit"),
+        "price": _price(rng, src.get("price")),
+    }
+
+
+def metro_item(noiser: Noiser, base: Sequence[Dict[str, Any]], seed: int, i: int) -> Dict[str, Any]:
+    src = base[i % len(base)]
+    if i < len(base):
+        return dict(src)
+    rng = _rng(seed, "metro", i)
+    descriptor = noiser.descriptor(rng, src["category"]) if rng.random() < 0.3 else ""
+    return {
+        "title": noiser.title(rng, src["title"], src["category"], None, descriptor),
+        "price": _price(rng, src.get("price")),
+        "category": src["category"],
+    }
+
+
+def product_item(noiser: Noiser, base: Sequence[Dict[str, Any]], seed: int, i: int) -> Dict[str, Any]:
+    # Our own product list is clean: descriptors and sizes, but no brands or
+    # packaging noise.
+    src = base[i % len(base)]
+    if i < len(base):
+        return dict(src)
+    rng = _rng(seed, "products", i)
+    words = [src["title"]]
+    if rng.random() < 0.5:
+        words.append(noiser.descriptor(rng, src["category"]))
+    if rng.random() < 0.2:
+        words.append(rng.choice(SIZES[Noiser.size_family(src["title"], src.get("unit"))]))
+    item = dict(src)
+    item["title"] = " ".join(w for w in words if w)
+    item["price"] = _price(rng, src.get("price"))
+    if isinstance(src.get("calories"), (int, float)):
+        item["calories"] = int(round(src["calories"] * rng.uniform(0.9, 1.1)))
+    return item
+
+
+ItemFn = Callable[[Noiser, Sequence[Dict[str, Any]], int, int], Dict[str, Any]]
+
+
+def _write_array(fh: TextIO, items: Iterator[Dict[str, Any]], indent: str = "") -> int:
+    count = 0
+    fh.write("[")
+    for item in items:
+        fh.write(",\n" if count else "\n")
+        fh.write(indent + "  " + json.dumps(item, ensure_ascii=False))
+        count += 1
+    fh.write(f"\n{indent}]" if count else "]")
+    return count
+
+
+def write_list(path: Path, noiser: Noiser, base: Sequence[Dict[str, Any]], seed: int, total: int, fn: ItemFn) -> int:
+    with path.open("w", encoding="utf-8") as fh:
+        count = _write_array(fh, (fn(noiser, base, seed, i) for i in range(total)))
+        fh.write("\n")
+    return count
+
+
+def write_atb(path: Path, noiser: Noiser, base: Sequence[Dict[str, Any]], seed: int, total: int) -> int:
+    """atb.py's output shape: ``products`` plus the same items grouped in ``byCategory``.
+
+    Items are regenerated for ``byCategory`` instead of being kept in memory.
+    """
+    order: List[str] = []
+    for p in base:
+        if p["category"] not in order:
+            order.append(p["category"])
+    with path.open("w", encoding="utf-8") as fh:
+        fh.write('{\n  "products": ')
+        count = _write_array(fh, (atb_item(noiser, base, seed, i) for i in range(total)), indent="  ")
+        fh.write(',\n  "byCategory": {')
+        for n, category in enumerate(order):
+            positions = [k for k, p in enumerate(base) if p["category"] == category]
+            ids = (v * len(base) + k for v in range(-(-total // len(base))) for k in positions)
+            fh.write(",\n" if n else "\n")
+            fh.write(f"    {json.dumps(category, ensure_ascii=False)}: ")
+            _write_array(fh, (atb_item(noiser, base, seed, i) for i in ids if i < total), indent="    ")
+        fh.write("\n  }\n}\n")
+    return count
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Generate synthetic ATB, Metro and product_data catalogs.")
+    parser.add_argument("--scale", type=float, default=10.0, help="Output size relative to the bundled data (1 = same size).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out-dir", required=True)
+    parser.add_argument("--only", choices=["atb", "metro", "products"], action="append", help="Generate only these (repeatable).")
+    parser.add_argument("--product-data", default="product_data.json")
+    parser.add_argument("--atb", default="atb_products.json")
+    parser.add_argument("--metro", default="metro_full_catalog_all_pages.json")
+    args = parser.parse_args()
+
+    if args.scale < 1:
+        parser.error("--scale must be at least 1")
+
+    base_dir = Path(__file__).resolve().parent
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    kinds = args.only or ["atb", "metro", "products"]
+
+    atb_base = json.loads((base_dir / args.atb).read_text(encoding="utf-8")).get("products") or []
+    metro_base = json.loads((base_dir / args.metro).read_text(encoding="utf-8"))
+    product_base = json.loads((base_dir / args.product_data).read_text(encoding="utf-8"))
+
+    titles: Dict[str, List[str]] = {}
+    for p in atb_base:
+        titles.setdefault(p["category"], []).append(p["originalTitle"])
+    for p in metro_base:
+        titles.setdefault(p["category"], []).append(p["title"])
+    for p in product_base:
+        titles.setdefault(p["category"], []).append(p["title"])
+    noiser = Noiser(script_constant(base_dir / "atb.py", "BRANDS"), titles)
+
+    jobs = {
+        "atb": (args.atb, atb_base, lambda path, total: write_atb(path, noiser, atb_base, args.seed, total)),
+        "metro": (args.metro, metro_base, lambda path, total: write_list(path, noiser, metro_base, args.seed, total, metro_item)),
+        "products": (
+            args.product_data,
+            product_base,
+            lambda path, total: write_list(path, noiser, product_base, args.seed, total, product_item),
+        ),
+    }
+    for kind in kinds:
+        name, base, write = jobs[kind]
+        if not base:
+            print(f"{kind}: no bundled items to sample from, skipped")
+            continue
+        total = int(round(len(base) * args.scale))
+        path = out_dir / Path(name).name
+        started = time.perf_counter()
+        count = write(path, total)
+        elapsed = time.perf_counter() - started
+        size_mb = path.stat().st_size / 1e6
+        print(f"{kind}: {count} items ({len(base)} x {args.scale:g}) -> {path} ({size_mb:.1f} MB, {elapsed:.1f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,71 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+import update_prices as up
+from fast_score import TOLERANCE, FastScorer
+
+BASE_DIR = Path(__file__).resolve().parent
+
+
+@pytest.fixture(scope="module")
+def products() -> List[Dict[str, Any]]:
+    rows = json.loads((BASE_DIR / "product_data.json").read_text(encoding="utf-8"))
+    return [p for p in rows if isinstance(p.get("title"), str) and p["title"].strip()]
+
+
+@pytest.fixture(scope="module", params=["ATB", "METRO"])
+def store(request: Any) -> Any:
+    if request.param == "ATB":
+        atb = json.loads((BASE_DIR / "atb_products.json").read_text(encoding="utf-8")).get("products") or []
+        return up._build_candidate_store(atb, ["name", "originalTitle"], "price", "baseUnit")
+    metro = json.loads((BASE_DIR / "metro_full_catalog_all_pages.json").read_text(encoding="utf-8"))
+    return up._build_candidate_store(metro, ["title"], "price")
+
+
+def _candidate_ids(store: Any, q_norm: str) -> List[int]:
+    ids = set()
+    for t in set(up._tokenize(q_norm)):
+        ids.update(store.index.get(t, ()))
+    return sorted(ids)
+
+
+def test_score_matches_reference(store: Any, products: List[Dict[str, Any]]) -> None:
+    scorer = FastScorer(store, up._tokenize)
+    for p in products[::5]:
+        q_norm = up._normalize_title(p["title"])
+        for i in _candidate_ids(store, q_norm):
+            assert abs(scorer.score(q_norm, i) - up._score(q_norm, store.norm_title(i))) <= TOLERANCE
+
+
+def test_find_best_id_matches_reference(store: Any, products: List[Dict[str, Any]]) -> None:
+    scorer = FastScorer(store, up._tokenize)
+    for p in products:
+        unit = p.get("unit") if isinstance(p.get("unit"), str) else ""
+        slow = up._find_best_id(p["title"], unit, store, store.index, 0.62, 1, 0.06)
+        fast = up._find_best_id(p["title"], unit, store, store.index, 0.62, 1, 0.06, scorer=scorer)
+        assert fast == slow, p["title"]
+
+
+class _Cand:
+    def __init__(self, norm_title: str) -> None:
+        self.norm_title = norm_title
+
+
+def test_unknown_query_tokens_are_not_interned() -> None:
+    cands = [_Cand("молоко ферма"), _Cand("хліб київхліб")]
+    scorer = FastScorer(cands, up._tokenize)
+    vocab = dict(scorer._id_of)
+    for q in ("молоко незнайоме", "щось зовсім нове"):
+        for i in range(len(cands)):
+            assert abs(scorer.score(q, i) - up._score(q, cands[i].norm_title)) <= TOLERANCE
+        scorer.best_of(q, [0, 1])
+    assert scorer._id_of == vocab
+
+
+def test_empty_query() -> None:
+    scorer = FastScorer([_Cand("молоко")], up._tokenize)
+    assert scorer.score("", 0) == 0.0
+    assert scorer.best_of("", [0]) == (None, 0.0, 0.0)
@@ -0,0 +1,55 @@
+from quantities import parse_quantities, quantity_totals, strip_quantities
+
+
+def test_plain_sizes():
+    assert quantity_totals("Молоко 2,5% 900г") == {"kg": 0.9}
+    assert quantity_totals("Олія 0,85 л") == {"l": 0.85}
+    assert quantity_totals("Яйця 10шт") == {"pcs": 10.0}
+
+
+def test_multipacks():
+    assert quantity_totals("Сік 2x0,5л") == {"l": 1.0, "pcs": 2.0}
+    assert quantity_totals("Вафлі 18г x 10шт") == {"kg": 0.18, "pcs": 10.0}
+
+
+def test_volume_followed_by_count_is_a_multipack():
+    assert quantity_totals("Пиво 0,5л 4шт") == {"l": 2.0, "pcs": 4.0}
+    assert quantity_totals("Coca-Cola Zero 250мл 12шт") == {"l": 3.0, "pcs": 12.0}
+    assert quantity_totals("Вода 1,5 л 6 шт") == {"l": 9.0, "pcs": 6.0}
+
+
+def test_weight_followed_by_count_is_pieces_in_the_pack():
+    assert quantity_totals("Яйця відварні 2,44кг 50шт") == {"kg": 2.44, "pcs": 50.0}
+
+
+def test_ranges():
+    (q,) = parse_quantities("Огірки 300/500 г")
+    assert q.range_max == 0.5
+    assert quantity_totals("Огірки 300/500 г") == {"kg": 0.4}
+
+
+def test_size_glued_to_a_word():
+    assert quantity_totals("Вода1л") == {"l": 1.0}
+    assert strip_quantities("Кола0,5л газована") == "Кола газована"
+
+
+def test_number_inside_a_word_is_not_a_size():
+    assert quantity_totals("Вітамін B12") == {}
+    assert quantity_totals("Шоколад 70,5% какао") == {}
+
+
+def test_strip_collapses_whitespace():
+    assert strip_quantities("Крупа гречана 1кг ядриця непропарена") == "Крупа гречана ядриця непропарена"
+    assert strip_quantities("1кг Крупа") == "Крупа"
+    assert strip_quantities("Крупа 1 кг") == "Крупа"
+    assert strip_quantities("Без кількості") == "Без кількості"
+
+
+def test_strip_drops_separators_between_quantities():
+    assert strip_quantities("Цукор 1кг/2кг") == "Цукор"
+    assert strip_quantities("Огірки 1000г/600г солоні") == "Огірки солоні"
+    assert strip_quantities("Пиво 0,5л + 1л") == "Пиво"
+
+
+def test_strip_with_marker():
+    assert strip_quantities("Молоко 900г Ферма", "<Q>") == "Молоко <Q> Ферма"
@@ -0,0 +1,138 @@
+import argparse
+import io
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+from watch_prices import PriceWatcher, SourceSpec, _snapshot
+
+PRODUCTS = [
+    {"title": "Молоко Ферма", "unit": "", "price": 40.0, "category": "dairy"},
+    {"title": "Хліб Київхліб", "unit": "", "price": 20.0, "category": "bakery"},
+    {"title": "Сир Комо", "unit": "", "price": 90.0, "category": "dairy"},
+]
+
+CATALOG = [
+    {"title": "Молоко Ферма 900г", "price": 41.0, "category": "dairy"},
+    {"title": "Хліб Київхліб 500г", "price": 22.0, "category": "bakery"},
+]
+
+
+def _args(**overrides: Any) -> argparse.Namespace:
+    args = dict(
+        min_score=0.62,
+        min_token_overlap=1,
+        min_score_gap=0.06,
+        convert_packs=False,
+        no_price_checks=False,
+        max_price_ratio=3.0,
+        max_price_z=3.5,
+    )
+    args.update(overrides)
+    return argparse.Namespace(**args)
+
+
+def _write(path: Path, records: List[Dict[str, Any]]) -> None:
+    path.write_text(json.dumps(records, ensure_ascii=False), encoding="utf-8")
+
+
+@pytest.fixture
+def catalog_path(tmp_path: Path) -> Path:
+    path = tmp_path / "metro.json"
+    _write(path, CATALOG)
+    return path
+
+
+def _watcher(catalog_path: Path, **overrides: Any) -> PriceWatcher:
+    spec = SourceSpec(
+        name="METRO",
+        path=catalog_path,
+        load=lambda root: root,
+        title_keys=["title"],
+        price_key="price",
+        base_unit_key=None,
+        identity=lambda it: f"{it.get('category')}\t{it.get('title')}",
+    )
+    watcher = PriceWatcher([dict(p) for p in PRODUCTS], [spec], _args(**overrides))
+    watcher.load_all()
+    watcher.rematch(range(len(PRODUCTS)), io.StringIO())
+    return watcher
+
+
+def _apply(watcher: PriceWatcher, catalog_path: Path, records: List[Dict[str, Any]]) -> Any:
+    _write(catalog_path, records)
+    cat = watcher.catalogs[0]
+    return watcher._apply(cat, _snapshot(cat.spec))
+
+
+def test_initial_match(catalog_path: Path) -> None:
+    watcher = _watcher(catalog_path)
+    assert watcher._effective_price(0) == 41.0
+    assert watcher._effective_price(1) == 22.0
+    assert watcher._effective_price(2) == 90.0
+
+
+def test_unchanged_catalog_affects_nothing(catalog_path: Path) -> None:
+    watcher = _watcher(catalog_path)
+    assert _apply(watcher, catalog_path, CATALOG) == (0, 0, 0)
+    assert watcher.pending == set()
+
+
+def test_reprice_affects_only_products_matched_to_it(catalog_path: Path) -> None:
+    watcher = _watcher(catalog_path)
+    records = [dict(CATALOG[0], price=43.0), CATALOG[1]]
+    assert _apply(watcher, catalog_path, records) == (0, 0, 1)
+    assert watcher.pending == {0}
+
+    out = io.StringIO()
+    assert watcher.rematch(watcher.pending, out) == 1
+    (line,) = out.getvalue().splitlines()
+    assert json.loads(line)["newPrice"] == 43.0
+    assert watcher._effective_price(0) == 43.0
+
+
+def test_removed_record_affects_products_that_scored_it(catalog_path: Path) -> None:
+    watcher = _watcher(catalog_path)
+    assert _apply(watcher, catalog_path, CATALOG[:1]) == (0, 1, 0)
+    assert 1 in watcher.pending and 0 not in watcher.pending
+
+    watcher.rematch(watcher.pending, io.StringIO())
+    assert watcher._effective_price(1) == 20.0  # back to product_data's own price
+
+
+def test_added_record_affects_products_sharing_a_token(catalog_path: Path) -> None:
+    watcher = _watcher(catalog_path)
+    records = CATALOG + [{"title": "Сир Комо 200г", "price": 95.0, "category": "dairy"}]
+    assert _apply(watcher, catalog_path, records) == (1, 0, 0)
+    assert watcher.pending == {2}
+
+
+def test_retitled_record_is_removed_and_added(catalog_path: Path) -> None:
+    watcher = _watcher(catalog_path)
+    records = [dict(CATALOG[0], title="Молоко Ферма 1л"), CATALOG[1]]
+    assert _apply(watcher, catalog_path, records) == (1, 1, 0)
+    assert 0 in watcher.pending
+
+
+def test_outlier_price_is_held(catalog_path: Path) -> None:
+    watcher = _watcher(catalog_path)
+    _apply(watcher, catalog_path, [dict(CATALOG[0], price=410.0), CATALOG[1]])
+
+    out = io.StringIO()
+    assert watcher.rematch(watcher.pending, out) == 0
+    rec = json.loads(out.getvalue())
+    assert rec["held"] is True and rec["reasons"]
+    assert rec["newPrice"] == 410.0
+    assert watcher._effective_price(0) == 41.0
+
+
+def test_price_checks_can_be_disabled(catalog_path: Path) -> None:
+    watcher = _watcher(catalog_path, no_price_checks=True)
+    _apply(watcher, catalog_path, [dict(CATALOG[0], price=410.0), CATALOG[1]])
+
+    out = io.StringIO()
+    assert watcher.rematch(watcher.pending, out) == 1
+    assert "held" not in json.loads(out.getvalue())
+    assert watcher._effective_price(0) == 410.0
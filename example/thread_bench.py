@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""Thread scaling of price matching and name normalization.
+
+``update_prices.py --threads N`` and ``atb.py --replay --replay-threads``
+run their CPU-bound work on a thread pool. With the GIL only one thread runs
+Python code at a time, so they gain nothing. On a free-threaded build
+(``python3.14t``, where ``sys._is_gil_enabled()`` is False) they scale with
+the cores. This script measures both workloads at 1..N threads:
+
+- match: update_prices.py's ATB-then-Metro matching of every product
+  (one FastScorer per catalog shared by all threads, as in update_prices.py);
+- normalize: atb.normalize_product_name over every ATB and Metro title.
+
+Every thread count runs on a fresh pool, so per-thread caches start cold
+each time. Results are compared with the 1-thread run to check that the
+threaded output is identical.
+
+    python thread_bench.py --threads 1,2,4,8
+    python3.14t thread_bench.py --threads 1,2,4,8 --only match
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import update_prices as up
+from fast_score import FastScorer
+
+
+def _ints(s: str) -> List[int]:
+    return [int(x) for x in s.split(",") if x.strip()]
+
+
+def gil_enabled() -> bool:
+    check = getattr(sys, "_is_gil_enabled", None)
+    return True if check is None else check()
+
+
+def run_threads(fn: Callable[[Any], Any], items: Sequence[Any], threads: int, chunk: int = 64) -> List[Any]:
+    """``[fn(x) for x in items]`` on a new pool of ``threads`` threads, in order."""
+    parts = [items[k : k + chunk] for k in range(0, len(items), chunk)]
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return [r for part in pool.map(lambda xs: [fn(x) for x in xs], parts) for r in part]
+
+
+def matcher(args: argparse.Namespace, base_dir: Path) -> Tuple[Callable[[Dict[str, Any]], Any], int]:
+    """A per-product match function with update_prices.py's defaults, and the store size."""
+    atb_root = json.loads((base_dir / args.atb).read_text(encoding="utf-8"))
+    metro_items = json.loads((base_dir / args.metro).read_text(encoding="utf-8"))
+    stores = [
+        up._build_candidate_store(atb_root.get("products") or [], ["name", "originalTitle"], "price", "baseUnit"),
+        up._build_candidate_store(metro_items, ["title"], "price"),
+    ]
+    parts = [up._build_unit_partitions(store) for store in stores]
+    scorers = [FastScorer(store, up._tokenize) for store in stores]
+
+    def match(p: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+        title = p.get("title")
+        if not isinstance(title, str) or not title.strip():
+            return None
+        unit = p.get("unit") if isinstance(p.get("unit"), str) else ""
+        for s, (store, part, scorer) in enumerate(zip(stores, parts, scorers)):
+            best_id, _sc = up._find_best_id(title, unit, store, part.for_unit(unit), 0.62, 1, 0.06, scorer=scorer)
+            if best_id is not None:
+                return s, best_id
+        return None
+
+    return match, sum(len(store) for store in stores)
+
+
+def bench(name: str, fn: Callable[[Any], Any], items: Sequence[Any], thread_counts: Sequence[int], repeat: int) -> None:
+    print(f"\n{name}: {len(items)} items")
+    print(f"  {'threads':>7} {'seconds':>8} {'items/s':>9} {'speedup':>7}  same")
+    reference: Optional[List[Any]] = None
+    base = 0.0
+    for n in thread_counts:
+        best = float("inf")
+        out: List[Any] = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            out = run_threads(fn, items, n)
+            best = min(best, time.perf_counter() - started)
+        if reference is None:
+            reference, base = out, best
+        same = "yes" if out == reference else "NO"
+        print(f"  {n:>7d} {best:>8.2f} {len(items) / best:>9.0f} {base / best:>6.2f}x  {same}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure thread scaling of matching and name normalization.")
+    parser.add_argument("--product-data", default="product_data.json")
+    parser.add_argument("--atb", default="atb_products.json")
+    parser.add_argument("--metro", default="metro_full_catalog_all_pages.json")
+    parser.add_argument("--threads", default=f"1,2,4,{os.cpu_count() or 8}", help="Comma-separated thread counts.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per thread count; the fastest is reported.")
+    parser.add_argument("--only", choices=["match", "normalize"], action="append", help="Run only these (repeatable).")
+    args = parser.parse_args()
+
+    thread_counts = sorted(set(_ints(args.threads)))
+    if not thread_counts or thread_counts[0] < 1:
+        parser.error("--threads needs positive counts")
+    kinds = args.only or ["match", "normalize"]
+    base_dir = Path(__file__).resolve().parent
+
+    print(f"Python {sys.version.split()[0]} ({sys.implementation.name}), GIL {'enabled' if gil_enabled() else 'disabled'}, "
+          f"{os.cpu_count()} CPUs")
+
+    if "match" in kinds:
+        products = json.loads((base_dir / args.product_data).read_text(encoding="utf-8"))
+        started = time.perf_counter()
+        match, size = matcher(args, base_dir)
+        print(f"Indexed {size} listings in {time.perf_counter() - started:.2f}s")
+        bench("match", match, products, thread_counts, args.repeat)
+
+    if "normalize" in kinds:
+        # atb.py needs its scraping dependencies (bs4, cloudscraper) to import.
+        import atb
+
+        titles = [p["originalTitle"] for p in json.loads((base_dir / args.atb).read_text(encoding="utf-8")).get("products") or []]
+        titles += [p["title"] for p in json.loads((base_dir / args.metro).read_text(encoding="utf-8")) if isinstance(p.get("title"), str)]
+        bench("normalize", atb.normalize_product_name, titles, thread_counts, args.repeat)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""Evaluate a grid of update_prices.py thresholds in one pass.
+
+Every setting of ``--min-score``, ``--min-token-overlap`` and
+``--min-score-gap`` would otherwise cost a full update_prices.py run. The
+thresholds only decide which ranked candidates are scored and whether the
+winner is accepted, so this tool:
+
+1. normalizes, tokenizes and retrieves candidates once per product and source;
+2. scores the ranked candidates once for each distinct overlap cut-off the
+   grid produces (usually one or two per product), caching the best and
+   runner-up with their scores, unit compatibility and the single-token check;
+3. applies every (min score, min overlap, min gap) setting to the cache in
+   memory, with the same ATB-then-Metro fallback as update_prices.py.
+
+With ``--labels`` it also reports precision and recall. A labels file is a
+JSON list of ``{"title": ..., "source": "ATB"|"METRO", "match": <listing
+title or null>}``; ``--write-labels`` dumps the matches at the default
+thresholds in that format, ready for hand correction.
+
+    python threshold_sweep.py
+    python threshold_sweep.py --min-score 0.55,0.6,0.65,0.7 --min-score-gap 0,0.03,0.06 --labels labels.json
+"""
+import argparse
+import json
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import update_prices as up
+from candidate_store import CandidateStore
+from fast_score import FastScorer
+
+DEFAULTS = (0.62, 1, 0.06)
+
+
+@dataclass(frozen=True)
+class Top:
+    """Best and runner-up for one product, source and overlap cut-off."""
+
+    best_id: Optional[int]
+    best: float
+    second: float
+    # Threshold-independent parts of _accept_best.
+    single_token: bool
+    token_ok: bool
+    unit_ok: bool
+
+    def accepted(self, min_score: float, min_score_gap: float) -> bool:
+        if self.best_id is None or not self.token_ok or not self.unit_ok:
+            return False
+        if self.single_token and self.best < max(min_score, 0.88):
+            return False
+        return self.best >= min_score and self.best - self.second >= min_score_gap
+
+
+@dataclass
+class _Query:
+    title: str
+    # source index -> min_token_overlap -> Top
+    tops: List[Dict[int, Top]]
+
+
+@dataclass
+class _Source:
+    name: str
+    store: CandidateStore
+    inv: Any
+    scorer: Optional[FastScorer]
+    fuzzy: Optional[up.FuzzyVocabulary]
+
+
+def _floats(s: str) -> List[float]:
+    return [float(x) for x in s.split(",") if x.strip()]
+
+
+def _ints(s: str) -> List[int]:
+    return [int(x) for x in s.split(",") if x.strip()]
+
+
+def build_cache(
+    products: Sequence[Dict[str, Any]], sources: Sequence[_Source], overlaps: Sequence[int], partitioned: bool
+) -> Tuple[List[Optional[_Query]], int]:
+    """Per product (None for empty titles): cached Top per source and overlap setting."""
+    queries: List[Optional[_Query]] = []
+    scored = 0
+    for p in products:
+        title = p.get("title")
+        if not isinstance(title, str) or not title.strip():
+            queries.append(None)
+            continue
+        unit = p.get("unit") if isinstance(p.get("unit"), str) else ""
+        tops: List[Dict[int, Top]] = []
+        for src in sources:
+            q_norm, q_toks = up._query_tokens(title, src.fuzzy)
+            per_overlap: Dict[int, Top] = {}
+            if q_toks:
+                inv = src.inv.for_unit(unit) if partitioned else src.inv
+                ranked = up._rank_by_overlap(q_toks, inv)
+                by_cut: Dict[int, Top] = {}
+                for overlap in overlaps:
+                    eff = up._effective_min_overlap(q_toks, overlap)
+                    # Candidates with overlap >= eff are a prefix of ``ranked``.
+                    cut = min(sum(1 for _i, ov in ranked if ov >= eff), up.MAX_RANKED)
+                    if cut not in by_cut:
+                        by_cut[cut] = _top(q_norm, q_toks, [i for i, _ov in ranked[:cut]], unit, src)
+                        scored += 1
+                    per_overlap[overlap] = by_cut[cut]
+            tops.append(per_overlap)
+        queries.append(_Query(title, tops))
+    return queries, scored
+
+
+def _top(q_norm: str, q_toks: Set[str], ids: List[int], unit: str, src: _Source) -> Top:
+    best_id, best, second = up._top_two(q_norm, ids, src.store, src.scorer)
+    single = len(q_toks) == 1
+    if best_id is None:
+        return Top(None, best, second, single, False, False)
+    cand = src.store[best_id]
+    token_ok = not single or next(iter(q_toks)) in set(up._tokenize(cand.norm_title))
+    return Top(best_id, best, second, single, token_ok, up._is_unit_compatible(unit, cand))
+
+
+def evaluate(
+    queries: Sequence[Optional[_Query]], min_score: float, min_overlap: int, min_gap: float
+) -> List[Optional[Tuple[int, int]]]:
+    """(source index, candidate id) per product, or None when skipped."""
+    out: List[Optional[Tuple[int, int]]] = []
+    for q in queries:
+        hit: Optional[Tuple[int, int]] = None
+        if q is not None:
+            for s, per_overlap in enumerate(q.tops):
+                top = per_overlap.get(min_overlap)
+                if top is not None and top.accepted(min_score, min_gap):
+                    hit = (s, top.best_id)  # type: ignore[assignment]
+                    break
+        out.append(hit)
+    return out
+
+
+def _load_labels(path: Path) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+    raw = json.loads(path.read_text(encoding="utf-8"))
+    labels: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+    for row in raw:
+        if isinstance(row, dict) and isinstance(row.get("title"), str):
+            labels[row["title"]] = (row.get("source"), row.get("match"))
+    return labels
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Sweep update_prices.py thresholds over cached candidate scores.")
+    parser.add_argument("--product-data", default="product_data.json")
+    parser.add_argument("--atb", default="atb_products.json")
+    parser.add_argument("--metro", default="metro_full_catalog_all_pages.json")
+    parser.add_argument("--min-score", default="0.55,0.6,0.62,0.65,0.7,0.75", help="Comma-separated values.")
+    parser.add_argument("--min-token-overlap", default="1,2,3", help="Comma-separated values.")
+    parser.add_argument("--min-score-gap", default="0,0.03,0.06,0.1", help="Comma-separated values.")
+    parser.add_argument("--fuzzy-tokens", action="store_true")
+    parser.add_argument("--fuzzy-distance", type=int, default=1)
+    parser.add_argument("--no-unit-partitions", action="store_true")
+    parser.add_argument("--labels", default=None, help="JSON list of {title, source, match} with the correct matches.")
+    parser.add_argument("--write-labels", default=None, help="Write the matches at the default thresholds as a labels file.")
+    args = parser.parse_args()
+
+    min_scores = _floats(args.min_score)
+    overlaps = _ints(args.min_token_overlap)
+    gaps = _floats(args.min_score_gap)
+    if not (min_scores and overlaps and gaps):
+        parser.error("every threshold list needs at least one value")
+
+    base_dir = Path(__file__).resolve().parent
+    products: List[Dict[str, Any]] = json.loads((base_dir / args.product_data).read_text(encoding="utf-8"))
+    atb_root: Dict[str, Any] = json.loads((base_dir / args.atb).read_text(encoding="utf-8"))
+    metro_items: List[Dict[str, Any]] = json.loads((base_dir / args.metro).read_text(encoding="utf-8"))
+
+    started = time.perf_counter()
+    sources: List[_Source] = []
+    for name, store in (
+        ("ATB", up._build_candidate_store(atb_root.get("products") or [], ["name", "originalTitle"], "price", "baseUnit")),
+        ("METRO", up._build_candidate_store(metro_items, ["title"], "price")),
+    ):
+        fuzzy = up._build_fuzzy_vocabulary(store, max_distance=args.fuzzy_distance) if args.fuzzy_tokens else None
+        inv = store.index if args.no_unit_partitions else up._build_unit_partitions(store)
+        sources.append(_Source(name, store, inv, FastScorer(store, up._tokenize), fuzzy))
+    indexed = time.perf_counter()
+
+    queries, scored = build_cache(products, sources, overlaps, partitioned=not args.no_unit_partitions)
+    cached = time.perf_counter()
+
+    labels = _load_labels(base_dir / args.labels) if args.labels else None
+
+    def describe(hit: Optional[Tuple[int, int]]) -> Tuple[Optional[str], Optional[str]]:
+        if hit is None:
+            return None, None
+        src = sources[hit[0]]
+        return src.name, src.store[hit[1]].raw_title
+
+    rows: List[Dict[str, Any]] = []
+    for ms in min_scores:
+        for ov in overlaps:
+            for gap in gaps:
+                hits = evaluate(queries, ms, ov, gap)
+                row: Dict[str, Any] = {"setting": (ms, ov, gap), "skipped": sum(1 for h in hits if h is None)}
+                for s, src in enumerate(sources):
+                    row[src.name] = sum(1 for h in hits if h is not None and h[0] == s)
+                if labels is not None:
+                    predicted = correct = expected = 0
+                    for p, hit in zip(products, hits):
+                        label = labels.get(p.get("title"))  # type: ignore[arg-type]
+                        if label is None:
+                            continue
+                        got = describe(hit)
+                        expected += label[1] is not None
+                        predicted += got[1] is not None
+                        if got[1] is not None and got[1] == label[1] and (label[0] is None or label[0] == got[0]):
+                            correct += 1
+                    row["precision"] = correct / predicted if predicted else float("nan")
+                    row["recall"] = correct / expected if expected else float("nan")
+                rows.append(row)
+    evaluated = time.perf_counter()
+
+    if labels is not None:
+        # Best F1 first; NaN (nothing predicted) sorts last.
+        def f1(r: Dict[str, Any]) -> float:
+            p, rc = r["precision"], r["recall"]
+            return 2 * p * rc / (p + rc) if p == p and rc == rc and p + rc else -1.0
+
+        rows.sort(key=lambda r: -f1(r))
+
+    names = [src.name for src in sources]
+    header = f"  {'min_score':>9} {'overlap':>7} {'gap':>5} " + " ".join(f"{n:>6}" for n in names) + f" {'skipped':>7}"
+    if labels is not None:
+        header += f" {'prec':>6} {'recall':>6}"
+    print(header)
+    for r in rows:
+        ms, ov, gap = r["setting"]
+        mark = "*" if (ms, ov, gap) == DEFAULTS else " "
+        line = f"{mark} {ms:>9g} {ov:>7d} {gap:>5g} " + " ".join(f"{r[n]:>6d}" for n in names) + f" {r['skipped']:>7d}"
+        if labels is not None:
+            line += f" {r['precision']:>6.3f} {r['recall']:>6.3f}"
+        print(line)
+
+    print(f"\nProducts: {len(products)}, settings: {len(rows)} (* = update_prices.py defaults)")
+    if labels is not None:
+        print(f"Labelled products: {sum(1 for p in products if p.get('title') in labels)}")
+    print(
+        f"Index {indexed - started:.2f}s, retrieval + scoring {cached - indexed:.2f}s "
+        f"({scored} ranked lists scored), sweep {evaluated - cached:.2f}s"
+    )
+
+    if args.write_labels:
+        ms, ov, gap = DEFAULTS
+        if ov not in overlaps:
+            queries, _ = build_cache(products, sources, [ov], partitioned=not args.no_unit_partitions)
+        out = []
+        for p, hit in zip(products, evaluate(queries, ms, ov, gap)):
+            if isinstance(p.get("title"), str) and p["title"].strip():
+                source, match = describe(hit)
+                out.append({"title": p["title"], "source": source, "match": match})
+        path = base_dir / args.write_labels
+        path.write_text(json.dumps(out, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"Wrote {len(out)} labels at the default thresholds: {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
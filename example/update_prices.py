@@ -1,11 +1,22 @@
 #!/usr/bin/env python3
 import argparse
 import json
+import os
 import re
+import stat
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from difflib import SequenceMatcher
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from candidate_store import CandidateStore, PostingIndex
+from fast_score import FastScorer
+from fuzzy_tokens import SymSpellIndex
+from price_checks import PriceCheckConfig, validate_prices
+from quantities import has_quantity, quantity_totals
 
 
 _STOPWORDS = {
@@ -66,6 +77,15 @@ def _stem_uk_token(t: str) -> str:
     return t
 
 
+# Compiled once: matching threads share only immutable pattern objects,
+# not the re module's internal cache.
+_QTY_RE = re.compile(r"\b\d+(?:[\.,]\d+)?\s*(?:кг|г|гр|л|мл|шт|pcs)\b", re.IGNORECASE)
+_PERCENT_RE = re.compile(r"\b\d+(?:[\.,]\d+)?\s*%\b")
+_NUMBER_RE = re.compile(r"\b\d+(?:[\.,]\d+)?\b")
+_NON_LETTER_RE = re.compile(r"[^a-zа-яіїєґ'\s]", re.IGNORECASE)
+_SPACES_RE = re.compile(r"\s+")
+
+
 def _normalize_title(s: str) -> str:
     s = s.lower().strip()
 
@@ -73,17 +93,17 @@ def _normalize_title(s: str) -> str:
     s = s.replace("`", "'").replace("’", "'").replace("ʼ", "'")
 
     # remove common weight/volume patterns and percentages
-    s = re.sub(r"\b\d+(?:[\.,]\d+)?\s*(?:кг|г|гр|л|мл|шт|pcs)\b", " ", s, flags=re.IGNORECASE)
-    s = re.sub(r"\b\d+(?:[\.,]\d+)?\s*%\b", " ", s)
+    s = _QTY_RE.sub(" ", s)
+    s = _PERCENT_RE.sub(" ", s)
 
     # remove standalone numbers (often part of packaging)
-    s = re.sub(r"\b\d+(?:[\.,]\d+)?\b", " ", s)
+    s = _NUMBER_RE.sub(" ", s)
 
     # keep letters (latin/cyrillic) and spaces
-    s = re.sub(r"[^a-zа-яіїєґ'\s]", " ", s, flags=re.IGNORECASE)
+    s = _NON_LETTER_RE.sub(" ", s)
 
     # collapse spaces
-    s = re.sub(r"\s+", " ", s).strip()
+    s = _SPACES_RE.sub(" ", s).strip()
     return s
 
 
@@ -108,14 +128,8 @@ class PriceCandidate:
 
 def _has_explicit_quantity_in_title(title: str) -> bool:
     # If a listing contains explicit weight/volume/count, it's likely a pack price.
-    # Example: "950г", "1л", "320г", "8шт".
-    return bool(
-        re.search(
-            r"\b\d+(?:[\.,]\d+)?\s*(?:кг|г|гр|л|мл|шт|pcs)\b",
-            title.lower(),
-            flags=re.IGNORECASE,
-        )
-    )
+    # Example: "950г", "1л", "320г", "8шт", "2x500г".
+    return has_quantity(title)
 
 
 def _extract_quantities(title: str) -> Dict[str, float]:
@@ -125,33 +139,10 @@ def _extract_quantities(title: str) -> Dict[str, float]:
     - "kg": quantity in kilograms
     - "l": quantity in liters
     - "pcs": count of pieces
-    If multiple occur, sums them (rare but possible).
+    Multipacks ("2x500г") are multiplied out and ranges ("300/500 г") use the
+    midpoint; see quantities.parse_quantities. The result is memoized per title.
     """
-    t = title.lower()
-    out: Dict[str, float] = {"kg": 0.0, "l": 0.0, "pcs": 0.0}
-
-    for m in re.finditer(r"\b(\d+(?:[\.,]\d+)?)\s*(кг|г|гр)\b", t, flags=re.IGNORECASE):
-        num = float(m.group(1).replace(",", "."))
-        unit = m.group(2).lower()
-        if unit == "кг":
-            out["kg"] += num
-        else:
-            out["kg"] += num / 1000.0
-
-    for m in re.finditer(r"\b(\d+(?:[\.,]\d+)?)\s*(л|мл)\b", t, flags=re.IGNORECASE):
-        num = float(m.group(1).replace(",", "."))
-        unit = m.group(2).lower()
-        if unit == "л":
-            out["l"] += num
-        else:
-            out["l"] += num / 1000.0
-
-    for m in re.finditer(r"\b(\d+(?:[\.,]\d+)?)\s*(шт|pcs)\b", t, flags=re.IGNORECASE):
-        num = float(m.group(1).replace(",", "."))
-        out["pcs"] += num
-
-    # Clean zeros
-    return {k: v for k, v in out.items() if v > 0}
+    return quantity_totals(title)
 
 
 def _convert_price_to_unit(target_unit: str, cand: PriceCandidate) -> Optional[float]:
@@ -189,6 +180,14 @@ def _convert_price_to_unit(target_unit: str, cand: PriceCandidate) -> Optional[f
     return cand.price
 
 
+def _target_price(cand: PriceCandidate, target_unit: str, convert_packs: bool) -> float:
+    if convert_packs and cand.has_explicit_qty:
+        converted = _convert_price_to_unit(target_unit, cand)
+        if converted is not None:
+            return converted
+    return cand.price
+
+
 def _is_unit_compatible(target_unit: str, cand: PriceCandidate) -> bool:
     tu = (target_unit or "").upper()
     bu = (cand.base_unit or "").upper()
@@ -225,13 +224,48 @@ def _is_unit_compatible(target_unit: str, cand: PriceCandidate) -> bool:
     return True
 
 
-def _build_candidates(
+# Target units that restrict which listings can match, grouped into families
+# with identical _is_unit_compatible rules. "G" and unknown units accept every
+# listing and use the full index.
+UNIT_FAMILIES: Dict[str, str] = {"KG": "KG", "L": "LIQUID", "ML": "LIQUID", "PCS": "PCS"}
+_FAMILY_PROBE_UNIT: Dict[str, str] = {"KG": "KG", "LIQUID": "L", "PCS": "PCS"}
+
+
+def _compatible_families(cand: PriceCandidate) -> List[str]:
+    return [fam for fam, unit in _FAMILY_PROBE_UNIT.items() if _is_unit_compatible(unit, cand)]
+
+
+@dataclass(frozen=True)
+class UnitPartitions:
+    """Posting indexes restricted to the listings compatible with each unit family.
+
+    Querying the partition of the product's unit means incompatible listings
+    (e.g. a "0,5л" bottle for a KG product) are never ranked or scored, and
+    the best *compatible* listing wins instead of the product being skipped.
+    """
+
+    full: PostingIndex
+    by_family: Dict[str, PostingIndex]
+
+    def for_unit(self, target_unit: str) -> PostingIndex:
+        fam = UNIT_FAMILIES.get((target_unit or "").upper())
+        return self.by_family[fam] if fam else self.full
+
+
+def _build_unit_partitions(store: CandidateStore) -> UnitPartitions:
+    keep = {fam: bytearray(len(store)) for fam in _FAMILY_PROBE_UNIT}
+    for i, cand in enumerate(store):
+        for fam in _compatible_families(cand):
+            keep[fam][i] = 1
+    return UnitPartitions(full=store.index, by_family={fam: store.index.subset(mask) for fam, mask in keep.items()})
+
+
+def _iter_candidate_rows(
     items: Iterable[Dict[str, Any]],
     title_keys: List[str],
     price_key: str,
     base_unit_key: Optional[str] = None,
-) -> List[PriceCandidate]:
-    out: List[PriceCandidate] = []
+) -> Iterator[Tuple[str, float, Optional[str]]]:
     for it in items:
         title_val: Optional[str] = None
         for k in title_keys:
@@ -252,11 +286,22 @@ def _build_candidates(
             if isinstance(bu, str) and bu.strip():
                 base_unit = bu.strip()
 
+        yield title_val, float(p), base_unit
+
+
+def _build_candidates(
+    items: Iterable[Dict[str, Any]],
+    title_keys: List[str],
+    price_key: str,
+    base_unit_key: Optional[str] = None,
+) -> List[PriceCandidate]:
+    out: List[PriceCandidate] = []
+    for title_val, price, base_unit in _iter_candidate_rows(items, title_keys, price_key, base_unit_key):
         out.append(
             PriceCandidate(
                 raw_title=title_val,
                 norm_title=_normalize_title(title_val),
-                price=float(p),
+                price=price,
                 base_unit=base_unit,
                 has_explicit_qty=_has_explicit_quantity_in_title(title_val),
             )
@@ -264,6 +309,31 @@ def _build_candidates(
     return out
 
 
+def _build_candidate_store(
+    items: Iterable[Dict[str, Any]],
+    title_keys: List[str],
+    price_key: str,
+    base_unit_key: Optional[str] = None,
+) -> CandidateStore:
+    """Columnar equivalent of _build_candidates + _build_inverted_index.
+
+    Use ``store`` in place of the candidate list and ``store.index`` in place
+    of the inverted index.
+    """
+    store = CandidateStore(PriceCandidate)
+    for title_val, price, base_unit in _iter_candidate_rows(items, title_keys, price_key, base_unit_key):
+        norm = _normalize_title(title_val)
+        store.append(
+            raw_title=title_val,
+            norm_title=norm,
+            price=price,
+            base_unit=base_unit,
+            has_explicit_qty=_has_explicit_quantity_in_title(title_val),
+            tokens=_tokenize(norm),
+        )
+    return store.freeze()
+
+
 def _build_inverted_index(candidates: List[PriceCandidate]) -> Dict[str, List[int]]:
     idx: Dict[str, List[int]] = {}
     for i, c in enumerate(candidates):
@@ -272,6 +342,54 @@ def _build_inverted_index(candidates: List[PriceCandidate]) -> Dict[str, List[in
     return idx
 
 
+@dataclass(frozen=True)
+class FuzzyVocabulary:
+    index: SymSpellIndex
+    # stem -> a catalog word with that stem, so corrected queries still read
+    # like titles for SequenceMatcher and re-tokenize to the same stem
+    surface: Dict[str, str]
+
+
+def _build_fuzzy_vocabulary(candidates: Iterable[PriceCandidate], max_distance: int = 1) -> FuzzyVocabulary:
+    freq: Dict[str, int] = {}
+    surface: Dict[str, str] = {}
+    for c in candidates:
+        for w in c.norm_title.split(" "):
+            if not w or w in _STOPWORDS:
+                continue
+            stem = _stem_uk_token(w)
+            if not stem or stem in _STOPWORDS:
+                continue
+            freq[stem] = freq.get(stem, 0) + 1
+            surface.setdefault(stem, w)
+    return FuzzyVocabulary(index=SymSpellIndex(freq, max_distance=max_distance), surface=surface)
+
+
+def _correct_query(q_norm: str, fuzzy: FuzzyVocabulary) -> str:
+    """Replace words whose stem is not in the vocabulary by the closest catalog word."""
+    out: List[str] = []
+    for w in q_norm.split(" "):
+        if w and w not in _STOPWORDS:
+            stem = _stem_uk_token(w)
+            if stem not in fuzzy.index:
+                fix = fuzzy.index.lookup(stem)
+                if fix is not None:
+                    w = fuzzy.surface[fix]
+        out.append(w)
+    return " ".join(out)
+
+
+def _has_candidates(query_title: str, inv: "Dict[str, List[int]] | PostingIndex", fuzzy: Optional[FuzzyVocabulary] = None) -> bool:
+    q_norm = _normalize_title(query_title)
+    if fuzzy is not None:
+        q_norm = _correct_query(q_norm, fuzzy)
+    return any(t in inv for t in _tokenize(q_norm))
+
+
+# Only this many candidates (by token overlap) are scored per query.
+MAX_RANKED = 200
+
+
 def _score(a_norm: str, b_norm: str) -> float:
     if not a_norm or not b_norm:
         return 0.0
@@ -291,74 +409,255 @@ def _score(a_norm: str, b_norm: str) -> float:
 def _find_best_price(
     query_title: str,
     query_unit: str,
-    candidates: List[PriceCandidate],
-    inv: Dict[str, List[int]],
+    candidates: Sequence[PriceCandidate],
+    inv: "Dict[str, List[int]] | PostingIndex",
     min_score: float,
     min_token_overlap: int,
     min_score_gap: float,
+    fuzzy: Optional[FuzzyVocabulary] = None,
+    scorer: Optional[FastScorer] = None,
 ) -> Tuple[Optional[PriceCandidate], float]:
+    best_id, best_score = _find_best_id(
+        query_title, query_unit, candidates, inv, min_score, min_token_overlap, min_score_gap, fuzzy, scorer=scorer
+    )
+    if best_id is None:
+        return None, best_score
+    return candidates[best_id], best_score
+
+
+def _query_tokens(query_title: str, fuzzy: Optional[FuzzyVocabulary] = None) -> Tuple[str, Set[str]]:
     q_norm = _normalize_title(query_title)
-    q_toks = set(_tokenize(q_norm))
-    if not q_toks:
-        return None, 0.0
+    if fuzzy is not None:
+        q_norm = _correct_query(q_norm, fuzzy)
+    return q_norm, set(_tokenize(q_norm))
 
+
+def _effective_min_overlap(q_toks: Set[str], min_token_overlap: int) -> int:
     # Dynamic overlap: single-token queries are ambiguous, require tighter match.
     effective_min_overlap = min_token_overlap
     if len(q_toks) >= 3:
         effective_min_overlap = max(effective_min_overlap, 2)
     if len(q_toks) == 1:
         effective_min_overlap = max(effective_min_overlap, 1)
+    return effective_min_overlap
+
 
+def _rank_by_overlap(q_toks: Set[str], inv: "Dict[str, List[int]] | PostingIndex") -> List[Tuple[int, int]]:
+    """(id, shared token count) for every candidate sharing a token, most overlap first.
+
+    The sort is stable, so the candidates with overlap >= k are always a prefix.
+    """
     # collect candidate ids by shared tokens
     ids: List[int] = []
     for t in q_toks:
         ids.extend(inv.get(t, []))
 
-    if not ids:
-        return None, 0.0
-
     # count overlaps to prune aggressively
     overlap_count: Dict[int, int] = {}
     for i in ids:
         overlap_count[i] = overlap_count.get(i, 0) + 1
 
-    # take top by overlap (speed)
-    ranked = sorted(overlap_count.items(), key=lambda x: x[1], reverse=True)
-    ranked = [pair for pair in ranked if pair[1] >= effective_min_overlap][:200]
+    return sorted(overlap_count.items(), key=lambda x: x[1], reverse=True)
+
 
-    best: Optional[PriceCandidate] = None
+def _top_two(
+    q_norm: str, ids: Sequence[int], candidates: Sequence[PriceCandidate], scorer: Optional[FastScorer] = None
+) -> Tuple[Optional[int], float, float]:
+    """(best id, best score, runner-up score) over ``ids`` in rank order."""
+    if scorer is not None:
+        return scorer.best_of(q_norm, ids)
+    best_id: Optional[int] = None
     best_score = 0.0
     second_best = 0.0
-    for i, _ov in ranked:
-        c = candidates[i]
-        sc = _score(q_norm, c.norm_title)
+    for i in ids:
+        sc = _score(q_norm, candidates[i].norm_title)
         if sc > best_score:
             second_best = best_score
             best_score = sc
-            best = c
+            best_id = i
         elif sc > second_best:
             second_best = sc
+    return best_id, best_score, second_best
+
 
+def _accept_best(
+    q_toks: Set[str],
+    best: Optional[PriceCandidate],
+    best_score: float,
+    second_best: float,
+    query_unit: str,
+    min_score: float,
+    min_score_gap: float,
+) -> bool:
     # Extra safety for short/generic names: require near-exact match.
     if len(q_toks) == 1 and best is not None:
         # The best candidate must contain the same single token.
         if next(iter(q_toks)) not in set(_tokenize(best.norm_title)):
-            return None, best_score
+            return False
         # Also require a higher score threshold for single-token queries.
         if best_score < max(min_score, 0.88):
-            return None, best_score
+            return False
 
     if best is None or best_score < min_score:
-        return None, best_score
+        return False
 
     if not _is_unit_compatible(query_unit, best):
-        return None, best_score
+        return False
 
     # Ambiguity guard: if runner-up is too close, skip.
-    if best_score - second_best < min_score_gap:
+    return best_score - second_best >= min_score_gap
+
+
+def _find_best_id(
+    query_title: str,
+    query_unit: str,
+    candidates: Sequence[PriceCandidate],
+    inv: "Dict[str, List[int]] | PostingIndex",
+    min_score: float,
+    min_token_overlap: int,
+    min_score_gap: float,
+    fuzzy: Optional[FuzzyVocabulary] = None,
+    considered: Optional[List[int]] = None,
+    scorer: Optional[FastScorer] = None,
+) -> Tuple[Optional[int], float]:
+    """Like _find_best_price, but returns the candidate id.
+
+    If ``considered`` is given, ids of all scored candidates are appended to it
+    (watch mode uses them to know which products a candidate can affect).
+    ``scorer`` (built over the same candidates) gives the same result as the
+    _score loop, faster.
+    """
+    q_norm, q_toks = _query_tokens(query_title, fuzzy)
+    if not q_toks:
+        return None, 0.0
+
+    effective_min_overlap = _effective_min_overlap(q_toks, min_token_overlap)
+
+    # take top by overlap (speed)
+    ranked = [pair for pair in _rank_by_overlap(q_toks, inv) if pair[1] >= effective_min_overlap][:MAX_RANKED]
+
+    if considered is not None:
+        considered.extend(i for i, _ov in ranked)
+
+    best_id, best_score, second_best = _top_two(q_norm, [i for i, _ov in ranked], candidates, scorer)
+    best = candidates[best_id] if best_id is not None else None
+    if not _accept_best(q_toks, best, best_score, second_best, query_unit, min_score, min_score_gap):
         return None, best_score
+    return best_id, best_score
 
-    return best, best_score
+
+@dataclass(frozen=True)
+class PriceChange:
+    index: int  # position in product_data
+    title: str
+    old_price: Any  # as stored in product_data (may be missing or non-numeric)
+    had_price: bool
+    new_price: float
+    source: str
+    score: float
+    listing: str
+
+    @property
+    def old_price_num(self) -> Optional[float]:
+        return float(self.old_price) if isinstance(self.old_price, (int, float)) else None
+
+
+def _change_set(changes: Sequence[PriceChange], fmt: str) -> str:
+    """Applied changes as NDJSON records or an RFC 6902 JSON Patch against product_data.json."""
+    if fmt == "json-patch":
+        ops: List[Dict[str, Any]] = []
+        for c in changes:
+            path = f"/{c.index}/price"
+            if c.had_price:
+                # "test" makes the patch fail instead of overwriting a price someone else changed.
+                ops.append({"op": "test", "path": path, "value": c.old_price})
+                ops.append({"op": "replace", "path": path, "value": c.new_price})
+            else:
+                ops.append({"op": "add", "path": path, "value": c.new_price})
+        return json.dumps(ops, ensure_ascii=False) + "\n"
+    return "".join(
+        json.dumps(
+            {
+                "index": c.index,
+                "title": c.title,
+                "oldPrice": c.old_price_num,
+                "newPrice": c.new_price,
+                "source": c.source,
+                "score": round(c.score, 4),
+                "listing": c.listing,
+            },
+            ensure_ascii=False,
+        )
+        + "\n"
+        for c in changes
+    )
+
+
+def _atomic_write_text(path: Path, text: str) -> None:
+    # Readers see either the old file or the new one, never a partial write.
+    # The temp file name is unique, so concurrent runs cannot clobber each
+    # other's half-written output; the last os.replace wins.
+    try:
+        mode = stat.S_IMODE(path.stat().st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+    with tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", dir=path.parent, prefix=path.name + ".", suffix=".tmp", delete=False
+    ) as fh:
+        tmp_path = Path(fh.name)
+        try:
+            fh.write(text)
+            fh.flush()
+            os.fsync(fh.fileno())
+            # NamedTemporaryFile is created 0600; keep the target's permissions.
+            os.chmod(tmp_path, mode)
+        except BaseException:
+            fh.close()
+            tmp_path.unlink(missing_ok=True)
+            raise
+    os.replace(tmp_path, path)
+
+
+def _print_unit_filter_report(
+    product_data: List[Dict[str, Any]],
+    match: Callable[[str, str, bool], Tuple[Optional[PriceCandidate], float, str]],
+) -> None:
+    queries = [
+        (p["title"], p["unit"] if isinstance(p.get("unit"), str) else "")
+        for p in product_data
+        if isinstance(p.get("title"), str) and p["title"].strip()
+    ]
+    results: Dict[bool, List[Tuple[Optional[PriceCandidate], float, str]]] = {}
+    for partitioned in (False, True):
+        # Warm-up pass so caches (quantities, scorer bitsets) are not billed to one mode.
+        for title, unit in queries:
+            match(title, unit, partitioned)
+        started = time.perf_counter()
+        results[partitioned] = [match(title, unit, partitioned) for title, unit in queries]
+        elapsed = time.perf_counter() - started
+        matched = sum(1 for cand, _sc, _src in results[partitioned] if cand is not None)
+        label = "partitioned by unit family" if partitioned else "unit check on winner only"
+        print(f"{label:>28}: matched {matched}/{len(queries)}, {elapsed / len(queries) * 1000:.3f} ms/query")
+
+    print("Products whose match differs:")
+    for (title, unit), old, new in zip(queries, results[False], results[True]):
+        if old[0] is new[0] or (old[0] is not None and new[0] is not None and old[0].raw_title == new[0].raw_title):
+            continue
+        before = f"[{old[2]}] {old[0].raw_title}" if old[0] is not None else "-"
+        after = f"[{new[2]} score={new[1]:.3f}] {new[0].raw_title}" if new[0] is not None else "-"
+        print(f"- {title} ({unit or '?'}): {before} -> {after}")
+    print()
+
+
+def _map_threads(fn: Callable[[Any], Any], items: Sequence[Any], threads: int, chunk: int = 64) -> List[Any]:
+    """``[fn(x) for x in items]``, run in chunks on ``threads`` threads; order is kept."""
+    if threads <= 1 or len(items) <= chunk:
+        return [fn(x) for x in items]
+    parts = [items[k : k + chunk] for k in range(0, len(items), chunk)]
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return [r for part in pool.map(lambda xs: [fn(x) for x in xs], parts) for r in part]
 
 
 def main() -> int:
@@ -366,12 +665,48 @@ def main() -> int:
     parser.add_argument("--product-data", default="product_data.json")
     parser.add_argument("--atb", default="atb_products.json")
     parser.add_argument("--metro", default="metro_full_catalog_all_pages.json")
-    parser.add_argument("--write", action="store_true", help="Actually overwrite product_data.json. Without this flag, only prints a report.")
+    parser.add_argument(
+        "--write",
+        action="store_true",
+        help="Rewrite product_data.json (atomically) with the new prices. Without this flag, only prints a report.",
+    )
+    parser.add_argument("--changes", default=None, help="Write the applied price changes to this file (works without --write).")
+    parser.add_argument(
+        "--changes-format",
+        choices=["ndjson", "json-patch"],
+        default="ndjson",
+        help="ndjson: one {index, title, oldPrice, newPrice, source, score, listing} per line; json-patch: RFC 6902 ops.",
+    )
     parser.add_argument("--min-score", type=float, default=0.62)
     parser.add_argument("--min-token-overlap", type=int, default=1)
     parser.add_argument("--min-score-gap", type=float, default=0.06)
     parser.add_argument("--convert-packs", action="store_true", help="Convert pack prices (e.g. 950г/1л/8шт) into target unit price.")
-    parser.add_argument("--report", choices=["changed", "skipped", "none"], default="changed")
+    parser.add_argument("--fuzzy-tokens", action="store_true", help="Map unknown query tokens to catalog tokens within a small edit distance.")
+    parser.add_argument("--fuzzy-distance", type=int, default=1)
+    parser.add_argument("--reference-scorer", action="store_true", help="Score with plain _score instead of FastScorer (same results, slower).")
+    parser.add_argument(
+        "--no-unit-partitions",
+        action="store_true",
+        help="Rank all listings and check unit compatibility only on the winner (old behaviour).",
+    )
+    parser.add_argument(
+        "--report",
+        choices=["changed", "skipped", "units", "none"],
+        default="changed",
+        help="'units' compares partitioned vs post-hoc unit filtering (matched count, time per query).",
+    )
+    parser.add_argument("--no-price-checks", action="store_true", help="Write matched prices without the sanity checks.")
+    parser.add_argument("--max-price-ratio", type=float, default=3.0, help="Hold back prices that change by more than this factor.")
+    parser.add_argument(
+        "--max-price-z", type=float, default=3.5, help="Hold back prices this many robust z-scores from their category/unit median."
+    )
+    parser.add_argument("--review-file", default="price_review.json", help="Held-back prices are written here with --write.")
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=1,
+        help="Match products in this many threads (scales on free-threaded Python; results are identical).",
+    )
     args = parser.parse_args()
 
     base_dir = Path(__file__).resolve().parent
@@ -386,27 +721,92 @@ def main() -> int:
 
     metro_items: List[Dict[str, Any]] = json.loads(metro_path.read_text(encoding="utf-8"))
 
-    atb_candidates = _build_candidates(
+    atb_candidates = _build_candidate_store(
         atb_products,
         title_keys=["name", "originalTitle"],
         price_key="price",
         base_unit_key="baseUnit",
     )
-    metro_candidates = _build_candidates(metro_items, title_keys=["title"], price_key="price")
+    metro_candidates = _build_candidate_store(metro_items, title_keys=["title"], price_key="price")
+
+    atb_inv = atb_candidates.index
+    metro_inv = metro_candidates.index
+    atb_parts = _build_unit_partitions(atb_candidates)
+    metro_parts = _build_unit_partitions(metro_candidates)
+
+    atb_fuzzy: Optional[FuzzyVocabulary] = None
+    metro_fuzzy: Optional[FuzzyVocabulary] = None
+    if args.fuzzy_tokens:
+        atb_fuzzy = _build_fuzzy_vocabulary(atb_candidates, max_distance=args.fuzzy_distance)
+        metro_fuzzy = _build_fuzzy_vocabulary(metro_candidates, max_distance=args.fuzzy_distance)
+    fuzzy_gained = 0
+
+    atb_scorer: Optional[FastScorer] = None
+    metro_scorer: Optional[FastScorer] = None
+    if not args.reference_scorer:
+        atb_scorer = FastScorer(atb_candidates, _tokenize)
+        metro_scorer = FastScorer(metro_candidates, _tokenize)
+
+    sources = [
+        ("ATB", atb_candidates, atb_parts, atb_fuzzy, atb_scorer),
+        ("METRO", metro_candidates, metro_parts, metro_fuzzy, metro_scorer),
+    ]
+    # Stores, partitions, fuzzy vocabularies and scorers are read-only once
+    # built, so worker threads share them.
+
+    def match(title: str, unit_str: str, partitioned: bool) -> Tuple[Optional[PriceCandidate], float, str]:
+        cand: Optional[PriceCandidate] = None
+        sc = 0.0
+        source = ""
+        for source, store, parts, fuzzy, scorer in sources:
+            inv = parts.for_unit(unit_str) if partitioned else store.index
+            cand, sc = _find_best_price(
+                title,
+                unit_str,
+                store,
+                inv,
+                args.min_score,
+                args.min_token_overlap,
+                args.min_score_gap,
+                fuzzy,
+                scorer,
+            )
+            if cand is not None:
+                break
+        return cand, sc, source
 
-    atb_inv = _build_inverted_index(atb_candidates)
-    metro_inv = _build_inverted_index(metro_candidates)
+    if args.report == "units":
+        _print_unit_filter_report(product_data, match)
 
     updated_from_atb = 0
     updated_from_metro = 0
     skipped = 0
 
-    changes: List[Tuple[str, float, float, str, float]] = []
+    changes: List[PriceChange] = []
     skipped_titles: List[str] = []
+    # Price changes before the price checks
+    proposed: List[PriceChange] = []
 
-    for p in product_data:
+    def match_product(p: Dict[str, Any]) -> Optional[Tuple[Optional[PriceCandidate], float, str, bool]]:
+        """(candidate, score, source, found only by fuzzy tokens); None for an empty title."""
         title = p.get("title")
         if not isinstance(title, str) or not title.strip():
+            return None
+        unit = p.get("unit")
+        unit_str = unit if isinstance(unit, str) else ""
+        cand, sc, source = match(title, unit_str, not args.no_unit_partitions)
+        gained = False
+        if args.fuzzy_tokens:
+            had = _has_candidates(title, atb_inv) or _has_candidates(title, metro_inv)
+            gained = not had and (_has_candidates(title, atb_inv, atb_fuzzy) or _has_candidates(title, metro_inv, metro_fuzzy))
+        return cand, sc, source, gained
+
+    # Matching only reads product_data; everything below runs in order.
+    matches = _map_threads(match_product, product_data, args.threads)
+
+    for index, (p, m) in enumerate(zip(product_data, matches)):
+        title = p.get("title")
+        if m is None:
             skipped += 1
             skipped_titles.append(str(title))
             continue
@@ -416,45 +816,50 @@ def main() -> int:
         unit = p.get("unit")
         unit_str = unit if isinstance(unit, str) else ""
 
-        cand, sc = _find_best_price(
-            title,
-            unit_str,
-            atb_candidates,
-            atb_inv,
-            args.min_score,
-            args.min_token_overlap,
-            args.min_score_gap,
-        )
-        source = "ATB"
-        if cand is None:
-            cand, sc = _find_best_price(
-                title,
-                unit_str,
-                metro_candidates,
-                metro_inv,
-                args.min_score,
-                args.min_token_overlap,
-                args.min_score_gap,
-            )
-            source = "METRO"
+        cand, sc, source, gained = m
+        fuzzy_gained += gained
 
         if cand is None:
             skipped += 1
             skipped_titles.append(title)
             continue
 
-        new_price = cand.price
-        if args.convert_packs and cand.has_explicit_qty:
-            converted = _convert_price_to_unit(unit_str, cand)
-            if converted is not None:
-                new_price = converted
+        new_price = _target_price(cand, unit_str, args.convert_packs)
         if old_price_num is None or abs(new_price - old_price_num) > 1e-9:
-            p["price"] = new_price
-            changes.append((title, old_price_num if old_price_num is not None else float("nan"), new_price, source, sc))
-            if source == "ATB":
-                updated_from_atb += 1
-            else:
-                updated_from_metro += 1
+            proposed.append(PriceChange(index, title, old_price, "price" in p, new_price, source, sc, cand.raw_title))
+
+    # Sanity-check all new prices in one batch before touching product_data.
+    held: List[Dict[str, Any]] = []
+    verdicts: List[List[str]] = [[] for _ in proposed]
+    if not args.no_price_checks:
+        config = PriceCheckConfig(max_ratio=args.max_price_ratio, max_z=args.max_price_z)
+        verdicts = validate_prices(
+            [(product_data[c.index], c.old_price_num, c.new_price) for c in proposed], product_data, config
+        )
+
+    for c, reasons in zip(proposed, verdicts):
+        p = product_data[c.index]
+        if reasons:
+            held.append(
+                {
+                    "title": c.title,
+                    "category": p.get("category"),
+                    "unit": p.get("unit"),
+                    "oldPrice": c.old_price_num,
+                    "newPrice": c.new_price,
+                    "source": c.source,
+                    "listing": c.listing,
+                    "score": round(c.score, 4),
+                    "reasons": reasons,
+                }
+            )
+            continue
+        p["price"] = c.new_price
+        changes.append(c)
+        if c.source == "ATB":
+            updated_from_atb += 1
+        else:
+            updated_from_metro += 1
 
     total = len(product_data)
     print(f"Products: {total}")
@@ -462,18 +867,37 @@ def main() -> int:
     print(f"Updated from METRO: {updated_from_metro}")
     print(f"Skipped (no confident match): {skipped}")
     print(f"Changed prices: {len(changes)}")
+    if not args.no_price_checks:
+        print(f"Held back by price checks: {len(held)}")
+    if args.fuzzy_tokens:
+        print(f"Gained candidates via fuzzy tokens: {fuzzy_gained}")
 
     if args.report == "skipped":
         for t in skipped_titles:
             print(f"- {t}")
     elif args.report == "changed":
-        for title, oldp, newp, source, sc in changes:
-            oldp_str = "?" if oldp != oldp else f"{oldp:g}"  # NaN check
-            print(f"- [{source} score={sc:.3f}] {title}: {oldp_str} -> {newp:g}")
+        for c in changes:
+            oldp_str = "?" if c.old_price_num is None else f"{c.old_price_num:g}"
+            print(f"- [{c.source} score={c.score:.3f}] {c.title}: {oldp_str} -> {c.new_price:g}")
+        for h in held:
+            oldp_str = "?" if h["oldPrice"] is None else f"{h['oldPrice']:g}"
+            print(f"- HELD [{h['source']} score={h['score']:.3f}] {h['title']}: {oldp_str} -> {h['newPrice']:g} ({'; '.join(h['reasons'])})")
+
+    if args.changes:
+        changes_path = (base_dir / args.changes).resolve()
+        _atomic_write_text(changes_path, _change_set(changes, args.changes_format))
+        print(f"\nChange set ({args.changes_format}, {len(changes)} changes): {changes_path}")
 
     if args.write:
-        product_path.write_text(json.dumps(product_data, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
-        print(f"\nWrote: {product_path}")
+        if changes:
+            _atomic_write_text(product_path, json.dumps(product_data, ensure_ascii=False, indent=2) + "\n")
+            print(f"\nWrote: {product_path}")
+        else:
+            print(f"\nNo price changes, {product_path.name} left untouched")
+        if held:
+            review_path = (base_dir / args.review_file).resolve()
+            _atomic_write_text(review_path, json.dumps(held, ensure_ascii=False, indent=2) + "\n")
+            print(f"Held-back prices for review: {review_path}")
     else:
         print("\nDry-run only. Add --write to overwrite product_data.json")
 
@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""Long-running watch mode for update_prices.py.
+
+Matches product_data.json against the ATB and Metro catalogs once, then polls
+the catalog files. When one changes, its records are diffed against the
+previous snapshot and only the affected products are re-matched:
+
+- price changed   -> products whose current match is that record;
+- record removed  -> products that scored that record (it may have been the
+                     best or the runner-up that blocked a match);
+- record added    -> products sharing at least one token with it.
+
+A reverse index (candidate slot -> products) answers the first two, an
+inverted index over product tokens answers the third. Candidates live in
+mutable lists with tombstones, so catalog updates never rebuild the index.
+Re-reading and diffing the changed file is linear in its size, but that is
+cheap next to matching; matching work scales with the size of the change.
+
+Every product whose effective price changes is written as one NDJSON line:
+{"title", "oldPrice", "newPrice", "source", "score", "at"}. New prices go
+through the same price_checks.validate_prices gate as update_prices.py
+(unless --no-price-checks). A held change is written with "held": true and
+its "reasons"; the product keeps publishing its previous price.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import update_prices as up
+from price_checks import PriceCheckConfig, validate_prices
+
+
+RecordKey = Tuple[str, int]
+Row = Tuple[str, float, Optional[str]]
+
+
+@dataclass(frozen=True)
+class SourceSpec:
+    name: str
+    path: Path
+    load: Callable[[Any], List[Dict[str, Any]]]
+    title_keys: List[str]
+    price_key: str
+    base_unit_key: Optional[str]
+    identity: Callable[[Dict[str, Any]], str]
+
+
+def _snapshot(spec: SourceSpec) -> Dict[RecordKey, Row]:
+    items = spec.load(json.loads(spec.path.read_text(encoding="utf-8")))
+    out: Dict[RecordKey, Row] = {}
+    seen: Dict[str, int] = {}
+    for it in items:
+        rows = list(up._iter_candidate_rows([it], spec.title_keys, spec.price_key, spec.base_unit_key))
+        if not rows:
+            continue
+        ident = spec.identity(it)
+        n = seen.get(ident, 0)
+        seen[ident] = n + 1
+        out[(ident, n)] = rows[0]
+    return out
+
+
+class LiveCatalog:
+    """Mutable candidate list + inverted indexes with tombstones.
+
+    Besides the full index, one index per unit family holds only the listings
+    compatible with it (see update_prices.UnitPartitions).
+    """
+
+    def __init__(self, spec: SourceSpec) -> None:
+        self.spec = spec
+        self.candidates: List[Optional[up.PriceCandidate]] = []
+        self.inv: Dict[str, List[int]] = {}
+        self.family_inv: Dict[str, Dict[str, List[int]]] = {fam: {} for fam in set(up.UNIT_FAMILIES.values())}
+        self.slots: Dict[RecordKey, int] = {}
+        self.rows: Dict[RecordKey, Row] = {}
+
+    def _tokens(self, slot: int) -> Set[str]:
+        c = self.candidates[slot]
+        return set(up._tokenize(c.norm_title)) if c is not None else set()
+
+    def _indexes(self, slot: int) -> List[Dict[str, List[int]]]:
+        c = self.candidates[slot]
+        if c is None:
+            return []
+        return [self.inv] + [self.family_inv[fam] for fam in up._compatible_families(c)]
+
+    def inv_for(self, target_unit: str) -> Dict[str, List[int]]:
+        fam = up.UNIT_FAMILIES.get((target_unit or "").upper())
+        return self.family_inv[fam] if fam else self.inv
+
+    def add(self, key: RecordKey, row: Row) -> int:
+        title, price, base_unit = row
+        slot = len(self.candidates)
+        self.candidates.append(
+            up.PriceCandidate(
+                raw_title=title,
+                norm_title=up._normalize_title(title),
+                price=price,
+                base_unit=base_unit,
+                has_explicit_qty=up._has_explicit_quantity_in_title(title),
+            )
+        )
+        for inv in self._indexes(slot):
+            for tok in self._tokens(slot):
+                inv.setdefault(tok, []).append(slot)
+        self.slots[key] = slot
+        self.rows[key] = row
+        return slot
+
+    def remove(self, key: RecordKey) -> int:
+        slot = self.slots.pop(key)
+        del self.rows[key]
+        for inv in self._indexes(slot):
+            for tok in self._tokens(slot):
+                ids = inv.get(tok)
+                if ids is not None:
+                    ids.remove(slot)
+                    if not ids:
+                        del inv[tok]
+        self.candidates[slot] = None
+        return slot
+
+    def set_price(self, key: RecordKey, row: Row) -> int:
+        slot = self.slots[key]
+        old = self.candidates[slot]
+        assert old is not None
+        self.candidates[slot] = up.PriceCandidate(
+            raw_title=old.raw_title,
+            norm_title=old.norm_title,
+            price=row[1],
+            base_unit=old.base_unit,
+            has_explicit_qty=old.has_explicit_qty,
+        )
+        self.rows[key] = row
+        return slot
+
+
+@dataclass
+class MatchState:
+    source: Optional[str]
+    slot: Optional[int]
+    score: float
+    price: Optional[float]
+    considered: Dict[str, List[int]]
+
+
+class PriceWatcher:
+    def __init__(self, products: List[Dict[str, Any]], specs: List[SourceSpec], args: argparse.Namespace) -> None:
+        self.products = products
+        self.args = args
+        self.catalogs = [LiveCatalog(spec) for spec in specs]
+        self.states: List[Optional[MatchState]] = [None] * len(products)
+        self.matched_by: Dict[str, Dict[int, Set[int]]] = {c.spec.name: {} for c in self.catalogs}
+        self.considered_by: Dict[str, Dict[int, Set[int]]] = {c.spec.name: {} for c in self.catalogs}
+        self.product_inv: Dict[str, Set[int]] = {}
+        self.mtimes: Dict[str, Tuple[int, int]] = {}
+        self.pending: Set[int] = set()
+
+        for pi, p in enumerate(products):
+            title = p.get("title")
+            if isinstance(title, str) and title.strip():
+                for tok in up._tokenize(up._normalize_title(title)):
+                    self.product_inv.setdefault(tok, set()).add(pi)
+
+    def _stat(self, spec: SourceSpec) -> Tuple[int, int]:
+        st = spec.path.stat()
+        return st.st_mtime_ns, st.st_size
+
+    def load_all(self) -> None:
+        for cat in self.catalogs:
+            self.mtimes[cat.spec.name] = self._stat(cat.spec)
+            for key, row in _snapshot(cat.spec).items():
+                cat.add(key, row)
+
+    def _base_price(self, pi: int) -> Optional[float]:
+        old = self.products[pi].get("price")
+        return float(old) if isinstance(old, (int, float)) else None
+
+    def _effective_price(self, pi: int) -> Optional[float]:
+        st = self.states[pi]
+        if st is not None and st.price is not None:
+            return st.price
+        return self._base_price(pi)
+
+    def _forget(self, pi: int) -> None:
+        st = self.states[pi]
+        if st is None:
+            return
+        if st.source is not None and st.slot is not None:
+            self.matched_by[st.source].get(st.slot, set()).discard(pi)
+        for name, slots in st.considered.items():
+            index = self.considered_by[name]
+            for slot in slots:
+                index.get(slot, set()).discard(pi)
+
+    def evaluate(self, pi: int) -> None:
+        self._forget(pi)
+        p = self.products[pi]
+        title = p.get("title")
+        if not isinstance(title, str) or not title.strip():
+            self.states[pi] = MatchState(None, None, 0.0, None, {})
+            return
+        unit = p.get("unit")
+        unit_str = unit if isinstance(unit, str) else ""
+
+        a = self.args
+        state = MatchState(None, None, 0.0, None, {})
+        for cat in self.catalogs:
+            considered: List[int] = []
+            slot, sc = up._find_best_id(
+                title,
+                unit_str,
+                cat.candidates,  # type: ignore[arg-type]
+                cat.inv_for(unit_str),
+                a.min_score,
+                a.min_token_overlap,
+                a.min_score_gap,
+                considered=considered,
+            )
+            state.considered[cat.spec.name] = considered
+            index = self.considered_by[cat.spec.name]
+            for s in considered:
+                index.setdefault(s, set()).add(pi)
+            if slot is not None:
+                cand = cat.candidates[slot]
+                assert cand is not None
+                state.source, state.slot, state.score = cat.spec.name, slot, sc
+                state.price = up._target_price(cand, unit_str, a.convert_packs)
+                self.matched_by[cat.spec.name].setdefault(slot, set()).add(pi)
+                break
+        self.states[pi] = state
+
+    def poll(self) -> Dict[str, Tuple[int, int, int]]:
+        """Apply catalog file changes; returns {source: (added, removed, repriced)}."""
+        deltas: Dict[str, Tuple[int, int, int]] = {}
+        for cat in self.catalogs:
+            stamp = self._stat(cat.spec)
+            if stamp == self.mtimes.get(cat.spec.name):
+                continue
+            self.mtimes[cat.spec.name] = stamp
+            deltas[cat.spec.name] = self._apply(cat, _snapshot(cat.spec))
+        return deltas
+
+    def _apply(self, cat: LiveCatalog, new_rows: Dict[RecordKey, Row]) -> Tuple[int, int, int]:
+        name = cat.spec.name
+        affected: Set[int] = set()
+        added = removed = repriced = 0
+
+        for key in [k for k in cat.rows if k not in new_rows]:
+            slot = cat.remove(key)
+            affected |= self.considered_by[name].pop(slot, set())
+            affected |= self.matched_by[name].pop(slot, set())
+            removed += 1
+
+        for key, row in new_rows.items():
+            old = cat.rows.get(key)
+            if old == row:
+                continue
+            if old is not None and old[0] == row[0] and old[2] == row[2]:
+                slot = cat.set_price(key, row)
+                affected |= self.matched_by[name].get(slot, set())
+                repriced += 1
+                continue
+            if old is not None:
+                slot = cat.remove(key)
+                affected |= self.considered_by[name].pop(slot, set())
+                affected |= self.matched_by[name].pop(slot, set())
+            slot = cat.add(key, row)
+            cand = cat.candidates[slot]
+            assert cand is not None
+            for tok in up._tokenize(cand.norm_title):
+                affected |= self.product_inv.get(tok, set())
+            added += 1
+
+        self.pending |= affected
+        return added, removed, repriced
+
+    def _check(self, proposed: List[Tuple[int, Optional[float], Optional[float]]]) -> List[List[str]]:
+        """validate_prices verdicts for (product, old price, new price) changes."""
+        verdicts: List[List[str]] = [[] for _ in proposed]
+        a = self.args
+        checked = [k for k, (_pi, _old, new) in enumerate(proposed) if new is not None]
+        if a.no_price_checks or not checked:
+            return verdicts
+        config = PriceCheckConfig(max_ratio=a.max_price_ratio, max_z=a.max_price_z)
+        results = validate_prices(
+            [(self.products[proposed[k][0]], proposed[k][1], proposed[k][2]) for k in checked], self.products, config
+        )
+        for k, reasons in zip(checked, results):
+            verdicts[k] = reasons
+        return verdicts
+
+    def rematch(self, products: Iterable[int], out: IO[str]) -> int:
+        """Re-match ``products`` and write their price changes; returns how many were published."""
+        now = int(time.time())
+        proposed: List[Tuple[int, Optional[float], Optional[float]]] = []
+        for pi in sorted(products):
+            before = self._effective_price(pi)
+            self.evaluate(pi)
+            after = self._effective_price(pi)
+            if before != after:
+                proposed.append((pi, before, after))
+
+        changed = 0
+        for (pi, before, after), reasons in zip(proposed, self._check(proposed)):
+            st = self.states[pi]
+            assert st is not None
+            rec: Dict[str, Any] = {
+                "title": self.products[pi].get("title"),
+                "oldPrice": before,
+                "newPrice": after,
+                "source": st.source,
+                "score": round(st.score, 4) if st.source else None,
+                "at": now,
+            }
+            if reasons:
+                # Keep the previous price; the match is kept, so a catalog fix re-triggers the product.
+                st.price = before
+                rec["held"] = True
+                rec["reasons"] = reasons
+            else:
+                changed += 1
+            out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        out.flush()
+        return changed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--product-data", default="product_data.json")
+    parser.add_argument("--atb", default="atb_products.json")
+    parser.add_argument("--metro", default="metro_full_catalog_all_pages.json")
+    parser.add_argument("--min-score", type=float, default=0.62)
+    parser.add_argument("--min-token-overlap", type=int, default=1)
+    parser.add_argument("--min-score-gap", type=float, default=0.06)
+    parser.add_argument("--convert-packs", action="store_true")
+    parser.add_argument("--no-price-checks", action="store_true", help="Emit matched prices without the sanity checks.")
+    parser.add_argument("--max-price-ratio", type=float, default=3.0, help="Hold back prices that change by more than this factor.")
+    parser.add_argument(
+        "--max-price-z", type=float, default=3.5, help="Hold back prices this many robust z-scores from their category/unit median."
+    )
+    parser.add_argument("--interval", type=float, default=2.0, help="Seconds between file checks.")
+    parser.add_argument("--out", default="-", help="NDJSON diff output (default: stdout).")
+    parser.add_argument("--emit-initial", action="store_true", help="Also emit the changes found by the initial full match.")
+    parser.add_argument("--once", action="store_true", help="Exit after the initial match.")
+    args = parser.parse_args()
+
+    base_dir = Path(__file__).resolve().parent
+    products: List[Dict[str, Any]] = json.loads((base_dir / args.product_data).read_text(encoding="utf-8"))
+    specs = [
+        SourceSpec(
+            name="ATB",
+            path=(base_dir / args.atb).resolve(),
+            load=lambda root: root.get("products") or [],
+            title_keys=["name", "originalTitle"],
+            price_key="price",
+            base_unit_key="baseUnit",
+            identity=lambda it: str(it.get("originalTitle") or it.get("name")),
+        ),
+        SourceSpec(
+            name="METRO",
+            path=(base_dir / args.metro).resolve(),
+            load=lambda root: root,
+            title_keys=["title"],
+            price_key="price",
+            base_unit_key=None,
+            identity=lambda it: f"{it.get('category')}\t{it.get('title')}",
+        ),
+    ]
+
+    log = sys.stderr
+    watcher = PriceWatcher(products, specs, args)
+    with ExitStack() as stack:
+        out: IO[str] = sys.stdout if args.out == "-" else stack.enter_context(open(args.out, "a", encoding="utf-8"))
+        started = time.perf_counter()
+        watcher.load_all()
+        if args.emit_initial:
+            initial = watcher.rematch(range(len(products)), out)
+        else:
+            with open(os.devnull, "w", encoding="utf-8") as sink:
+                initial = watcher.rematch(range(len(products)), sink)
+        print(f"Initial match: {len(products)} products, {initial} price changes in {time.perf_counter() - started:.2f}s", file=log)
+        if args.once:
+            return 0
+
+        try:
+            while True:
+                time.sleep(args.interval)
+                started = time.perf_counter()
+                deltas = watcher.poll()
+                if not deltas:
+                    continue
+                affected = watcher.pending
+                watcher.pending = set()
+                changed = watcher.rematch(affected, out)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                summary = ", ".join(f"{name} +{a} -{r} ~{p}" for name, (a, r, p) in deltas.items())
+                print(f"[{summary}] re-matched {len(affected)} products, {changed} price changes, {elapsed_ms:.0f} ms", file=log)
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
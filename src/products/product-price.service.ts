@@ -1,13 +1,25 @@
 // src/products/product-price.service.ts
 
 import { Injectable, Logger } from '@nestjs/common';
+import { ConfigService } from '@nestjs/config';
 import { PrismaService } from '../prisma/prisma.service';
 
+export interface StorePriceMatch {
+  source: 'ATB' | 'METRO';
+  title: string;
+  price: number;
+  listingPrice: number;
+  score: number;
+}
+
 @Injectable()
 export class ProductPriceService {
   private readonly logger = new Logger(ProductPriceService.name);
 
-  constructor(private prisma: PrismaService) {}
+  constructor(
+    private prisma: PrismaService,
+    private configService: ConfigService,
+  ) {}
 
   /**
    * Записати ціну від користувача та оновити статистику продукту
@@ -111,6 +123,7 @@ export class ProductPriceService {
       select: {
         id: true,
         name: true,
+        baseUnit: true,
         averagePrice: true,
         minPrice: true,
         maxPrice: true,
@@ -151,6 +164,9 @@ export class ProductPriceService {
       _count: true,
     });
 
+    // Ціна в каталогах АТБ/Metro (null, якщо матчер не налаштовано)
+    const storePrice = await this.lookupStorePrice(product.name, product.baseUnit);
+
     return {
       product: {
         id: product.id,
@@ -170,6 +186,7 @@ export class ProductPriceService {
         averagePrice: r._avg.price,
         samplesCount: r._count,
       })),
+      storePrice,
     };
   }
 
@@ -190,4 +207,33 @@ export class ProductPriceService {
           : 1;
     return (quantity / baseAmount) * averagePrice;
   }
-}
\ No newline at end of file
+
+  /**
+   * Знайти ціну в каталогах АТБ/Metro через локальний матчер (example/match_server.py).
+   * Повертає null, якщо PRICE_MATCHER_URL не задано, матчер недоступний або збігу немає.
+   */
+  async lookupStorePrice(title: string, unit?: string): Promise<StorePriceMatch | null> {
+    const baseUrl = this.configService.get<string>('PRICE_MATCHER_URL');
+    if (!baseUrl) {
+      return null;
+    }
+
+    try {
+      const response = await fetch(`${baseUrl.replace(/\/+$/, '')}/match`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ title, unit: unit ?? '' }),
+        signal: AbortSignal.timeout(500),
+      });
+      if (!response.ok) {
+        this.logger.warn(`Матчер цін повернув HTTP ${response.status} для "${title}"`);
+        return null;
+      }
+      const data = (await response.json()) as { match: StorePriceMatch | null };
+      return data.match;
+    } catch (error) {
+      this.logger.warn(`Матчер цін недоступний: ${(error as Error).message}`);
+      return null;
+    }
+  }
+}